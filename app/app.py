@@ -12,6 +12,9 @@ from pg_knowledge import PageKnowledge
 from dotenv import load_dotenv
 from llms import load_secrets_from_env
 import os
+import metrics
+import render_timing
+import result_archive
 from ssl_override import disable_ssl_verification
 
 # Ensure TLS/SSL verification is disabled before any network operations
@@ -152,6 +155,16 @@ def draw_sidebar():
 def main():
     st.set_page_config(page_title="CrewAI Studio", page_icon="img/favicon.ico", layout="wide")
     load_secrets_from_env()
+    metrics.start_exporters()
+    timer = render_timing.RenderTimer(ss.get('page'))
+    try:
+        draw_app(timer)
+    finally:
+        # Also reached when the rerun is cut short by st.rerun() or st.stop()
+        timer.finish(ss.get('page'))
+        render_timing.remember(timer)
+
+def draw_app(timer):
     if (str(os.getenv('AGENTOPS_ENABLED')).lower() in ['true', '1']) and not ss.get('agentops_failed', False):
         try:
             import agentops
@@ -160,11 +173,18 @@ def main():
             ss.agentops_failed = True
             print(f"Error initializing AgentOps: {str(e)}")            
         
-    db_utils.initialize_db()
-    load_data()
-    draw_sidebar()
-    PageCrewRun.maintain_session_state() #this will persist the session state for the crew run page so crew run can be run in a separate thread
-    pages()[ss.page].draw()
+    with timer.phase('initialize_db'):
+        db_utils.initialize_db()
+    result_archive.start_compactor()
+    with timer.phase('load_data'):
+        load_data()
+    with timer.phase('draw_sidebar'):
+        draw_sidebar()
+    with timer.phase('maintain_session_state'):
+        PageCrewRun.maintain_session_state() #this will persist the session state for the crew run page so crew run can be run in a separate thread
+    with timer.phase('draw'):
+        pages()[ss.page].draw()
+    render_timing.draw_debug_panel()
     
 if __name__ == '__main__':
     main()
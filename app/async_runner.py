@@ -0,0 +1,99 @@
+"""Shared asyncio event loop for running crews and their network I/O.
+
+Every worker process gets one event loop, running in a daemon thread and
+created on first use. Crews are kicked off on it with crewai's
+``kickoff_async``. At most ``max_concurrent_runs`` crews run at a time and the
+others wait on the loop. crewai still executes the agents of a running crew
+synchronously (``kickoff_async`` hands ``kickoff`` to the loop's executor), so
+that executor is a bounded pool of the same size rather than a new thread per
+crew.
+
+While a crew runs through this loop, the web, API and search tools send
+their requests from their async ``_arun`` on this loop over one shared HTTP
+client. Many waiting tool calls then cost sockets on a single loop instead of
+blocked requests spread across threads. Tools used outside such a run behave
+as before.
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_loop = None
+_loop_thread = None
+_run_slots = None
+_http_clients = {}
+_blocking_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="loop-blocking")
+_lock = threading.Lock()
+_in_async_run = contextvars.ContextVar('in_async_run', default=False)
+
+max_concurrent_runs = 8
+
+
+def configure(max_runs):
+    """Set how many crews may run at the same time; only effective before the loop is started."""
+    global max_concurrent_runs
+    max_concurrent_runs = max(1, int(max_runs))
+
+
+def get_loop():
+    """Return the worker's event loop, starting it on first use."""
+    global _loop, _loop_thread, _run_slots
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=max_concurrent_runs, thread_name_prefix="crew-run"))
+            _run_slots = asyncio.Semaphore(max_concurrent_runs)
+            _loop_thread = threading.Thread(target=loop.run_forever, name="crew-event-loop", daemon=True)
+            _loop_thread.start()
+            _loop = loop
+        return _loop
+
+
+def submit(coro):
+    """Schedule ``coro`` on the worker's loop and return a concurrent.futures.Future for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def in_async_run():
+    """True when called from a crew started with ``kickoff``."""
+    return _in_async_run.get() and _loop is not None and threading.current_thread() is not _loop_thread
+
+
+def run_sync(coro):
+    """Run ``coro`` on the worker's loop from a worker thread and wait for its result."""
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("run_sync would block the event loop it waits for")
+    return submit(coro).result()
+
+
+async def kickoff(crewai_crew, inputs=None):
+    """Run ``crewai_crew`` with ``kickoff_async`` once a run slot is free."""
+    get_loop()
+    async with _run_slots:
+        # kickoff_async copies the current context into the executor thread, which tells the tools there
+        # that they can do their I/O on this loop
+        _in_async_run.set(True)
+        return await crewai_crew.kickoff_async(inputs=inputs or {})
+
+
+async def run_blocking(func, *args):
+    """Run blocking work (database access, parsing, sync-only libraries) off the loop.
+
+    Not on the loop's default executor: its threads may all be taken by running crews that are
+    waiting for this very call.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_blocking_executor, func, *args)
+
+
+async def http_client(verify=True):
+    """The HTTP client shared by the async tools of this worker.
+
+    Certificates are verified unless ``verify`` is False, which gets a separate client for the
+    tools that are configured to skip verification (``CustomApiTool``).
+    """
+    if verify not in _http_clients:
+        import httpx
+        _http_clients[verify] = httpx.AsyncClient(verify=verify, follow_redirects=True, timeout=15)
+    return _http_clients[verify]
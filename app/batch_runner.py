@@ -0,0 +1,198 @@
+"""Batch kickoff: run one crew over many sets of placeholder values.
+
+Rows come from an uploaded CSV or JSONL file. A ``BatchRun`` runs at most
+``max_concurrency`` rows at the same time, each on a crewai crew built for it
+by ``build_crew``, so no memory, agent state or task output carries over from
+one row to another. Each row is saved as its own Result (with incrementally
+persisted task outputs, see ``run_store``) as soon as it runs. A failing row
+only fails itself and can be retried later. A budget applies to every row on
+its own.
+"""
+
+import csv
+import io
+import json
+import threading
+import time
+import traceback
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import budgets
+import instrumentation
+import metrics
+import run_store
+from utils import rnd_id
+
+# Batches of this process, for the queued runs metric
+_batches = weakref.WeakSet()
+
+
+def parse_rows(file_name, content):
+    """Parse an uploaded CSV or JSONL file into a list of {column: value} dicts."""
+    text = content.decode('utf-8-sig') if isinstance(content, bytes) else content
+    if file_name.lower().endswith(('.jsonl', '.ndjson')):
+        rows = []
+        for line_number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {line_number} is not a JSON object")
+            rows.append(row)
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    return [
+        {str(key).strip(): '' if value is None else str(value) for key, value in row.items() if key is not None}
+        for row in rows
+    ]
+
+
+class BatchRun:
+    def __init__(self, crew_name, rows, build_crew, max_concurrency, task_ids=None, serialize_result=None, budget=None):
+        self.id = f"B_{rnd_id()}"
+        self.crew_name = crew_name
+        self.budget = budgets.normalize(budget)
+        self.task_ids = task_ids
+        self.serialize_result = serialize_result or run_store.serialize_output
+        self.rows = [
+            {'row': i, 'status': 'pending', 'attempts': 0, 'duration_s': None, 'result_id': None, 'error': None, 'output': None, 'inputs': inputs}
+            for i, inputs in enumerate(rows)
+        ]
+        self.results = []
+        self.build_crew = build_crew
+        self.max_concurrency = max(1, min(int(max_concurrency), len(self.rows)))
+        # Guards the rows and results, which the page and the metrics read while workers update them
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._thread = None
+        _batches.add(self)
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, row_indexes=None):
+        if self.is_running():
+            return
+        with self._lock:
+            if row_indexes is None:
+                row_indexes = [row['row'] for row in self.rows if row['status'] == 'pending']
+            for index in row_indexes:
+                self.rows[index]['status'] = 'queued'
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, args=(row_indexes,), daemon=True)
+        self._thread.start()
+
+    def retry_failed(self):
+        with self._lock:
+            row_indexes = [row['row'] for row in self.rows if row['status'] in ('failed', 'cancelled', 'budget_exceeded')]
+        self.start(row_indexes)
+
+    def cancel(self):
+        """Do not start any more rows; rows already running are finished."""
+        self._cancelled = True
+
+    def _run(self, row_indexes):
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="batch-row") as pool:
+            list(pool.map(self._run_row, row_indexes))
+
+    def _update(self, row, **changes):
+        with self._lock:
+            row.update(changes)
+
+    def _run_row(self, index):
+        row = self.rows[index]
+        if self._cancelled:
+            self._update(row, status='cancelled')
+            return
+        with self._lock:
+            row.update(status='running', attempts=row['attempts'] + 1, error=None, duration_s=None, output=None)
+        try:
+            # A fresh crew per row: crews keep memory, agent state and task outputs between kickoffs
+            crew = self.build_crew()
+            result = run_store.start_run(self.crew_name, row['inputs'])
+            with self._lock:
+                row['result_id'] = result.id
+                self.results.append(result)
+            run_store.attach(crew, result.id, self.task_ids)
+            run_stats = instrumentation.RunStats(self.crew_name)
+            if self.budget:
+                run_stats.budget = budgets.RunBudget(self.budget)
+            instrumentation.bind(crew, run_stats)
+            started = time.monotonic()
+            output = None
+            error = None
+            try:
+                output = crew.kickoff(inputs=row['inputs'])
+            except Exception as e:
+                error = str(e)
+                print(f"Error running batch row {index}: {str(e)}\n{traceback.format_exc()}")
+            finally:
+                instrumentation.unbind(crew)
+            duration_s = round(time.monotonic() - started, 3)
+
+            if output is not None:
+                run_store.finish_run(result, 'completed', self.serialize_result(output), run_stats.as_dict())
+                self._update(row, status='completed', output=output.raw, duration_s=duration_s)
+            elif run_stats.budget is not None and run_stats.budget.exceeded:
+                error = run_stats.budget.exceeded
+                run_store.finish_run(result, 'budget_exceeded', f"Run stopped: {error}", run_stats.as_dict())
+                self._update(row, status='budget_exceeded', error=error, duration_s=duration_s)
+            else:
+                run_store.finish_run(result, 'failed', f"Error running crew: {error}", run_stats.as_dict())
+                self._update(row, status='failed', error=error, duration_s=duration_s)
+        except Exception as e:
+            self._update(row, status='failed', error=str(e))
+
+    def snapshot(self):
+        """Copies of the rows, consistent while workers update them."""
+        with self._lock:
+            return [dict(row) for row in self.rows]
+
+    def progress(self):
+        counts = {}
+        for row in self.snapshot():
+            counts[row['status']] = counts.get(row['status'], 0) + 1
+        return counts
+
+    def table(self):
+        """Row statuses for display, without the full outputs; the inputs are in ``input.<name>`` columns."""
+        return [
+            {
+                **{key: value for key, value in row.items() if key not in ('inputs', 'output')},
+                **_input_columns(row['inputs']),
+                'output': (row['output'] or '')[:200],
+            }
+            for row in self.snapshot()
+        ]
+
+    def to_jsonl(self):
+        return "\n".join(json.dumps(row) for row in self.snapshot()) + "\n"
+
+    def to_csv(self):
+        rows = self.snapshot()
+        input_columns = list(dict.fromkeys(key for row in rows for key in _input_columns(row['inputs'])))
+        columns = ['row', 'status', 'attempts', 'duration_s', 'result_id', 'error'] + input_columns + ['output']
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**{key: row[key] for key in columns if key in row}, **_input_columns(row['inputs'])})
+        return buffer.getvalue()
+
+
+def _input_columns(inputs):
+    # Prefixed, so inputs named like the status columns (status, error, row, output...) do not replace them
+    return {f"input.{key}": value for key, value in inputs.items()}
+
+
+def _queued_metrics():
+    queued = {}
+    for batch in list(_batches):
+        count = sum(1 for row in batch.snapshot() if row['status'] == 'queued')
+        if count:
+            queued[(batch.crew_name,)] = queued.get((batch.crew_name,), 0) + count
+    return [metrics.snapshot('studio_runs_queued', 'gauge', "Batch rows waiting for a free crew", ('crew',), queued)]
+
+
+metrics.register_collector(_queued_metrics)
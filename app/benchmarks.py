@@ -0,0 +1,424 @@
+"""Benchmarks of the Studio's own hot paths, with results stored as JSON.
+
+Run from the ``app`` directory::
+
+    python -m benchmarks run                         # all benchmarks, default dataset
+    python -m benchmarks run --quick -k results      # a smaller dataset, only matching names
+    python -m benchmarks run --pages saved_pages/    # scrape extraction on saved .html files
+    python -m benchmarks compare base.json new.json  # exit code 1 on a regression
+
+The benchmarks run against a synthetic dataset of agents, tasks, crews and
+results written to a temporary SQLite database (``--db-url`` for another
+one); the configured database is never touched. Crews are built with the
+"Local Fake" LLM (see ``fake_llm_server``), so no API keys are needed.
+
+Every benchmark is timed like ``timeit``: calls are batched until a batch
+takes at least ``--min-time`` seconds, and the batch is repeated
+``--repeat`` times. The result file (by default
+``../benchmark_results/<commit>.json``) records the commit, the machine, the
+dataset sizes and min / median / mean / stdev seconds per call, so results
+of different commits can be compared.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+import db_utils
+from console_capture import ConsoleCapture
+from my_agent import MyAgent
+from my_crew import MyCrew
+from my_task import MyTask
+from my_tools import MyFileReadTool, MyScrapeWebsiteToolEnhanced
+from pg_results import filter_results
+from result import Result
+from tools.ScrapeWebsiteToolEnhanced import ScrapeWebsiteToolEnhanced
+from utils import _render_markdown, generate_printable_view
+
+SIZES = {
+    'default': {'agents': 20, 'tasks': 60, 'crews': 10, 'results': 500, 'console_lines': 2000},
+    'quick': {'agents': 5, 'tasks': 12, 'crews': 3, 'results': 50, 'console_lines': 200},
+}
+
+FAKE_LLM = "Local Fake: fake-instant"
+
+_WORDS = (
+    "agent crew task research market analysis report summary model data source insight trend "
+    "customer product pricing risk strategy metric growth forecast review outline draft"
+).split()
+
+_ANSI = "\x1b[1m\x1b[95m# Agent:\x1b[00m \x1b[1m\x1b[92mResearcher\x1b[00m"
+
+
+def _words(rnd, count):
+    return " ".join(rnd.choice(_WORDS) for _ in range(count))
+
+
+def _markdown(rnd, sections=8):
+    """A result in the Markdown the agents typically write: headings, nested lists, tables and code."""
+    parts = [f"# {_words(rnd, 4).title()}\n", _words(rnd, 60) + "\n"]
+    for section in range(sections):
+        parts.append(f"## {section + 1}. {_words(rnd, 3).title()}\n")
+        parts.append(_words(rnd, 80) + "\n")
+        for item in range(4):
+            parts.append(f"- **{_words(rnd, 2)}**: {_words(rnd, 12)}")
+            parts.append(f"  - {_words(rnd, 8)}")
+        parts.append("\n| Metric | Value | Trend |\n|---|---|---|")
+        parts.extend(f"| {_words(rnd, 2)} | {rnd.randint(1, 1000)} | {rnd.choice(['up', 'down', 'flat'])} |" for _ in range(5))
+        parts.append(f"\n```python\nresult = analyse('{_words(rnd, 1)}')\n```\n")
+    return "\n".join(parts)
+
+
+def _html_page(rnd, sections=30):
+    """A saved-page stand-in with the structures the scraper handles specially."""
+    body = []
+    for section in range(sections):
+        body.append(f"<h2>{_words(rnd, 4)}</h2><div class='content' style='margin: 0'><p>{_words(rnd, 60)}</p>")
+        body.append("<ul>" + "".join(f"<li>{_words(rnd, 6)} <a href='/page/{section}/{i}'>{_words(rnd, 2)}</a></li>" for i in range(6)) + "</ul>")
+        body.append("<table><tr><th>Name</th><th>Value</th></tr>" + "".join(f"<tr><td>{_words(rnd, 2)}</td><td>{rnd.randint(1, 99)}</td></tr>" for _ in range(5)) + "</table>")
+        body.append("<script>var tracking = 1;</script></div>")
+    return (
+        "<html lang='en'><head><title>Synthetic page</title><meta name='description' content='Benchmark page'>"
+        "<style>body { color: #333 }</style></head><body>" + "".join(body) + "</body></html>"
+    )
+
+
+class _SavedResponse:
+    """Just enough of a requests response for ``ScrapeWebsiteToolEnhanced._format_response``."""
+
+    def __init__(self, url, html):
+        self.url = url
+        self.text = html
+        self.history = []
+        self.status_code = 200
+        self.headers = {'Content-Type': 'text/html; charset=utf-8'}
+        self.encoding = 'utf-8'
+        self.apparent_encoding = 'utf-8'
+
+
+class Dataset:
+    """Synthetic agents, tasks, crews and results, saved into the current database."""
+
+    def __init__(self, sizes, seed=42):
+        self.sizes = sizes
+        rnd = random.Random(seed)
+        created = datetime(2025, 1, 1)
+        self.tools = [MyScrapeWebsiteToolEnhanced(), MyFileReadTool()]
+        self.agents = [
+            MyAgent(
+                role=f"{_words(rnd, 2).title()} {i}",
+                goal=_words(rnd, 15),
+                backstory=_words(rnd, 60),
+                llm_provider_model=FAKE_LLM,
+                tools=list(self.tools),
+                created_at=(created + timedelta(minutes=i)).isoformat(),
+            )
+            for i in range(sizes['agents'])
+        ]
+        self.tasks = []
+        for i in range(sizes['tasks']):
+            previous = self.tasks[-2:] if i % 3 else []
+            self.tasks.append(MyTask(
+                description=f"{_words(rnd, 40)} about {{topic}}",
+                expected_output=_words(rnd, 20),
+                agent=self.agents[i % len(self.agents)],
+                context_from_sync_tasks_ids=[task.id for task in previous],
+                created_at=(created + timedelta(minutes=i)).isoformat(),
+            ))
+        tasks_per_crew = max(1, len(self.tasks) // sizes['crews'])
+        self.crews = []
+        for i in range(sizes['crews']):
+            tasks = self.tasks[i * tasks_per_crew:(i + 1) * tasks_per_crew]
+            agents = list({task.agent.id: task.agent for task in tasks}.values())
+            self.crews.append(MyCrew(
+                name=f"Crew {i}",
+                agents=agents,
+                tasks=tasks,
+                verbose=False,
+                created_at=(created + timedelta(minutes=i)).isoformat(),
+            ))
+        self.results = [
+            Result(
+                id=f"R_bench{i:06d}",
+                crew_id=self.crews[i % len(self.crews)].id,
+                crew_name=self.crews[i % len(self.crews)].name,
+                inputs={'topic': _words(rnd, 3)},
+                result={'result': {'raw': _markdown(rnd, 3)}, 'stats': None},
+                created_at=(created + timedelta(hours=i)).isoformat(),
+            )
+            for i in range(sizes['results'])
+        ]
+        self.markdown = _markdown(rnd)
+        self.html = _html_page(rnd)
+        self.console_lines = [
+            f"{_ANSI} {_words(rnd, rnd.randint(3, 30))}" for _ in range(sizes['console_lines'])
+        ]
+
+    def save(self):
+        for tool in self.tools:
+            db_utils.save_tool(tool)
+        for agent in self.agents:
+            db_utils.save_agent(agent)
+        for task in self.tasks:
+            db_utils.save_task(task)
+        for crew in self.crews:
+            db_utils.save_crew(crew)
+        for result in self.results:
+            db_utils.save_result(result)
+        for result in self.results[:20]:
+            for index in range(3):
+                db_utils.save_task_output(result.id, index, {'raw': self.markdown[:2000], 'agent': 'Writer'})
+
+
+@contextlib.contextmanager
+def synthetic_database(db_url=None):
+    """Point ``db_utils`` at a scratch database for the duration of the benchmarks."""
+    original_engine = db_utils.engine
+    with tempfile.TemporaryDirectory() as directory:
+        db_utils.engine = create_engine(db_url or f"sqlite:///{os.path.join(directory, 'bench.db')}", echo=False)
+        try:
+            db_utils.create_tables()
+            yield
+        finally:
+            db_utils.engine.dispose()
+            db_utils.engine = original_engine
+
+
+def load_data():
+    """The loads ``app.load_data`` runs on every new session."""
+    return (
+        db_utils.load_agents(),
+        db_utils.load_tasks(),
+        db_utils.load_crews(),
+        db_utils.load_tools(),
+        db_utils.load_tools_state(),
+        db_utils.load_knowledge_sources(),
+    )
+
+
+def results_page(crew_names, day, page_size=20):
+    """The query path of the Results page: load everything, filter by crew and day, sort, take the first page."""
+    return filter_results(db_utils.load_results(), crew_names, day)[:page_size]
+
+
+def console_throughput(lines):
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+        capture = ConsoleCapture()
+        capture.start()
+        try:
+            for line in lines:
+                print(line)
+        finally:
+            capture.stop()
+    return capture.get_output()
+
+
+def get_benchmarks(dataset, pages=None):
+    """{name: (function, items per call)}; items give a throughput for benchmarks that process many."""
+    crew = max(dataset.crews, key=lambda c: len(c.tasks))
+    result = dataset.results[len(dataset.results) // 2]
+    day = datetime.fromisoformat(result.created_at).date()
+    scraper = ScrapeWebsiteToolEnhanced()
+    pages = pages or {'synthetic.html': dataset.html}
+    page_responses = [_SavedResponse(f"https://example.com/{name}", html) for name, html in pages.items()]
+    counter = iter(range(10 ** 9))
+
+    def save_agent():
+        agent = dataset.agents[next(counter) % len(dataset.agents)]
+        db_utils.save_agent(agent)
+
+    def save_result():
+        db_utils.save_result(dataset.results[next(counter) % len(dataset.results)])
+
+    return {
+        'db.save_agent': (save_agent, 1),
+        'db.save_result': (save_result, 1),
+        'db.load_agents': (db_utils.load_agents, len(dataset.agents)),
+        'db.load_tasks': (db_utils.load_tasks, len(dataset.tasks)),
+        'db.load_crews': (db_utils.load_crews, len(dataset.crews)),
+        'db.load_results': (db_utils.load_results, len(dataset.results)),
+        'db.load_result': (lambda: db_utils.load_result(result.id), 1),
+        'db.load_task_outputs': (lambda: db_utils.load_task_outputs(dataset.results[0].id), 3),
+        'app.load_data': (load_data, 1),
+        'crew.get_crewai_crew': (crew.get_crewai_crew, len(crew.tasks)),
+        'console.capture': (lambda: console_throughput(dataset.console_lines), len(dataset.console_lines)),
+        'scrape.extract': (lambda: [scraper._format_response(r.url, r) for r in page_responses], len(page_responses)),
+        'results.printable_view': (
+            lambda: generate_printable_view(crew.name, None, result.inputs, dataset.markdown, result.created_at), 1,
+        ),
+        # The same Markdown rendered without the render cache
+        'results.render_markdown_cold': (lambda: _render_markdown(dataset.markdown), 1),
+        'results.page_query': (lambda: results_page({result.crew_name}, day), len(dataset.results)),
+    }
+
+
+def time_benchmark(function, repeat, min_time):
+    function()  # warm up caches and lazy imports
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 10 ** 6:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - started) / number)
+    return number, timings
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def read_pages(directory):
+    pages = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.html', '.htm')):
+            with open(os.path.join(directory, name), encoding='utf-8', errors='replace') as f:
+                pages[name] = f.read()
+    return pages
+
+
+def cmd_run(args):
+    sizes = dict(SIZES['quick' if args.quick else 'default'])
+    for key in sizes:
+        if getattr(args, key, None):
+            sizes[key] = getattr(args, key)
+    pages = read_pages(args.pages) if args.pages else None
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(),
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'dataset': {**sizes, 'pages': len(pages) if pages else 1},
+        'settings': {'repeat': args.repeat, 'min_time': args.min_time},
+        'benchmarks': {},
+    }
+    with synthetic_database(args.db_url):
+        dataset = Dataset(sizes)
+        started = time.perf_counter()
+        dataset.save()
+        report['dataset']['save_s'] = round(time.perf_counter() - started, 4)
+        for name, (function, items) in get_benchmarks(dataset, pages).items():
+            if args.k and not any(re.search(pattern, name) for pattern in args.k):
+                continue
+            number, timings = time_benchmark(function, args.repeat, args.min_time)
+            median = statistics.median(timings)
+            report['benchmarks'][name] = {
+                'number': number,
+                'min_s': min(timings),
+                'median_s': median,
+                'mean_s': statistics.fmean(timings),
+                'stdev_s': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+                'items': items,
+                'items_per_s': items / median if median else None,
+            }
+            print(f"{name:28} {median * 1000:10.3f} ms  (±{report['benchmarks'][name]['stdev_s'] * 1000:.3f}, {number} x {args.repeat})", file=sys.stderr)
+
+    out = args.out or os.path.join('..', 'benchmark_results', f"{report['commit'] or 'unknown'}.json")
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}", file=sys.stderr)
+    return 0
+
+
+def compare(base, new, threshold):
+    """Rows of (name, base median, new median, ratio, verdict) for the benchmarks in both reports."""
+    rows = []
+    for name in sorted(set(base['benchmarks']) | set(new['benchmarks'])):
+        before = base['benchmarks'].get(name)
+        after = new['benchmarks'].get(name)
+        if before is None or after is None:
+            rows.append((name, before and before['median_s'], after and after['median_s'], None, 'only in ' + ('new' if before is None else 'base')))
+            continue
+        ratio = after['median_s'] / before['median_s'] if before['median_s'] else None
+        if ratio is None:
+            verdict = ''
+        elif ratio > 1 + threshold:
+            verdict = 'slower'
+        elif ratio < 1 / (1 + threshold):
+            verdict = 'faster'
+        else:
+            verdict = ''
+        rows.append((name, before['median_s'], after['median_s'], ratio, verdict))
+    return rows
+
+
+def cmd_compare(args):
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"base: {base.get('commit')} ({base.get('created_at')})  new: {new.get('commit')} ({new.get('created_at')})")
+    if base.get('dataset', {}).get('results') != new.get('dataset', {}).get('results'):
+        print("Warning: the reports were made with different dataset sizes")
+    rows = compare(base, new, args.threshold)
+    print(f"{'benchmark':28} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    for name, before, after, ratio, verdict in rows:
+        before_ms = f"{before * 1000:10.3f}" if before is not None else f"{'-':>10}"
+        after_ms = f"{after * 1000:10.3f}" if after is not None else f"{'-':>10}"
+        ratio_text = f"{ratio:7.2f}" if ratio is not None else f"{'-':>7}"
+        print(f"{name:28} {before_ms} {after_ms} {ratio_text}  {verdict}")
+    return 1 if any(verdict == 'slower' for *_, verdict in rows) else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Benchmark the Studio's hot paths.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the benchmarks and write a JSON report")
+    run_parser.add_argument('-k', action='append', help="Only benchmarks whose name matches this regex (repeatable)")
+    run_parser.add_argument('--quick', action='store_true', help="Use the small dataset")
+    for key in SIZES['default']:
+        run_parser.add_argument(f"--{key.replace('_', '-')}", dest=key, type=int, help=f"Number of synthetic {key.replace('_', ' ')}")
+    run_parser.add_argument('--pages', help="Directory of saved .html pages for the scrape benchmark")
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--min-time', type=float, default=0.2, help="Minimum seconds per timed batch")
+    run_parser.add_argument('--db-url', help="Scratch database to use instead of a temporary SQLite file")
+    run_parser.add_argument('--out', help="Report path (default ../benchmark_results/<commit>.json)")
+    run_parser.set_defaults(func=cmd_run)
+
+    compare_parser = commands.add_parser('compare', help="Compare two reports")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help="Relative change reported as slower/faster")
+    compare_parser.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,129 @@
+"""Per-crew and per-run consumption budgets.
+
+A budget limits the tokens, the estimated cost (USD, from litellm's price
+table), the wall-clock time and the number of LLM calls of one run. Unset
+limits are unlimited. A crew can carry a default budget (``MyCrew.budget``).
+A single run can be given a budget of its own. When both limit the same
+quantity, the stricter value applies.
+
+``llm_wrapper`` checks the budget of the run before every LLM call and
+raises ``BudgetExceeded`` once a limit has been reached. crewai then unwinds
+the run. Task outputs finished before that point are already saved (see
+``run_store``), and the run ends with status ``budget_exceeded``. It can be
+resumed from the Results page like any other interrupted run.
+"""
+
+import threading
+import time
+
+LIMITS = {
+    'max_tokens': "Tokens",
+    'max_cost_usd': "Cost (USD)",
+    'max_wall_s': "Wall clock (s)",
+    'max_llm_calls': "LLM calls",
+}
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def normalize(budget):
+    """Keep only the known, positive limits of ``budget``; ValueError when it is not a dict of numbers."""
+    if budget is None:
+        return {}
+    if not isinstance(budget, dict):
+        raise ValueError(f"A budget must be an object with any of: {', '.join(LIMITS)}")
+    normalized = {}
+    for key in LIMITS:
+        value = budget.get(key)
+        if value is None:
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Budget limit {key} must be a number, not {value!r}")
+        if value > 0:
+            normalized[key] = value if key == 'max_cost_usd' else int(value)
+    return normalized
+
+
+def combine(*budgets):
+    """The stricter value of every limit set in any of ``budgets``."""
+    combined = {}
+    for budget in budgets:
+        for key, value in normalize(budget).items():
+            combined[key] = min(combined[key], value) if key in combined else value
+    return combined
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Estimated cost in USD of one call, or None when litellm has no price for ``model``."""
+    if not model:
+        return None
+    try:
+        from litellm import cost_per_token
+        prompt_cost, completion_cost = cost_per_token(
+            model=model,
+            prompt_tokens=prompt_tokens or 0,
+            completion_tokens=completion_tokens or 0,
+        )
+        return prompt_cost + completion_cost
+    except Exception:
+        return None
+
+
+class RunBudget:
+    def __init__(self, limits=None):
+        self.limits = normalize(limits)
+        self.tokens = 0
+        self.cost_usd = 0.0
+        self.llm_calls = 0
+        self.exceeded = None
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def elapsed_s(self):
+        return time.monotonic() - self._started
+
+    def _usage(self, key):
+        return {
+            'max_tokens': self.tokens,
+            'max_cost_usd': self.cost_usd,
+            'max_wall_s': self.elapsed_s(),
+            'max_llm_calls': self.llm_calls,
+        }[key]
+
+    def check(self):
+        """Raise BudgetExceeded if a limit has been reached; called before every LLM call."""
+        with self._lock:
+            if self.exceeded is None:
+                for key, limit in self.limits.items():
+                    used = self._usage(key)
+                    if used >= limit:
+                        self.exceeded = f"{LIMITS[key]} budget exceeded: {round(used, 4)} of {limit}"
+                        break
+            if self.exceeded is not None:
+                raise BudgetExceeded(self.exceeded)
+
+    def add(self, tokens, cost_usd=None):
+        with self._lock:
+            self.tokens += tokens or 0
+            self.cost_usd += cost_usd or 0.0
+            self.llm_calls += 1
+
+    def status(self):
+        """Usage of every limit as a list of {'limit', 'used', 'max', 'fraction'}."""
+        with self._lock:
+            return [
+                {
+                    'limit': LIMITS[key],
+                    'used': round(self._usage(key), 4),
+                    'max': limit,
+                    'fraction': min(self._usage(key) / limit, 1.0),
+                }
+                for key, limit in self.limits.items()
+            ]
+
+    def as_dict(self):
+        return {'limits': self.limits, 'exceeded': self.exceeded}
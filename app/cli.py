@@ -0,0 +1,231 @@
+"""Command line and local HTTP entry point for running stored crews.
+
+Run from the ``app`` directory::
+
+    python -m cli list
+    python -m cli run "Research crew" --inputs '{"topic": "AI agents"}'
+    python -m cli run C_abc123 --inputs-file inputs.json
+    python -m cli run C_abc123 --budget '{"max_tokens": 20000, "max_cost_usd": 0.05}'
+    python -m cli run C_abc123 --profile --profile-out run.folded
+    python -m cli serve --port 8765
+
+HTTP API served by ``serve`` (JSON in and out)::
+
+    GET  /crews                        list crews with their placeholders
+    POST /crews/<id or name>/kickoff   {"inputs": {...}, "wait": false, "budget": {...}}
+    GET  /runs/<run id>                run status, result and saved task outputs
+    GET  /metrics                      process metrics in the Prometheus text format
+"""
+
+import argparse
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import async_runner
+import budgets
+import db_utils
+import headless
+import metrics
+import result_archive
+import run_profiler
+
+
+def crew_as_dict(crew):
+    return {
+        'id': crew.id,
+        'name': crew.name,
+        'process': str(crew.process),
+        'placeholders': sorted(headless.get_placeholders(crew)),
+        'valid': crew.is_valid(),
+    }
+
+
+def cmd_list(args):
+    print(json.dumps([crew_as_dict(crew) for crew in headless.load_crews()], indent=2))
+    return 0
+
+
+def check_run_arguments(inputs, budget):
+    """Error message for inputs or a budget of the wrong shape, or None."""
+    if not isinstance(inputs, dict):
+        return "Inputs must be a JSON object of placeholder values"
+    if budget is not None and not isinstance(budget, dict):
+        return "The budget must be a JSON object"
+    return None
+
+
+def cmd_run(args):
+    try:
+        if args.inputs_file:
+            with open(args.inputs_file, encoding='utf-8') as f:
+                inputs = json.load(f)
+        else:
+            inputs = json.loads(args.inputs or '{}')
+        budget = json.loads(args.budget or '{}')
+    except (OSError, ValueError) as e:
+        print(f"Invalid inputs or budget: {str(e)}", file=sys.stderr)
+        return 2
+    error = check_run_arguments(inputs, budget)
+    if error:
+        print(error, file=sys.stderr)
+        return 2
+    try:
+        result = headless.run(args.crew, inputs, budget=budget, profile=args.profile or bool(args.profile_out))
+    except (LookupError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    data = headless.result_as_dict(result)
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    if args.profile_out:
+        collapsed, _ = run_profiler.load_files(result.id)
+        if collapsed is not None:
+            with open(args.profile_out, 'w', encoding='utf-8') as f:
+                f.write(collapsed)
+    print(json.dumps(data, indent=2))
+    return 0 if result.status == 'completed' else 1
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    run_slots = threading.BoundedSemaphore(4)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def path_parts(self):
+        return [unquote(part) for part in self.path.split('?', 1)[0].strip('/').split('/') if part]
+
+    def do_GET(self):
+        parts = self.path_parts()
+        if parts == ['crews']:
+            self.send_json(200, [crew_as_dict(crew) for crew in headless.load_crews()])
+        elif parts == ['metrics']:
+            metrics.send_metrics(self)
+        elif len(parts) == 2 and parts[0] == 'runs':
+            result = db_utils.load_result(parts[1])
+            if result is None:
+                self.send_json(404, {'error': f"No run with id '{parts[1]}'"})
+            else:
+                self.send_json(200, headless.result_as_dict(result, with_task_outputs=True))
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        parts = self.path_parts()
+        if len(parts) != 3 or parts[0] != 'crews' or parts[2] != 'kickoff':
+            self.send_json(404, {'error': 'Not found'})
+            return
+        try:
+            body = self.read_json()
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self.send_json(400, {'error': f"Invalid JSON: {str(e)}"})
+            return
+        if not isinstance(body, dict):
+            self.send_json(400, {'error': "The request body must be a JSON object"})
+            return
+        error = check_run_arguments(body.get('inputs', {}), body.get('budget'))
+        if error:
+            self.send_json(400, {'error': error})
+            return
+        if not self.run_slots.acquire(blocking=False):
+            self.send_json(429, {'error': 'Too many runs in progress, try again later'})
+            return
+
+        started = threading.Event()
+        outcome = {}
+
+        def on_started(result):
+            outcome['result'] = result
+            started.set()
+
+        def done(future):
+            try:
+                outcome['result'] = future.result()
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                started.set()
+                self.run_slots.release()
+
+        # All runs of the server share one event loop (see async_runner)
+        future = async_runner.submit(headless.run_async(parts[1], body.get('inputs'), on_started=on_started, budget=body.get('budget')))
+        future.add_done_callback(done)
+        if body.get('wait'):
+            try:
+                outcome['result'] = future.result()
+            except Exception as e:
+                outcome['error'] = e
+        else:
+            started.wait()
+
+        error = outcome.get('error')
+        if isinstance(error, LookupError):
+            self.send_json(404, {'error': str(error)})
+        elif isinstance(error, ValueError):
+            self.send_json(400, {'error': str(error)})
+        elif error is not None:
+            self.send_json(500, {'error': str(error)})
+        else:
+            self.send_json(200 if body.get('wait') else 202, headless.result_as_dict(outcome['result']))
+
+
+def cmd_serve(args):
+    headless.setup()
+    async_runner.configure(args.max_runs)
+    ApiHandler.run_slots = threading.BoundedSemaphore(args.max_runs)
+    metrics.start_exporters()
+    result_archive.start_compactor()
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    print(f"Serving crews on http://{args.host}:{args.port} (up to {args.max_runs} runs at a time)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m cli', description="Run CrewAI Studio crews without the UI.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help="List stored crews").set_defaults(func=cmd_list)
+
+    run_parser = subparsers.add_parser('run', help="Run a crew and store its result")
+    run_parser.add_argument('crew', help="Crew id or name")
+    run_parser.add_argument('--inputs', help="Placeholder values as a JSON object")
+    run_parser.add_argument('--inputs-file', help="Path to a JSON file with the placeholder values")
+    run_parser.add_argument('--output-file', help="Also write the result JSON to this file")
+    run_parser.add_argument('--budget', help="Limits for this run as a JSON object with any of: " + ", ".join(budgets.LIMITS))
+    run_parser.add_argument('--profile', action='store_true', help="Profile the run and save the profile with its result")
+    run_parser.add_argument('--profile-out', help="Profile the run and also write its collapsed stacks (flamegraph input) to this file")
+    run_parser.set_defaults(func=cmd_run)
+
+    serve_parser = subparsers.add_parser('serve', help="Serve a small local HTTP API")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--max-runs', type=int, default=4, help="Runs allowed at the same time")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,12 @@
 import sys
 import threading
+import weakref
 from queue import Queue
 import re
+import metrics
+
+# Live captures, for the console buffer metrics
+_captures = weakref.WeakSet()
 
 class ConsoleCapture:
     def __init__(self):
@@ -11,6 +16,7 @@ class ConsoleCapture:
         self._lock = threading.Lock()
         self._line_buffer = ""
         self.active = False
+        _captures.add(self)
         # Pattern pro veškeré ANSI a speciální znaky
         self.clean_pattern = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-9;]*[ -/]*[@-~])|[\x00-\x1F\x7F-\x9F]')
 
@@ -62,4 +68,16 @@ class ConsoleCapture:
         with self._lock:
             while not self.output_queue.empty():
                 messages.append(self.output_queue.get_nowait())
-        return messages
\ No newline at end of file
+        return messages
+
+
+def _buffer_metrics():
+    captures = list(_captures)
+    return [
+        metrics.snapshot('studio_console_captures_active', 'gauge', "Console captures of running crews", (), {(): sum(1 for c in captures if c.active)}),
+        metrics.snapshot('studio_console_buffer_lines', 'gauge', "Captured console lines not yet shown", (), {(): sum(c.output_queue.qsize() for c in captures)}),
+        metrics.snapshot('studio_console_buffer_bytes', 'gauge', "Characters of incomplete captured console lines", (), {(): sum(len(c._line_buffer) for c in captures)}),
+    ]
+
+
+metrics.register_collector(_buffer_metrics)
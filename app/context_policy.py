@@ -0,0 +1,106 @@
+"""Per-task limits on the context passed down from earlier tasks.
+
+crewai hands the raw outputs of every context task to a downstream task, so
+prompts keep growing along a pipeline. A task can choose a context policy:
+
+``full``
+    the outputs as they are (the crewai default)
+``truncate``
+    the first ``max_tokens`` tokens
+``head_tail``
+    the first and the last ``max_tokens / 2`` tokens, with a marker in between
+``summarize``
+    a summary of at most about ``max_tokens`` tokens written by a (cheap)
+    summary LLM, used only when the context is longer than that
+
+Tokens are counted locally (see ``tokenizer``). The token counts of
+the context before and after the policy are reported to the run
+(``instrumentation.record_task_context``) and shown per task with the run's
+prompt tokens.
+"""
+
+from typing import Any, Optional
+
+from crewai import Task
+
+import instrumentation
+from tokenizer import count_tokens, head, tail
+
+POLICIES = {
+    'full': "Full",
+    'truncate': "Truncate",
+    'head_tail': "Head and tail",
+    'summarize': "Summarize",
+}
+
+DEFAULT_MAX_TOKENS = 2000
+
+
+def truncate(text, max_tokens):
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    return head(text, max_tokens) + f"\n\n[... {total - max_tokens} more tokens omitted ...]"
+
+
+def head_tail(text, max_tokens):
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    head_tokens = max_tokens // 2
+    tail_tokens = max_tokens - head_tokens
+    return (
+        head(text, head_tokens)
+        + f"\n\n[... {total - max_tokens} tokens omitted ...]\n\n"
+        + tail(text, tail_tokens)
+    )
+
+
+def summarize(text, max_tokens, llm, task=None):
+    if count_tokens(text) <= max_tokens:
+        return text
+    messages = [
+        {
+            'role': 'system',
+            'content': "You condense the results of earlier work steps for the next step. Keep facts, figures, "
+                       "names, decisions and open questions; drop repetition and filler. Answer with the summary only.",
+        },
+        {
+            'role': 'user',
+            'content': f"Summarize the following in at most {max_tokens} tokens:\n\n{text}",
+        },
+    ]
+    return llm.call(messages, from_task=task)
+
+
+def apply(context, policy, max_tokens, summary_llm=None, task=None):
+    """``context`` reduced according to ``policy``."""
+    if not context or policy in (None, 'full'):
+        return context
+    max_tokens = max(1, int(max_tokens or DEFAULT_MAX_TOKENS))
+    if policy == 'truncate':
+        return truncate(context, max_tokens)
+    if policy == 'head_tail':
+        return head_tail(context, max_tokens)
+    if policy == 'summarize':
+        if summary_llm is None:
+            return head_tail(context, max_tokens)
+        return summarize(context, max_tokens, summary_llm, task)
+    raise ValueError(f"Unknown context policy: {policy}")
+
+
+class ContextPolicyTask(Task):
+    """crewai Task that applies its context policy to the context it is executed with."""
+
+    context_policy: str = 'full'
+    context_max_tokens: int = DEFAULT_MAX_TOKENS
+    context_summary_llm: Any = None
+    # Id of the MyTask the task was built from, stable across runs (see instrumentation.task_key)
+    studio_task_id: Optional[str] = None
+
+    def _execute_core(self, agent, context, tools):
+        if context:
+            full_tokens = count_tokens(context)
+            context = apply(context, self.context_policy, self.context_max_tokens, self.context_summary_llm, self)
+            instrumentation.record_task_context(self, self.context_policy, full_tokens, count_tokens(context))
+        return super()._execute_core(agent, context, tools)
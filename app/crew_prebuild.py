@@ -0,0 +1,105 @@
+"""Background pre-building of the crew selected on the Kickoff page.
+
+Building a crewai crew creates every agent, LLM, tool and knowledge source,
+which for RAG tools and docling sources can take tens of seconds. The Kickoff
+page asks a ``CrewPrebuilder`` to build the selected crew in a background
+thread as soon as it is selected. When "Run crew!" is clicked the built crew
+is taken from the cache if it was built from the same crew version, i.e. the
+same configuration of the crew, its agents, tasks, tools and knowledge
+sources. A built crew is handed out only once, because a run changes its state.
+"""
+
+import dataclasses
+import hashlib
+import json
+import threading
+import time
+
+
+def _model_fields(obj):
+    return {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+
+
+def _agent_version_data(agent):
+    if agent is None:
+        return None
+    data = _model_fields(agent)
+    data['tools'] = [(tool.tool_id, tool.name, tool.parameters, tool.get_cache_ttl_s()) for tool in agent.tools]
+    return data
+
+
+def crew_version(crew, knowledge_sources=None):
+    """Hash of everything ``MyCrew.get_crewai_crew`` builds ``crew`` from."""
+    data = _model_fields(crew)
+    data['agents'] = [_agent_version_data(agent) for agent in crew.agents]
+    data['manager_agent'] = _agent_version_data(crew.manager_agent)
+    data['tasks'] = [
+        {**_model_fields(task), 'agent': _agent_version_data(task.agent)}
+        for task in crew.tasks
+    ]
+    data['knowledge_sources'] = [_model_fields(ks) for ks in knowledge_sources or []]
+    encoded = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+class CrewPrebuilder:
+    """Builds one crew version at a time in the background and hands it out once."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def request(self, crew, knowledge_sources=None):
+        """Start building ``crew`` unless its current version is already built or being built."""
+        version = crew_version(crew, knowledge_sources)
+        with self._lock:
+            if self._entry is not None and self._entry['version'] == version:
+                return self._entry
+            entry = {
+                'version': version,
+                'crew_name': crew.name,
+                'crewai_crew': None,
+                'error': None,
+                'build_s': None,
+                'done': threading.Event(),
+            }
+            self._entry = entry
+        threading.Thread(target=self._build, args=(entry, crew, knowledge_sources), daemon=True, name="crew-prebuild").start()
+        return entry
+
+    @staticmethod
+    def _build(entry, crew, knowledge_sources):
+        started = time.monotonic()
+        try:
+            entry['crewai_crew'] = crew.get_crewai_crew(full_output=True, available_knowledge_sources=knowledge_sources)
+        except Exception as e:
+            entry['error'] = e
+        finally:
+            entry['build_s'] = round(time.monotonic() - started, 3)
+            entry['done'].set()
+
+    def status(self, crew, knowledge_sources=None):
+        """('building' | 'ready' | 'failed' | None, build seconds) for the current version of ``crew``."""
+        entry = self._entry
+        if entry is None or entry['version'] != crew_version(crew, knowledge_sources):
+            return None, None
+        if not entry['done'].is_set():
+            return 'building', None
+        return ('failed' if entry['error'] is not None else 'ready'), entry['build_s']
+
+    def take(self, crew, knowledge_sources=None):
+        """Return (crewai crew, build seconds) pre-built from the current version of ``crew``, or (None, None).
+
+        Waits for a build that is still running. The entry is removed, so the next run gets a fresh build.
+        """
+        version = crew_version(crew, knowledge_sources)
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry['version'] != version:
+                return None, None
+            self._entry = None
+        entry['done'].wait()
+        if entry['error'] is not None:
+            return None, None
+        return entry['crewai_crew'], entry['build_s']
+
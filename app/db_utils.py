@@ -1,8 +1,11 @@
 import sqlite3
 import os
 import json
+import re
+import time
+import metrics
 from my_tools import TOOL_CLASSES
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, create_engine, text
 
 # If you have an environment variable DB_URL for Postgres, use that. 
 # Otherwise, fallback to local SQLite file: 'sqlite:///crewai.db'
@@ -32,15 +35,79 @@ def create_tables():
             data TEXT
         )
     ''')
+    create_rate_limit_sql = text('''
+        CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+            bucket_key TEXT PRIMARY KEY,
+            tokens REAL,
+            updated_at REAL
+        )
+    ''')
+    create_task_outputs_sql = text('''
+        CREATE TABLE IF NOT EXISTS task_outputs (
+            run_id TEXT,
+            task_index INTEGER,
+            data TEXT,
+            PRIMARY KEY (run_id, task_index)
+        )
+    ''')
+    create_tool_cache_sql = text('''
+        CREATE TABLE IF NOT EXISTS tool_cache (
+            cache_key TEXT PRIMARY KEY,
+            tool_id TEXT,
+            data TEXT,
+            size INTEGER,
+            created_at REAL,
+            expires_at REAL,
+            last_used_at REAL
+        )
+    ''')
+    create_tool_cache_stats_sql = text('''
+        CREATE TABLE IF NOT EXISTS tool_cache_stats (
+            tool_id TEXT PRIMARY KEY,
+            hits INTEGER,
+            misses INTEGER
+        )
+    ''')
+    create_render_cache_sql = text('''
+        CREATE TABLE IF NOT EXISTS render_cache (
+            cache_key TEXT PRIMARY KEY,
+            data TEXT,
+            size INTEGER,
+            last_used_at REAL
+        )
+    ''')
+    create_archived_results_sql = text('''
+        CREATE TABLE IF NOT EXISTS archived_results (
+            result_id TEXT PRIMARY KEY,
+            crew_name TEXT,
+            created_at TEXT,
+            archive_file TEXT,
+            archived_at REAL
+        )
+    ''')
     with get_db_connection() as conn:
         conn.execute(create_sql)
+        conn.execute(create_rate_limit_sql)
+        conn.execute(create_task_outputs_sql)
+        conn.execute(create_tool_cache_sql)
+        conn.execute(create_tool_cache_stats_sql)
+        conn.execute(create_render_cache_sql)
+        conn.execute(create_archived_results_sql)
         conn.commit()
+    create_results_index()
+
+# Whether the full-text index of the results was brought up to date in this process
+_results_index_checked = False
 
 def initialize_db():
     """
     Initialize the database by creating tables if they do not exist.
     """
+    global _results_index_checked
     create_tables()
+    if not _results_index_checked:
+        _results_index_checked = True
+        index_missing_results()
 
 
 def save_entity(entity_type, entity_id, data):
@@ -163,19 +230,25 @@ def save_task(task):
         'agent_id': task.agent.id if task.agent else None,
         'context_from_async_tasks_ids': task.context_from_async_tasks_ids,
         'context_from_sync_tasks_ids': task.context_from_sync_tasks_ids,
+        'context_policy': task.context_policy,
+        'context_max_tokens': task.context_max_tokens,
+        'context_summary_llm': task.context_summary_llm,
         'created_at': task.created_at
     }
     save_entity('task', task.id, data)
 
 def load_tasks():
+    from dataclasses import fields
     from my_task import MyTask
     rows = load_entities('task')
     agents_dict = {agent.id: agent for agent in load_agents()}
+    # Stored tasks may carry keys MyTask does not know (older or newer versions), they are ignored
+    task_fields = {field.name for field in fields(MyTask)} - {'id', 'agent'}
     tasks = []
     for row in rows:
         data = row[1]
         agent_id = data.pop('agent_id', None)
-        task = MyTask(id=row[0], agent=agents_dict.get(agent_id), **data)
+        task = MyTask(id=row[0], agent=agents_dict.get(agent_id), **{key: value for key, value in data.items() if key in task_fields})
         tasks.append(task)
     return sorted(tasks, key=lambda x: x.created_at)
 
@@ -197,7 +270,13 @@ def save_crew(crew):
         'manager_llm': crew.manager_llm,
         'manager_agent_id': crew.manager_agent.id if crew.manager_agent else None,
         'created_at': crew.created_at,
-        'knowledge_source_ids': crew.knowledge_source_ids  # Add this line
+        'knowledge_source_ids': crew.knowledge_source_ids,  # Add this line
+        'dag_scheduling': crew.dag_scheduling,
+        'max_parallel_tasks': crew.max_parallel_tasks,
+        'budget': crew.budget,
+        'plan_cache': crew.plan_cache,
+        'retention_mode': crew.retention_mode,
+        'retention_value': crew.retention_value
     }
     save_entity('crew', crew.id, data)
 
@@ -222,7 +301,13 @@ def load_crews():
             max_rpm=data.get('max_rpm'), 
             manager_llm=data.get('manager_llm'),
             manager_agent=agents_dict.get(data.get('manager_agent_id')),
-            knowledge_source_ids=data.get('knowledge_source_ids', [])  # Add this line
+            knowledge_source_ids=data.get('knowledge_source_ids', []),  # Add this line
+            dag_scheduling=data.get('dag_scheduling'),
+            max_parallel_tasks=data.get('max_parallel_tasks'),
+            budget=data.get('budget'),
+            plan_cache=data.get('plan_cache'),
+            retention_mode=data.get('retention_mode'),
+            retention_value=data.get('retention_value')
         )
         crew.agents = [agents_dict[agent_id] for agent_id in data['agent_ids'] if agent_id in agents_dict]
         crew.tasks = [tasks_dict[task_id] for task_id in data['task_ids'] if task_id in tasks_dict]
@@ -236,7 +321,8 @@ def save_tool(tool):
     data = {
         'name': tool.name,
         'description': tool.description,
-        'parameters': tool.get_parameters()
+        'parameters': tool.get_parameters(),
+        'cache_ttl_s': tool.cache_ttl_s
     }
     save_entity('tool', tool.tool_id, data)
 
@@ -248,11 +334,13 @@ def load_tools():
         tool_class = TOOL_CLASSES[data['name']]
         tool = tool_class(tool_id=row[0])
         tool.set_parameters(**data['parameters'])
+        tool.cache_ttl_s = data.get('cache_ttl_s')
         tools.append(tool)
     return tools
 
 def delete_tool(tool_id):
     delete_entity('tool', tool_id)
+    clear_tool_cache(tool_id)
 
 def export_to_json(file_path):
     with get_db_connection() as conn:
@@ -307,28 +395,537 @@ def save_result(result):
         'crew_name': result.crew_name,
         'inputs': result.inputs,
         'result': result.result,
-        'created_at': result.created_at
+        'created_at': result.created_at,
+        'stats': result.stats,
+        'status': result.status,
+        'starred': result.starred
     }
+    stored = load_result_data(result.id)
+    if stored is not None:
+        # Starring (set_result_starred) and restoring (result_archive) only change the stored row,
+        # a run saved again from memory when it finishes must not undo them
+        data['starred'] = result.starred = bool(stored.get('starred', False))
+        if stored.get('restored_at'):
+            data['restored_at'] = stored['restored_at']
     save_entity('result', result.id, data)
+    index_result(result.id, data)
+
+def _result_from_data(result_id, data):
+    from result import Result
+    return Result(
+        id=result_id,
+        crew_id=data['crew_id'],
+        crew_name=data['crew_name'],
+        inputs=data['inputs'],
+        result=data['result'],
+        created_at=data['created_at'],
+        stats=data.get('stats'),
+        status=data.get('status', 'completed'),
+        starred=data.get('starred', False)
+    )
 
 def load_results():
     """Load all results from the database."""
-    from result import Result
     rows = load_entities('result')
-    results = []
-    for row in rows:
-        data = row[1]
-        result = Result(
-            id=row[0],
-            crew_id=data['crew_id'],
-            crew_name=data['crew_name'],
-            inputs=data['inputs'],
-            result=data['result'],
-            created_at=data['created_at']
-        )
-        results.append(result)
+    results = [_result_from_data(row[0], row[1]) for row in rows]
     return sorted(results, key=lambda x: x.created_at, reverse=True)
 
-def delete_result(result_id):
-    """Delete a result from the database."""
-    delete_entity('result', result_id)
\ No newline at end of file
+def load_result(result_id):
+    """Load a single result by id, or None."""
+    data = load_result_data(result_id)
+    if data is None:
+        return None
+    return _result_from_data(result_id, data)
+
+def load_results_by_ids(result_ids):
+    """The results with the given ids that exist, in the order of ``result_ids``."""
+    if not result_ids:
+        return []
+    query = text("SELECT id, data FROM entities WHERE entity_type = 'result' AND id IN :ids").bindparams(bindparam('ids', expanding=True))
+    with get_db_connection() as conn:
+        rows = conn.execute(query, {"ids": list(result_ids)}).fetchall()
+    results = {row[0]: _result_from_data(row[0], json.loads(row[1])) for row in rows}
+    return [results[result_id] for result_id in result_ids if result_id in results]
+
+def load_result_data(result_id):
+    """The stored data of a result as saved by save_result, or None."""
+    query = text("SELECT data FROM entities WHERE entity_type = 'result' AND id = :id")
+    with get_db_connection() as conn:
+        row = conn.execute(query, {"id": result_id}).fetchone()
+    return json.loads(row[0]) if row is not None else None
+
+def set_result_starred(result_id, starred):
+    data = load_result_data(result_id)
+    if data is not None:
+        data['starred'] = bool(starred)
+        save_entity('result', result_id, data)
+
+def delete_result(result_id, archived=False):
+    """Delete a result from the database. Results moved to the archive (archived=True) stay in the search index."""
+    delete_entity('result', result_id)
+    delete_entity('profile', _profile_id(result_id))
+    delete_task_outputs(result_id)
+    if not archived:
+        unindex_result(result_id)
+        delete_archived_result(result_id)
+
+def save_archived_result(result_id, crew_name, created_at, archive_file, archived_at):
+    upsert_sql = text('''
+        INSERT INTO archived_results (result_id, crew_name, created_at, archive_file, archived_at)
+        VALUES (:id, :crew_name, :created_at, :archive_file, :archived_at)
+        ON CONFLICT(result_id) DO UPDATE
+            SET crew_name = EXCLUDED.crew_name,
+                created_at = EXCLUDED.created_at,
+                archive_file = EXCLUDED.archive_file,
+                archived_at = EXCLUDED.archived_at
+    ''')
+    with get_db_connection() as conn:
+        conn.execute(upsert_sql, {"id": result_id, "crew_name": crew_name, "created_at": created_at, "archive_file": archive_file, "archived_at": archived_at})
+        conn.commit()
+
+def load_archived_results(result_ids=None):
+    """Archived results (see result_archive) by id: dicts with crew_name, created_at, archive_file and archived_at."""
+    if result_ids is not None and not result_ids:
+        return {}
+    sql = 'SELECT result_id, crew_name, created_at, archive_file, archived_at FROM archived_results'
+    params = {}
+    if result_ids is not None:
+        sql += ' WHERE result_id IN :ids'
+        params['ids'] = list(result_ids)
+    statement = text(sql)
+    if result_ids is not None:
+        statement = statement.bindparams(bindparam('ids', expanding=True))
+    with get_db_connection() as conn:
+        rows = conn.execute(statement, params).fetchall()
+    return {
+        row[0]: {'result_id': row[0], 'crew_name': row[1], 'created_at': row[2], 'archive_file': row[3], 'archived_at': row[4]}
+        for row in rows
+    }
+
+def delete_archived_result(result_id):
+    with get_db_connection() as conn:
+        conn.execute(text('DELETE FROM archived_results WHERE result_id = :id'), {"id": result_id})
+        conn.commit()
+
+def save_plan(plan_key, data):
+    save_entity('plan', plan_key, data)
+
+def load_plan(plan_key):
+    """A cached crew plan (see plan_cache), or None."""
+    query = text("SELECT data FROM entities WHERE entity_type = 'plan' AND id = :id")
+    with get_db_connection() as conn:
+        row = conn.execute(query, {"id": plan_key}).fetchone()
+    return json.loads(row[0]) if row is not None else None
+
+def _profile_id(result_id):
+    # Entity ids are unique across entity types
+    return f"PROF_{result_id}"
+
+def save_profile(result_id, data):
+    save_entity('profile', _profile_id(result_id), data)
+
+def load_profile(result_id):
+    """The profile saved for a run (see run_profiler), or None."""
+    query = text("SELECT data FROM entities WHERE entity_type = 'profile' AND id = :id")
+    with get_db_connection() as conn:
+        row = conn.execute(query, {"id": _profile_id(result_id)}).fetchone()
+    return json.loads(row[0]) if row is not None else None
+
+def save_task_output(run_id, task_index, data):
+    """Save (or replace) the output of one task of a run."""
+    upsert_sql = text('''
+        INSERT INTO task_outputs (run_id, task_index, data)
+        VALUES (:run_id, :task_index, :data)
+        ON CONFLICT(run_id, task_index) DO UPDATE
+            SET data = EXCLUDED.data
+    ''')
+    with get_db_connection() as conn:
+        conn.execute(upsert_sql, {"run_id": run_id, "task_index": task_index, "data": json.dumps(data)})
+        conn.commit()
+
+def load_task_outputs(run_id):
+    """Load the task outputs saved for a run, ordered by task index."""
+    query = text('SELECT task_index, data FROM task_outputs WHERE run_id = :run_id ORDER BY task_index')
+    with get_db_connection() as conn:
+        rows = conn.execute(query, {"run_id": run_id}).fetchall()
+    return [{'index': row[0], **json.loads(row[1])} for row in rows]
+
+def delete_task_outputs(run_id):
+    with get_db_connection() as conn:
+        conn.execute(text('DELETE FROM task_outputs WHERE run_id = :run_id'), {"run_id": run_id})
+        conn.commit()
+
+def get_tool_cache_entry(cache_key, now):
+    """The cached data for ``cache_key`` if it has not expired, else None."""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            text('SELECT data FROM tool_cache WHERE cache_key = :key AND expires_at > :now'),
+            {"key": cache_key, "now": now}
+        ).fetchone()
+        if row is not None:
+            conn.execute(text('UPDATE tool_cache SET last_used_at = :now WHERE cache_key = :key'), {"key": cache_key, "now": now})
+            conn.commit()
+    return row[0] if row is not None else None
+
+def save_tool_cache_entry(cache_key, tool_id, data, size, now, expires_at):
+    upsert_sql = text('''
+        INSERT INTO tool_cache (cache_key, tool_id, data, size, created_at, expires_at, last_used_at)
+        VALUES (:key, :tool_id, :data, :size, :now, :expires_at, :now)
+        ON CONFLICT(cache_key) DO UPDATE
+            SET data = EXCLUDED.data,
+                size = EXCLUDED.size,
+                created_at = EXCLUDED.created_at,
+                expires_at = EXCLUDED.expires_at,
+                last_used_at = EXCLUDED.last_used_at
+    ''')
+    with get_db_connection() as conn:
+        conn.execute(upsert_sql, {"key": cache_key, "tool_id": tool_id, "data": data, "size": size, "now": now, "expires_at": expires_at})
+        conn.commit()
+
+def evict_tool_cache(max_bytes, now):
+    """Drop expired entries, then the least recently used ones until the cache fits in ``max_bytes``."""
+    with get_db_connection() as conn:
+        conn.execute(text('DELETE FROM tool_cache WHERE expires_at <= :now'), {"now": now})
+        total = conn.execute(text('SELECT COALESCE(SUM(size), 0) FROM tool_cache')).scalar()
+        if total > max_bytes:
+            rows = conn.execute(text('SELECT cache_key, size FROM tool_cache ORDER BY last_used_at')).fetchall()
+            evicted = []
+            for cache_key, size in rows:
+                if total <= max_bytes:
+                    break
+                evicted.append(cache_key)
+                total -= size
+            for cache_key in evicted:
+                conn.execute(text('DELETE FROM tool_cache WHERE cache_key = :key'), {"key": cache_key})
+        conn.commit()
+
+def get_render_cache_entry(cache_key, now):
+    """The rendered Markdown stored under ``cache_key`` (see render_cache), or None."""
+    with get_db_connection() as conn:
+        row = conn.execute(text('SELECT data FROM render_cache WHERE cache_key = :key'), {"key": cache_key}).fetchone()
+        if row is not None:
+            conn.execute(text('UPDATE render_cache SET last_used_at = :now WHERE cache_key = :key'), {"key": cache_key, "now": now})
+            conn.commit()
+    return row[0] if row is not None else None
+
+def save_render_cache_entry(cache_key, data, size, now):
+    upsert_sql = text('''
+        INSERT INTO render_cache (cache_key, data, size, last_used_at)
+        VALUES (:key, :data, :size, :now)
+        ON CONFLICT(cache_key) DO UPDATE
+            SET data = EXCLUDED.data,
+                size = EXCLUDED.size,
+                last_used_at = EXCLUDED.last_used_at
+    ''')
+    with get_db_connection() as conn:
+        conn.execute(upsert_sql, {"key": cache_key, "data": data, "size": size, "now": now})
+        conn.commit()
+
+def evict_render_cache(max_bytes):
+    """Drop the least recently used rendered Markdown until the table fits in ``max_bytes``."""
+    with get_db_connection() as conn:
+        total = conn.execute(text('SELECT COALESCE(SUM(size), 0) FROM render_cache')).scalar()
+        if total > max_bytes:
+            rows = conn.execute(text('SELECT cache_key, size FROM render_cache ORDER BY last_used_at')).fetchall()
+            evicted = []
+            for cache_key, size in rows:
+                if total <= max_bytes:
+                    break
+                evicted.append(cache_key)
+                total -= size
+            for cache_key in evicted:
+                conn.execute(text('DELETE FROM render_cache WHERE cache_key = :key'), {"key": cache_key})
+        conn.commit()
+
+def record_tool_cache_stats(tool_id, hits=0, misses=0):
+    upsert_sql = text('''
+        INSERT INTO tool_cache_stats (tool_id, hits, misses)
+        VALUES (:tool_id, :hits, :misses)
+        ON CONFLICT(tool_id) DO UPDATE
+            SET hits = tool_cache_stats.hits + EXCLUDED.hits,
+                misses = tool_cache_stats.misses + EXCLUDED.misses
+    ''')
+    with get_db_connection() as conn:
+        conn.execute(upsert_sql, {"tool_id": tool_id, "hits": hits, "misses": misses})
+        conn.commit()
+
+def load_tool_cache_stats():
+    """{tool_id: {'hits', 'misses', 'entries', 'bytes'}} for every tool that used the cache."""
+    stats = {}
+    with get_db_connection() as conn:
+        for tool_id, hits, misses in conn.execute(text('SELECT tool_id, hits, misses FROM tool_cache_stats')).fetchall():
+            stats[tool_id] = {'hits': hits, 'misses': misses, 'entries': 0, 'bytes': 0}
+        for tool_id, entries, size in conn.execute(text('SELECT tool_id, COUNT(*), COALESCE(SUM(size), 0) FROM tool_cache GROUP BY tool_id')).fetchall():
+            stats.setdefault(tool_id, {'hits': 0, 'misses': 0})
+            stats[tool_id]['entries'] = entries
+            stats[tool_id]['bytes'] = size
+    return stats
+
+def clear_tool_cache(tool_id=None):
+    """Delete the cached results (and hit counts) of one tool, or of all tools."""
+    with get_db_connection() as conn:
+        if tool_id is None:
+            conn.execute(text('DELETE FROM tool_cache'))
+            conn.execute(text('DELETE FROM tool_cache_stats'))
+        else:
+            conn.execute(text('DELETE FROM tool_cache WHERE tool_id = :tool_id'), {"tool_id": tool_id})
+            conn.execute(text('DELETE FROM tool_cache_stats WHERE tool_id = :tool_id'), {"tool_id": tool_id})
+        conn.commit()
+
+# Full-text index of the results: an FTS5 table on SQLite, a tsvector column with a GIN index on Postgres.
+# It is kept up to date by save_result and delete_result.
+
+def _is_postgres():
+    return engine.dialect.name == 'postgresql'
+
+def create_results_index():
+    if _is_postgres():
+        statements = [
+            '''
+            CREATE TABLE IF NOT EXISTS results_search (
+                result_id TEXT PRIMARY KEY,
+                crew_name TEXT,
+                created_at TEXT,
+                content TEXT,
+                document TSVECTOR
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS results_search_document_idx ON results_search USING GIN (document)',
+            'CREATE INDEX IF NOT EXISTS results_search_crew_idx ON results_search (crew_name, created_at)',
+        ]
+    else:
+        # FTS5 only looks rows up quickly by rowid, results_fts_ids gives every result a fixed one
+        statements = ['''
+            CREATE TABLE IF NOT EXISTS results_fts_ids (
+                fts_rowid INTEGER PRIMARY KEY,
+                result_id TEXT UNIQUE
+            )
+        ''', '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+                result_id UNINDEXED,
+                crew UNINDEXED,
+                created_at UNINDEXED,
+                crew_name,
+                inputs,
+                output,
+                tokenize = 'porter unicode61'
+            )
+        ''']
+    with get_db_connection() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+        conn.commit()
+
+def _result_search_fields(result_id, data):
+    """(inputs text, output text) of a result as indexed for search."""
+    from utils import format_result
+    inputs = "\n".join(f"{key}: {value}" for key, value in (data.get('inputs') or {}).items())
+    result = data.get('result')
+    parts = []
+    try:
+        if result is not None:
+            parts.append(str(format_result(result)))
+        tasks_output = result.get('tasks_output') if isinstance(result, dict) else None
+    except Exception:
+        tasks_output = None
+    if not tasks_output and data.get('status', 'completed') != 'completed':
+        # Unfinished runs: search the task outputs saved so far
+        tasks_output = load_task_outputs(result_id)
+    for task_output in tasks_output or []:
+        if isinstance(task_output, dict) and task_output.get('raw'):
+            parts.append(task_output['raw'])
+    return inputs, "\n\n".join(part for part in parts if part)
+
+def index_result(result_id, data):
+    inputs, output = _result_search_fields(result_id, data)
+    params = {
+        "id": result_id,
+        "crew": data.get('crew_name') or '',
+        "created_at": data.get('created_at') or '',
+        "inputs": inputs,
+        "output": output,
+        "content": f"{inputs}\n\n{output}",
+    }
+    with get_db_connection() as conn:
+        if _is_postgres():
+            conn.execute(text('''
+                INSERT INTO results_search (result_id, crew_name, created_at, content, document)
+                VALUES (:id, :crew, :created_at, :content,
+                        setweight(to_tsvector('simple', :crew), 'A')
+                        || setweight(to_tsvector('english', :inputs), 'A')
+                        || to_tsvector('english', :output))
+                ON CONFLICT(result_id) DO UPDATE
+                    SET crew_name = EXCLUDED.crew_name,
+                        created_at = EXCLUDED.created_at,
+                        content = EXCLUDED.content,
+                        document = EXCLUDED.document
+            '''), params)
+        else:
+            conn.execute(text('INSERT INTO results_fts_ids (result_id) VALUES (:id) ON CONFLICT(result_id) DO NOTHING'), params)
+            params['rowid'] = conn.execute(text('SELECT fts_rowid FROM results_fts_ids WHERE result_id = :id'), params).scalar()
+            conn.execute(text('DELETE FROM results_fts WHERE rowid = :rowid'), params)
+            conn.execute(text('''
+                INSERT INTO results_fts (rowid, result_id, crew, created_at, crew_name, inputs, output)
+                VALUES (:rowid, :id, :crew, :created_at, :crew, :inputs, :output)
+            '''), params)
+        conn.commit()
+
+def unindex_result(result_id):
+    with get_db_connection() as conn:
+        if _is_postgres():
+            conn.execute(text('DELETE FROM results_search WHERE result_id = :id'), {"id": result_id})
+        else:
+            rowid = conn.execute(text('SELECT fts_rowid FROM results_fts_ids WHERE result_id = :id'), {"id": result_id}).scalar()
+            if rowid is not None:
+                conn.execute(text('DELETE FROM results_fts WHERE rowid = :rowid'), {"rowid": rowid})
+                conn.execute(text('DELETE FROM results_fts_ids WHERE fts_rowid = :rowid'), {"rowid": rowid})
+        conn.commit()
+
+def index_missing_results():
+    """Index the results saved before the index existed."""
+    if _is_postgres():
+        query = text("SELECT id, data FROM entities WHERE entity_type = 'result' AND id NOT IN (SELECT result_id FROM results_search)")
+    else:
+        query = text("SELECT id, data FROM entities WHERE entity_type = 'result' AND id NOT IN (SELECT result_id FROM results_fts_ids)")
+    with get_db_connection() as conn:
+        if not _is_postgres():
+            # Indexes built before results_fts_ids existed keep their rows, including those of archived results
+            conn.execute(text('''
+                INSERT INTO results_fts_ids (fts_rowid, result_id)
+                SELECT rowid, result_id FROM results_fts
+                WHERE result_id NOT IN (SELECT result_id FROM results_fts_ids)
+                ON CONFLICT DO NOTHING
+            '''))
+            conn.commit()
+        rows = conn.execute(query).fetchall()
+    for result_id, data in rows:
+        index_result(result_id, json.loads(data))
+
+def _fts5_query(query):
+    """The words and "quoted phrases" of ``query`` as an FTS5 query that needs all of them; the last word may be a prefix."""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        tokens = re.findall(r'\w+', phrase or word)
+        if tokens:
+            terms.append('"' + ' '.join(tokens) + '"')
+    if terms and not query.rstrip().endswith('"'):
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+def _search_filters(crew_names, day, crew_column):
+    clauses, params = [], {}
+    if crew_names:
+        clauses.append(f"{crew_column} IN :crews")
+        params['crews'] = list(crew_names)
+    if day:
+        # ISO timestamps start with the date
+        clauses.append("created_at LIKE :day")
+        params['day'] = f"{day.isoformat()}%"
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+def _search_statement(sql, params):
+    statement = text(sql)
+    if 'crews' in params:
+        statement = statement.bindparams(bindparam('crews', expanding=True))
+    return statement
+
+def count_search_results(query, crew_names=None, day=None):
+    """Number of results matching the full-text ``query`` (and the crew and day filters)."""
+    if _is_postgres():
+        filters, params = _search_filters(crew_names, day, 'crew_name')
+        sql = f"SELECT COUNT(*) FROM results_search WHERE document @@ websearch_to_tsquery('english', :query){filters}"
+        params['query'] = query
+    else:
+        params = {'query': _fts5_query(query)}
+        if not params['query']:
+            return 0
+        filters, filter_params = _search_filters(crew_names, day, 'crew')
+        sql = f"SELECT COUNT(*) FROM results_fts WHERE results_fts MATCH :query{filters}"
+        params.update(filter_params)
+    with get_db_connection() as conn:
+        return conn.execute(_search_statement(sql, params), params).scalar()
+
+def search_results(query, crew_names=None, day=None, limit=20, offset=0):
+    """Results matching the full-text ``query``, best first: dicts with result_id, crew_name, created_at, rank and a snippet (matches in **bold**)."""
+    if _is_postgres():
+        filters, params = _search_filters(crew_names, day, 'crew_name')
+        # Headlines are only computed for the page of hits, they read the whole content
+        sql = f'''
+            SELECT result_id, crew_name, created_at, rank,
+                   ts_headline('english', content, query, 'StartSel=**, StopSel=**, MaxFragments=2, MaxWords=24, MinWords=8, FragmentDelimiter=" … "')
+            FROM (
+                SELECT result_id, crew_name, created_at, content, query, ts_rank_cd(document, query) AS rank
+                FROM results_search, websearch_to_tsquery('english', :query) AS query
+                WHERE document @@ query{filters}
+                ORDER BY rank DESC, created_at DESC
+                LIMIT :limit OFFSET :offset
+            ) AS hits
+            ORDER BY rank DESC, created_at DESC
+        '''
+        params['query'] = query
+    else:
+        params = {'query': _fts5_query(query)}
+        if not params['query']:
+            return []
+        filters, filter_params = _search_filters(crew_names, day, 'crew')
+        # bm25 is lower for better matches; matches in the crew name and inputs count more than in the output
+        sql = f'''
+            SELECT result_id, crew, created_at, bm25(results_fts, 0, 0, 0, 2.0, 3.0, 1.0) AS rank,
+                   snippet(results_fts, -1, '**', '**', ' … ', 24)
+            FROM results_fts
+            WHERE results_fts MATCH :query{filters}
+            ORDER BY rank, created_at DESC
+            LIMIT :limit OFFSET :offset
+        '''
+        params.update(filter_params)
+    params.update({'limit': limit, 'offset': offset})
+    with get_db_connection() as conn:
+        rows = conn.execute(_search_statement(sql, params), params).fetchall()
+    return [
+        {'result_id': row[0], 'crew_name': row[1], 'created_at': row[2], 'rank': row[3], 'snippet': row[4]}
+        for row in rows
+    ]
+
+def _lock_rate_limit_bucket(conn, bucket_key, capacity):
+    """
+    Lock (creating it if needed) a rate limit bucket row inside the current
+    transaction and return its (tokens, updated_at).
+    """
+    conn.execute(text('''
+        INSERT INTO rate_limit_buckets (bucket_key, tokens, updated_at)
+        VALUES (:key, :tokens, :now)
+        ON CONFLICT(bucket_key) DO NOTHING
+    '''), {"key": bucket_key, "tokens": float(capacity), "now": time.time()})
+    if engine.dialect.name == 'postgresql':
+        query = text('SELECT tokens, updated_at FROM rate_limit_buckets WHERE bucket_key = :key FOR UPDATE')
+    else:
+        # SQLite has no row locks; a no-op write takes the database write lock
+        conn.execute(text('UPDATE rate_limit_buckets SET tokens = tokens WHERE bucket_key = :key'), {"key": bucket_key})
+        query = text('SELECT tokens, updated_at FROM rate_limit_buckets WHERE bucket_key = :key')
+    row = conn.execute(query, {"key": bucket_key}).mappings().one()
+    return row["tokens"], row["updated_at"]
+
+def _update_rate_limit_bucket(conn, bucket_key, capacity, refill_per_second, amount):
+    tokens, updated_at = _lock_rate_limit_bucket(conn, bucket_key, capacity)
+    now = time.time()
+    tokens = min(float(capacity), tokens + max(now - updated_at, 0) * refill_per_second)
+    tokens = min(float(capacity), tokens - amount)
+    conn.execute(
+        text('UPDATE rate_limit_buckets SET tokens = :tokens, updated_at = :now WHERE bucket_key = :key'),
+        {"key": bucket_key, "tokens": tokens, "now": now}
+    )
+    return tokens
+
+def reserve_rate_limit_tokens(bucket_key, capacity, refill_per_second, amount):
+    """Reserve tokens from a shared bucket and return the seconds to wait before using them."""
+    with engine.begin() as conn:
+        tokens = _update_rate_limit_bucket(conn, bucket_key, capacity, refill_per_second, amount)
+    return 0.0 if tokens >= 0 else -tokens / refill_per_second
+
+def adjust_rate_limit_tokens(bucket_key, capacity, refill_per_second, amount):
+    """Take (positive amount) or give back (negative amount) tokens after a request finished."""
+    with engine.begin() as conn:
+        _update_rate_limit_bucket(conn, bucket_key, capacity, refill_per_second, amount)
+
+# Time every public function of this module for the metrics (studio_db_query_seconds)
+metrics.instrument_functions(globals(), __name__, metrics.DB_QUERY_SECONDS, skip={'get_db_connection'})
@@ -0,0 +1,293 @@
+"""Local OpenAI-compatible stub server behind the "Local Fake" LLM provider.
+
+It answers ``POST /v1/chat/completions`` (plain and streamed) and
+``GET /v1/models`` without any model, so crews can be load-tested and
+benchmarked offline: everything the Studio does around the LLM calls (crew
+build, database, console capture, result storage) runs for real.
+
+Each model name is a profile::
+
+    {
+        "latency": {"distribution": "lognormal", "mean_s": 0.8, "stddev_s": 0.3, "min_s": 0, "max_s": 10},
+        "tokens_per_second": 60,      # 0 = the whole answer at once
+        "response_tokens": 40,        # length of the default answer
+        "script": [                   # first matching rule wins, else the default answer
+            {"match": "regex on the prompt", "response": "text" or ["cycled", "texts"]},
+            {"match": "Search", "tool_calls": [{"name": "Search the internet", "arguments": {"query": "x"}}]}
+        ]
+    }
+
+``latency`` is the time to the first token; ``distribution`` is one of
+``fixed`` (``mean_s``), ``uniform`` (``min_s``..``max_s``), ``normal`` or
+``lognormal``. A rule with ``tool_calls`` returns native OpenAI tool calls when
+the request offers tools, and crewai's ReAct ``Action`` / ``Action Input``
+text otherwise. The built-in profiles are in ``PROFILES``; ``FAKE_LLM_CONFIG``
+can point to a JSON file of profiles that are added or override them.
+
+Started in the background by ``llms.create_fake_llm`` on first use, or on its
+own (from the ``app`` directory) to share it between processes::
+
+    python -m fake_llm_server --port 8790
+
+and then ``FAKE_LLM_BASE=http://127.0.0.1:8790/v1``.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tokenizer import count_tokens
+
+PROFILES = {
+    'fake-instant': {
+        'latency': {'distribution': 'fixed', 'mean_s': 0},
+        'tokens_per_second': 0,
+        'response_tokens': 20,
+    },
+    'fake-fast': {
+        'latency': {'distribution': 'lognormal', 'mean_s': 0.3, 'stddev_s': 0.1},
+        'tokens_per_second': 200,
+        'response_tokens': 60,
+    },
+    'fake-realistic': {
+        'latency': {'distribution': 'lognormal', 'mean_s': 0.8, 'stddev_s': 0.4, 'max_s': 10},
+        'tokens_per_second': 60,
+        'response_tokens': 150,
+    },
+    'fake-slow': {
+        'latency': {'distribution': 'normal', 'mean_s': 3, 'stddev_s': 1, 'min_s': 0.5},
+        'tokens_per_second': 15,
+        'response_tokens': 300,
+    },
+}
+
+_FILLER = (
+    "The analysis covers the main points of the task and summarises the relevant findings "
+    "with supporting details examples and a short conclusion for the reader"
+).split()
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def load_profiles(config_path=None):
+    profiles = {name: dict(profile) for name, profile in PROFILES.items()}
+    config_path = config_path or os.getenv('FAKE_LLM_CONFIG')
+    if config_path:
+        with open(config_path, encoding='utf-8') as f:
+            profiles.update(json.load(f))
+    return profiles
+
+
+def sample_latency(latency):
+    latency = latency or {}
+    distribution = latency.get('distribution', 'fixed')
+    mean = float(latency.get('mean_s', 0))
+    stddev = float(latency.get('stddev_s', 0))
+    if distribution == 'uniform':
+        value = random.uniform(float(latency.get('min_s', 0)), float(latency.get('max_s', mean * 2)))
+    elif distribution == 'normal':
+        value = random.gauss(mean, stddev)
+    elif distribution == 'lognormal' and mean > 0:
+        # Parameters of the underlying normal distribution for the requested mean and stddev
+        sigma2 = math.log(1 + (stddev / mean) ** 2)
+        value = random.lognormvariate(math.log(mean) - sigma2 / 2, sigma2 ** 0.5)
+    else:
+        value = mean
+    return min(max(value, float(latency.get('min_s', 0))), float(latency.get('max_s', float('inf'))))
+
+
+class Responder:
+    """Picks the answer of one profile for a request."""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self._cycles = {}
+        self._lock = threading.Lock()
+
+    def _next(self, index, responses):
+        if isinstance(responses, str):
+            return responses
+        with self._lock:
+            if index not in self._cycles:
+                self._cycles[index] = itertools.cycle(responses)
+            return next(self._cycles[index])
+
+    def default_text(self):
+        words = list(itertools.islice(itertools.cycle(_FILLER), max(1, int(self.profile.get('response_tokens', 40)))))
+        return "Thought: I now can give a great answer\nFinal Answer: " + " ".join(words).capitalize() + "."
+
+    def respond(self, prompt, offers_tools):
+        """(text, tool calls) for ``prompt``."""
+        for index, rule in enumerate(self.profile.get('script') or []):
+            if rule.get('match') and not re.search(rule['match'], prompt, re.IGNORECASE | re.DOTALL):
+                continue
+            tool_calls = rule.get('tool_calls')
+            if tool_calls and offers_tools:
+                return None, [
+                    {
+                        'id': f"call_{uuid.uuid4().hex[:12]}",
+                        'type': 'function',
+                        'function': {'name': call['name'], 'arguments': json.dumps(call.get('arguments') or {})},
+                    }
+                    for call in tool_calls
+                ]
+            if tool_calls:
+                call = tool_calls[0]
+                return (
+                    f"Thought: I need to use a tool\nAction: {call['name']}\n"
+                    f"Action Input: {json.dumps(call.get('arguments') or {})}"
+                ), None
+            return self._next(index, rule.get('response', '')), None
+        return self.default_text(), None
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    profiles = {}
+    responders = {}
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self.send_json(200, {'object': 'list', 'data': [{'id': name, 'object': 'model', 'owned_by': 'local-fake'} for name in self.profiles]})
+        else:
+            self.send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_json(404, {'error': {'message': 'Not found'}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        model = str(request.get('model', ''))
+        name = model.split('/', 1)[-1]
+        profile = self.profiles.get(name) or self.profiles['fake-instant']
+        responder = self.responders.setdefault(name, Responder(profile))
+
+        prompt = "\n".join(str(message.get('content') or '') for message in request.get('messages') or [])
+        text, tool_calls = responder.respond(prompt, bool(request.get('tools')))
+        usage = {
+            'prompt_tokens': count_tokens(prompt),
+            'completion_tokens': count_tokens(text) if text else 10 * len(tool_calls),
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+        time.sleep(sample_latency(profile.get('latency')))
+        if request.get('stream'):
+            self.stream(model, text, tool_calls, usage, profile, request)
+        else:
+            self.complete(model, text, tool_calls, usage, profile)
+
+    def _completion_id(self):
+        return f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+    def complete(self, model, text, tool_calls, usage, profile):
+        tokens_per_second = float(profile.get('tokens_per_second') or 0)
+        if tokens_per_second > 0:
+            time.sleep(usage['completion_tokens'] / tokens_per_second)
+        message = {'role': 'assistant', 'content': text}
+        if tool_calls:
+            message['tool_calls'] = tool_calls
+        self.send_json(200, {
+            'id': self._completion_id(),
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': message, 'finish_reason': 'tool_calls' if tool_calls else 'stop'}],
+            'usage': usage,
+        })
+
+    def stream(self, model, text, tool_calls, usage, profile, request):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        completion_id = self._completion_id()
+        created = int(time.time())
+
+        def send(delta, finish_reason=None, extra=None):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        tokens_per_second = float(profile.get('tokens_per_second') or 0)
+        if tool_calls:
+            send({'role': 'assistant', 'tool_calls': [{**call, 'index': index} for index, call in enumerate(tool_calls)]})
+        else:
+            # Whitespace separated pieces stand in for tokens
+            for piece in re.findall(r'\S+\s*|\s+', text):
+                send({'content': piece})
+                if tokens_per_second > 0:
+                    time.sleep(1 / tokens_per_second)
+        send({}, 'tool_calls' if tool_calls else 'stop')
+        if (request.get('stream_options') or {}).get('include_usage'):
+            self.wfile.write(f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage})}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def make_server(host='127.0.0.1', port=0, config_path=None):
+    handler = type('ConfiguredFakeLLMHandler', (FakeLLMHandler,), {'profiles': load_profiles(config_path), 'responders': {}})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def ensure_running():
+    """Base URL of the fake server of this process, starting it in a daemon thread on first use."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            server = make_server(port=int(os.getenv('FAKE_LLM_PORT', '0')))
+            threading.Thread(target=server.serve_forever, name="fake-llm-server", daemon=True).start()
+            _server = server
+        host, port = _server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m fake_llm_server', description="Serve the Local Fake LLM provider.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--config', help="JSON file with additional model profiles")
+    args = parser.parse_args(argv)
+    server = make_server(args.host, args.port, args.config)
+    print(f"Fake LLM server on http://{args.host}:{args.port}/v1 (models: {', '.join(server.RequestHandlerClass.profiles)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,156 @@
+"""Run stored crews without the Streamlit UI.
+
+Crews are loaded from the same database through ``db_utils`` and built with
+``MyCrew.get_crewai_crew``, so they use the same tools and LLM setup as the app.
+Every run is written as a ``Result`` with incrementally saved task outputs (see
+``run_store``). Used by ``cli``.
+"""
+
+import re
+import threading
+import time
+import traceback
+
+from dotenv import load_dotenv
+
+import async_runner
+import budgets
+import db_utils
+import instrumentation
+import plan_cache
+import run_profiler
+import run_store
+from llms import load_secrets_from_env
+from ssl_override import disable_ssl_verification
+
+_setup_done = False
+_setup_lock = threading.Lock()
+
+
+def setup():
+    """Prepare the process for running crews (once)."""
+    global _setup_done
+    with _setup_lock:
+        if _setup_done:
+            return
+        load_dotenv(override=True)
+        disable_ssl_verification()
+        load_secrets_from_env()
+        db_utils.initialize_db()
+        _setup_done = True
+
+
+def load_crews():
+    setup()
+    return db_utils.load_crews()
+
+
+def find_crew(crew_ref, crews=None):
+    """Find a crew by id, then by exact name, then by case-insensitive name."""
+    crews = crews if crews is not None else load_crews()
+    for match in (
+        lambda c: c.id == crew_ref,
+        lambda c: c.name == crew_ref,
+        lambda c: c.name.lower() == str(crew_ref).lower(),
+    ):
+        crew = next((c for c in crews if match(c)), None)
+        if crew is not None:
+            return crew
+    raise LookupError(f"No crew with id or name '{crew_ref}'")
+
+
+def get_placeholders(crew):
+    placeholders = set()
+    for task in crew.tasks:
+        placeholders.update(re.findall(r'\{(.*?)\}', task.description))
+        placeholders.update(re.findall(r'\{(.*?)\}', task.expected_output))
+    for agent in crew.agents:
+        for attr in ('role', 'backstory', 'goal'):
+            placeholders.update(re.findall(r'\{(.*?)\}', getattr(agent, attr)))
+    return placeholders
+
+
+def result_as_dict(result, with_task_outputs=False):
+    data = {
+        'id': result.id,
+        'crew_name': result.crew_name,
+        'status': result.status,
+        'created_at': result.created_at,
+        'inputs': result.inputs,
+        'result': result.result,
+        'stats': result.stats,
+    }
+    if with_task_outputs:
+        data['tasks_output'] = run_store.load_partial_outputs(result.id)
+    return data
+
+
+def _start(crew_ref, inputs, on_started, budget=None):
+    crew = find_crew(crew_ref)
+    inputs = {key: str(value) for key, value in (inputs or {}).items()}
+    placeholders = get_placeholders(crew)
+    missing = sorted(p for p in placeholders if not inputs.get(p, '').strip())
+    if missing:
+        raise ValueError(f"Missing inputs for crew '{crew.name}': {', '.join(missing)}")
+    if not crew.is_valid():
+        raise ValueError(f"Crew '{crew.name}' is not valid, fix it in the app first")
+
+    # Checked before the run is saved, an invalid budget must not leave a run behind
+    run_budget = budgets.combine(crew.budget, budget)
+
+    build_started = time.monotonic()
+    crewai_crew = crew.get_crewai_crew(full_output=True)
+    build_s = round(time.monotonic() - build_started, 3)
+    tasks = crew.ordered_tasks()
+    result = run_store.start_run(crew.name, {p: inputs[p] for p in placeholders})
+    if on_started:
+        on_started(result)
+    run_store.attach(crewai_crew, result.id, [task.id for task in tasks])
+    plan_cache.attach(crewai_crew, crew, placeholders)
+    run_stats = instrumentation.RunStats(result.crew_name)
+    run_stats.build_s = build_s
+    if run_budget:
+        run_stats.budget = budgets.RunBudget(run_budget)
+    return crewai_crew, tasks, inputs, result, run_stats
+
+
+def _finish(crewai_crew, tasks, result, run_stats, output=None, error=None):
+    instrumentation.unbind(crewai_crew)
+    if error is not None and run_stats.budget is not None and run_stats.budget.exceeded:
+        return run_store.finish_run(result, 'budget_exceeded', f"Run stopped: {run_stats.budget.exceeded}", run_stats.as_dict())
+    if error is not None:
+        return run_store.finish_run(result, 'failed', f"Error running crew: {str(error)}", run_stats.as_dict())
+    return run_store.finish_run(result, 'completed', run_store.serialize_output(output, tasks), run_stats.as_dict())
+
+
+def run(crew_ref, inputs=None, on_started=None, budget=None, profile=False):
+    """Run a stored crew and return its Result (status ``completed``, ``failed`` or ``budget_exceeded``).
+
+    ``on_started`` is called with the Result as soon as the run has been saved. ``budget`` limits this
+    run on top of the crew's own budget (see ``budgets``). With ``profile`` the run is profiled and the
+    profile saved with the Result (see ``run_profiler``).
+    """
+    crewai_crew, tasks, inputs, result, run_stats = _start(crew_ref, inputs, on_started, budget)
+    instrumentation.bind(crewai_crew, run_stats)
+    try:
+        if profile:
+            output = run_profiler.RunProfiler(result.id, run_stats).run(crewai_crew.kickoff, inputs=inputs)
+        else:
+            output = crewai_crew.kickoff(inputs=inputs)
+    except Exception as e:
+        print(f"Error running crew: {str(e)}\n{traceback.format_exc()}")
+        return _finish(crewai_crew, tasks, result, run_stats, error=e)
+    return _finish(crewai_crew, tasks, result, run_stats, output)
+
+
+async def run_async(crew_ref, inputs=None, on_started=None, budget=None):
+    """Like ``run``, but kicks the crew off on the worker's shared event loop (see ``async_runner``)."""
+    # Loading and building the crew does blocking database and file I/O
+    crewai_crew, tasks, inputs, result, run_stats = await async_runner.run_blocking(_start, crew_ref, inputs, on_started, budget)
+    instrumentation.bind(crewai_crew, run_stats)
+    try:
+        output = await async_runner.kickoff(crewai_crew, inputs)
+    except Exception as e:
+        print(f"Error running crew: {str(e)}\n{traceback.format_exc()}")
+        return await async_runner.run_blocking(_finish, crewai_crew, tasks, result, run_stats, None, e)
+    return await async_runner.run_blocking(_finish, crewai_crew, tasks, result, run_stats, output)
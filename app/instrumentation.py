@@ -0,0 +1,322 @@
+"""Per-run timing and token instrumentation.
+
+A ``RunStats`` object is bound to a built crewai ``Crew`` for the duration of a
+kickoff. LLM calls are reported by ``llm_wrapper``; task and tool timings come
+from crewai's event bus. Events are routed to the right run through the crew the
+emitting agent belongs to, falling back to the run bound to the current thread
+(or asyncio context), so several crews can be instrumented at the same time.
+Events that belong to no bound run are not recorded. Per-task records are
+keyed by task id (``task_key``), not by description.
+"""
+
+import contextvars
+import threading
+import time
+from datetime import datetime
+
+_active_runs = {}
+_local = threading.local()
+# A context variable rather than a thread local so it follows kickoff_async into its executor thread
+_bound_run_stats = contextvars.ContextVar('run_stats', default=None)
+_lock = threading.Lock()
+_handlers_installed = False
+
+
+class RunStats:
+    def __init__(self, crew_name=None):
+        self.crew_name = crew_name
+        self.started_at = datetime.now().isoformat()
+        self._started = time.monotonic()
+        self.duration_s = None
+        # Time spent building the crewai crew before the run, not part of duration_s
+        self.build_s = None
+        # budgets.RunBudget enforced by llm_wrapper, if the run has one
+        self.budget = None
+        # Where the plan of a planning crew came from, see plan_cache
+        self.plan = None
+        # queue.Queue receiving the answers of the run token by token, when the run streams (see llm_wrapper)
+        self.stream = None
+        # Summary of the run's profile when it was profiled, see run_profiler
+        self.profile = None
+        # Id of the run's trace when tracing is configured, see tracing
+        self.trace_id = None
+        self.tasks = []
+        self.llm_calls = []
+        self.tool_calls = []
+        # Context token counts per task id (see task_key), see context_policy
+        self.task_contexts = {}
+        self._lock = threading.Lock()
+
+    def add_task(self, record):
+        with self._lock:
+            self.tasks.append(record)
+
+    def add_llm_call(self, record):
+        with self._lock:
+            self.llm_calls.append(record)
+
+    def add_tool_call(self, record):
+        with self._lock:
+            self.tool_calls.append(record)
+
+    def add_task_context(self, task_id, record):
+        with self._lock:
+            self.task_contexts[task_id] = record
+
+    def finish(self):
+        self.duration_s = round(time.monotonic() - self._started, 3)
+
+    def summary(self):
+        """Aggregate the raw records per agent and per task."""
+        per_agent = {}
+        for call in self.llm_calls:
+            agent = per_agent.setdefault(call.get('agent') or 'unknown', _empty_totals())
+            agent['llm_calls'] += 1
+            agent['llm_time_s'] += call.get('latency_s') or 0
+            agent['queue_wait_s'] += call.get('wait_s') or 0
+            agent['prompt_tokens'] += call.get('prompt_tokens') or 0
+            agent['completion_tokens'] += call.get('completion_tokens') or 0
+        for call in self.tool_calls:
+            agent = per_agent.setdefault(call.get('agent') or 'unknown', _empty_totals())
+            agent['tool_calls'] += 1
+            agent['tool_time_s'] += call.get('duration_s') or 0
+        for task in self.tasks:
+            agent = per_agent.setdefault(task.get('agent') or 'unknown', _empty_totals())
+            agent['task_time_s'] += task.get('duration_s') or 0
+
+        for totals in per_agent.values():
+            for key, value in totals.items():
+                if isinstance(value, float):
+                    totals[key] = round(value, 3)
+
+        duration = self.duration_s if self.duration_s is not None else round(time.monotonic() - self._started, 3)
+        return {
+            'duration_s': duration,
+            'llm_calls': len(self.llm_calls),
+            'tool_calls': len(self.tool_calls),
+            'prompt_tokens': sum(c.get('prompt_tokens') or 0 for c in self.llm_calls),
+            'completion_tokens': sum(c.get('completion_tokens') or 0 for c in self.llm_calls),
+            'cost_usd': round(sum(c.get('cost_usd') or 0 for c in self.llm_calls), 6),
+            'per_agent': per_agent,
+            'per_task': [
+                {
+                    'description': t.get('description'),
+                    'agent': t.get('agent'),
+                    'duration_s': t.get('duration_s'),
+                    **self._task_tokens(t.get('task_id')),
+                }
+                for t in self.tasks
+            ],
+        }
+
+    def _task_tokens(self, task_id):
+        calls = [c for c in self.llm_calls if task_id is not None and c.get('task_id') == task_id]
+        tokens = {
+            'llm_calls': len(calls),
+            'prompt_tokens': sum(c.get('prompt_tokens') or 0 for c in calls),
+            'completion_tokens': sum(c.get('completion_tokens') or 0 for c in calls),
+        }
+        context = self.task_contexts.get(task_id)
+        if context:
+            tokens['context_policy'] = context['policy']
+            tokens['context_tokens'] = context['tokens']
+            tokens['context_tokens_full'] = context['full_tokens']
+        return tokens
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'crew_name': self.crew_name,
+                'started_at': self.started_at,
+                'build_s': self.build_s,
+                'budget': self.budget.as_dict() if self.budget is not None else None,
+                'plan': self.plan,
+                'profile': self.profile,
+                'trace_id': self.trace_id,
+                'summary': self.summary(),
+                'tasks': list(self.tasks),
+                'llm_calls': list(self.llm_calls),
+                'tool_calls': list(self.tool_calls),
+            }
+
+
+def _empty_totals():
+    return {
+        'task_time_s': 0.0,
+        'llm_calls': 0,
+        'llm_time_s': 0.0,
+        'queue_wait_s': 0.0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'tool_calls': 0,
+        'tool_time_s': 0.0,
+    }
+
+
+def bind(crewai_crew, run_stats):
+    """Route instrumentation of ``crewai_crew`` (and the calling thread) to ``run_stats``."""
+    install_event_handlers()
+    with _lock:
+        _active_runs[str(crewai_crew.id)] = run_stats
+    _bound_run_stats.set(run_stats)
+
+
+def bind_thread(run_stats):
+    """Route instrumentation of the calling worker thread to ``run_stats`` (None to clear)."""
+    _bound_run_stats.set(run_stats)
+
+
+def unbind(crewai_crew):
+    with _lock:
+        run_stats = _active_runs.pop(str(crewai_crew.id), None)
+    if _bound_run_stats.get() is run_stats:
+        _bound_run_stats.set(None)
+    if run_stats:
+        run_stats.finish()
+    return run_stats
+
+
+def _crew_of(obj):
+    if obj is None:
+        return None
+    if hasattr(obj, 'tasks') and hasattr(obj, 'agents'):
+        return obj
+    crew = getattr(obj, 'crew', None)
+    if crew is None and getattr(obj, 'agent', None) is not None:
+        crew = getattr(obj.agent, 'crew', None)
+    return crew
+
+
+def find_run_stats(*sources):
+    """Return the RunStats the given agents/tasks belong to, if any run is active."""
+    with _lock:
+        for source in sources:
+            crew = _crew_of(source)
+            if crew is not None and str(getattr(crew, 'id', '')) in _active_runs:
+                return _active_runs[str(crew.id)]
+        return _bound_run_stats.get()
+
+
+def task_key(task):
+    """The id the records of ``task`` are keyed by: the studio task id when it has one, else crewai's."""
+    if task is None:
+        return None
+    return getattr(task, 'studio_task_id', None) or str(task.id)
+
+
+def _role_of(agent):
+    if agent is None:
+        return None
+    return getattr(agent, 'role', None) or str(agent)
+
+
+def begin_llm_call(record):
+    """Mark ``record`` as the LLM call in progress on this thread."""
+    stack = getattr(_local, 'llm_calls', None)
+    if stack is None:
+        stack = _local.llm_calls = []
+    stack.append(record)
+
+
+def end_llm_call():
+    stack = getattr(_local, 'llm_calls', None)
+    return stack.pop() if stack else None
+
+
+def on_llm_stream_chunk(source, event):
+    stack = getattr(_local, 'llm_calls', None)
+    if not stack:
+        return
+    if '_first_token_at' not in stack[-1]:
+        stack[-1]['_first_token_at'] = time.monotonic()
+    stream = stack[-1].get('_stream')
+    # Chunks of tool call arguments are not part of the answer
+    if stream is not None and event.chunk and event.tool_call is None:
+        stream.put(event.chunk)
+
+
+def record_llm_call(record, from_agent=None, from_task=None):
+    run_stats = find_run_stats(from_agent, from_task)
+    if run_stats is None:
+        return
+    if from_agent is None and from_task is not None:
+        from_agent = getattr(from_task, 'agent', None)
+    record['agent'] = _role_of(from_agent)
+    record['task'] = (getattr(from_task, 'description', None) or '')[:80] or None
+    record['task_id'] = task_key(from_task)
+    run_stats.add_llm_call(record)
+
+
+def record_task_context(task, policy, full_tokens, tokens):
+    """Report the size of the context ``task`` was given, before and after its context policy."""
+    run_stats = find_run_stats(task)
+    if run_stats is None:
+        return
+    run_stats.add_task_context(task_key(task), {
+        'policy': policy,
+        'full_tokens': full_tokens,
+        'tokens': tokens,
+    })
+
+
+def on_task_completed(source, event):
+    run_stats = find_run_stats(source)
+    if run_stats is None:
+        return
+    duration = None
+    if getattr(source, 'start_time', None) and getattr(source, 'end_time', None):
+        duration = round((source.end_time - source.start_time).total_seconds(), 3)
+    run_stats.add_task({
+        'task_id': task_key(source),
+        'description': (getattr(source, 'description', '') or '')[:80],
+        'agent': getattr(event.output, 'agent', None) or _role_of(getattr(source, 'agent', None)),
+        'started_at': source.start_time.isoformat() if getattr(source, 'start_time', None) else None,
+        'duration_s': duration,
+    })
+
+
+def on_tool_finished(source, event):
+    agent = getattr(event, 'agent', None)
+    run_stats = find_run_stats(agent)
+    if run_stats is None:
+        return
+    run_stats.add_tool_call({
+        'tool': event.tool_name,
+        'agent': event.agent_role or _role_of(agent),
+        'duration_s': round((event.finished_at - event.started_at).total_seconds(), 3),
+        'from_cache': event.from_cache,
+    })
+
+
+def on_tool_error(source, event):
+    agent = getattr(event, 'agent', None)
+    run_stats = find_run_stats(agent)
+    if run_stats is None:
+        return
+    run_stats.add_tool_call({
+        'tool': event.tool_name,
+        'agent': event.agent_role or _role_of(agent),
+        'duration_s': None,
+        'error': str(event.error)[:200],
+    })
+
+
+def install_event_handlers():
+    global _handlers_installed
+    with _lock:
+        if _handlers_installed:
+            return
+        _handlers_installed = True
+    from crewai.utilities.events import (
+        crewai_event_bus,
+        LLMStreamChunkEvent,
+        TaskCompletedEvent,
+        ToolUsageFinishedEvent,
+        ToolUsageErrorEvent,
+    )
+    crewai_event_bus.register_handler(LLMStreamChunkEvent, on_llm_stream_chunk)
+    crewai_event_bus.register_handler(TaskCompletedEvent, on_task_completed)
+    crewai_event_bus.register_handler(ToolUsageFinishedEvent, on_tool_finished)
+    crewai_event_bus.register_handler(ToolUsageErrorEvent, on_tool_error)
+    import tracing
+    tracing.install_event_handlers()
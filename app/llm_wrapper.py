@@ -0,0 +1,160 @@
+"""Client level hooks around the LLM objects handed to crewai.
+
+``llms.create_llm`` passes every LLM it builds through ``wrap_llm``. The wrapper
+replaces the instance's ``call`` method so each request made by an agent,
+a manager or the planner goes through the process-wide rate limiter first and is
+then timed and reported to the run it belongs to (see ``instrumentation``).
+A run with a budget (see ``budgets``) is checked before every request and
+charged with the tokens and the estimated cost of every answer. When the run
+streams (``RunStats.stream``), the request is sent with ``stream=True`` and
+the answer is forwarded to the run's queue token by token: a dict with the
+agent and task announces each answer, followed by its text deltas. Each call
+is also a span of the run's trace (see ``tracing``).
+"""
+
+import time
+from datetime import datetime
+
+from litellm.integrations.custom_logger import CustomLogger
+
+import budgets
+import instrumentation
+import metrics
+import rate_limiter
+import tracing
+from tokenizer import count_tokens
+
+
+def estimate_tokens(messages):
+    """Token estimate made with the local tokenizer before a request is sent."""
+    if messages is None:
+        return 0
+    if isinstance(messages, str):
+        return count_tokens(messages)
+    total = 0
+    for message in messages:
+        content = message.get('content') if isinstance(message, dict) else message
+        total += count_tokens(str(content or '')) + 4
+    return total
+
+
+class UsageProbe(CustomLogger):
+    """Callback that remembers the provider reported token usage of one call.
+
+    crewai calls it directly with the usage of the response of the call it was
+    passed to; wrapped LLMs never register it with litellm (see ``wrap_llm``).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.usage = None
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        if isinstance(response_obj, dict) and response_obj.get('usage'):
+            self.usage = response_obj['usage']
+        elif getattr(response_obj, 'usage', None):
+            self.usage = response_obj.usage
+
+    def _get(self, key):
+        if self.usage is None:
+            return None
+        if isinstance(self.usage, dict):
+            return self.usage.get(key)
+        return getattr(self.usage, key, None)
+
+    def total_tokens(self):
+        return self._get('total_tokens')
+
+    def prompt_tokens(self):
+        return self._get('prompt_tokens')
+
+    def completion_tokens(self):
+        return self._get('completion_tokens')
+
+
+def _ensure_crewai_llm(llm):
+    # crewai converts foreign (langchain) chat models into its own LLM class when an
+    # Agent is validated; doing it here already lets us wrap the object it will use.
+    from crewai.llms.base_llm import BaseLLM
+    if isinstance(llm, BaseLLM):
+        return llm
+    from crewai.utilities.llm_utils import create_llm as crewai_create_llm
+    converted = crewai_create_llm(llm)
+    return converted if converted is not None else llm
+
+
+def wrap_llm(llm, provider_and_model):
+    llm = _ensure_crewai_llm(llm)
+    if getattr(llm, '_studio_provider_and_model', None) or not hasattr(llm, 'call'):
+        return llm
+    original_call = llm.call
+
+    def set_callbacks(callbacks):
+        # crewai would install the callbacks of each call as the process-wide litellm.callbacks,
+        # so concurrent calls would get each other's usage. It also hands every call's own
+        # response usage to the callbacks it was given, which is all the probes need.
+        pass
+
+    def call(messages, *args, **kwargs):
+        estimated_tokens = estimate_tokens(messages)
+        probe = UsageProbe()
+        if len(args) < 2:
+            kwargs['callbacks'] = list(kwargs.get('callbacks') or []) + [probe]
+        run_stats = instrumentation.find_run_stats(kwargs.get('from_agent'), kwargs.get('from_task'))
+        budget = getattr(run_stats, 'budget', None)
+        if budget is not None:
+            # Raised before the request is sent, so crewai unwinds the run without spending more
+            budget.check()
+        record = {'model': provider_and_model, 'started_at': datetime.now().isoformat()}
+        span = tracing.start_llm_call(provider_and_model, kwargs.get('from_agent'), kwargs.get('from_task'))
+        stream = getattr(run_stats, 'stream', None)
+        if hasattr(llm, 'stream'):
+            llm.stream = stream is not None
+        if stream is not None:
+            from_task = kwargs.get('from_task')
+            from_agent = kwargs.get('from_agent') or getattr(from_task, 'agent', None)
+            stream.put({'agent': getattr(from_agent, 'role', None), 'task': getattr(from_task, 'description', None)})
+            record['_stream'] = stream
+        record['wait_s'] = round(rate_limiter.acquire(provider_and_model, estimated_tokens), 3)
+        started = time.monotonic()
+        instrumentation.begin_llm_call(record)
+        response = None
+        try:
+            response = original_call(messages, *args, **kwargs)
+            return response
+        except Exception as e:
+            record['error'] = str(e)[:200]
+            raise
+        finally:
+            latency = time.monotonic() - started
+            instrumentation.end_llm_call()
+            first_token_at = record.pop('_first_token_at', None)
+            record.pop('_stream', None)
+            prompt_tokens = probe.prompt_tokens()
+            completion_tokens = probe.completion_tokens()
+            if prompt_tokens is None:
+                prompt_tokens = estimated_tokens
+                completion_tokens = estimate_tokens(str(response)) if response is not None else 0
+            record['latency_s'] = round(latency, 3)
+            if first_token_at is not None:
+                record['ttft_s'] = round(first_token_at - started, 3)
+            else:
+                # Without streaming the first token arrives together with the whole answer
+                record['ttft_s'] = record['latency_s'] if response is not None else None
+            record['prompt_tokens'] = prompt_tokens
+            record['completion_tokens'] = completion_tokens or 0
+            record['usage_estimated'] = probe.usage is None
+            cost_usd = budgets.estimate_cost(getattr(llm, 'model', None), prompt_tokens, completion_tokens)
+            if cost_usd is not None:
+                record['cost_usd'] = round(cost_usd, 6)
+            if budget is not None:
+                budget.add(prompt_tokens + (completion_tokens or 0), cost_usd)
+            rate_limiter.release(provider_and_model, estimated_tokens, prompt_tokens + (completion_tokens or 0), latency)
+            instrumentation.record_llm_call(record, kwargs.get('from_agent'), kwargs.get('from_task'))
+            metrics.record_llm_call(record)
+            tracing.end_llm_call(span, record)
+
+    llm.call = call
+    llm.set_callbacks = set_callbacks
+    llm._studio_provider_and_model = provider_and_model
+    return llm
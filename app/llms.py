@@ -1,7 +1,6 @@
 import os
 from typing import Optional
 
-import streamlit as st
 from crewai import LLM
 from dotenv import load_dotenv
 from langchain_anthropic import ChatAnthropic
@@ -9,41 +8,48 @@ from langchain_groq import ChatGroq
 from langchain_openai import ChatOpenAI
 from langchain_openai.chat_models.base import BaseChatOpenAI
 from litellm import completion
+from llm_wrapper import wrap_llm
+
+# Provider settings read from the environment (.env); the LLM factories below switch the process
+# environment to these values while they build an LLM
+env_vars = {}
+
+ENV_VAR_DEFAULTS = {
+    "OPENAI_API_KEY": None,
+    "OPENAI_API_BASE": "https://api.openai.com/v1/",
+    "OPENAI_PROXY_MODELS": None,
+    "GROQ_API_KEY": None,
+    "LMSTUDIO_API_BASE": None,
+    "ANTHROPIC_API_KEY": None,
+    "OLLAMA_HOST": None,
+    "OLLAMA_MODELS": None,
+    "XAI_API_KEY": None,
+    "GEMINI_API_KEY": None,
+    "AZURE_OPENAI_API_KEY": None,
+    "AZURE_OPENAI_ENDPOINT": None,
+    "AZURE_OPENAI_DEPLOYMENT_NAME": None,
+    "AZURE_OPENAI_API_VERSION": None,
+    "AWS_ACCESS_KEY_ID": None,
+    "AWS_SECRET_ACCESS_KEY": None,
+    "AWS_SESSION_TOKEN": None,
+    "AWS_REGION": None,
+    "FAKE_LLM_ENABLED": None,
+    "FAKE_LLM_BASE": None,
+}
 
 def load_secrets_from_env():
     load_dotenv(override=True)
-    if "env_vars" not in st.session_state:
-        st.session_state.env_vars = {
-            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
-            "OPENAI_API_BASE": os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1/"),
-            "OPENAI_PROXY_MODELS": os.getenv("OPENAI_PROXY_MODELS"),
-            "GROQ_API_KEY": os.getenv("GROQ_API_KEY"),
-            "LMSTUDIO_API_BASE": os.getenv("LMSTUDIO_API_BASE"),
-            "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY"),
-            "OLLAMA_HOST": os.getenv("OLLAMA_HOST"),
-            "OLLAMA_MODELS": os.getenv("OLLAMA_MODELS"),
-            "XAI_API_KEY": os.getenv("XAI_API_KEY"),
-            "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY"),
-            "AZURE_OPENAI_API_KEY": os.getenv("AZURE_OPENAI_API_KEY"),
-            "AZURE_OPENAI_ENDPOINT": os.getenv("AZURE_OPENAI_ENDPOINT"),
-            "AZURE_OPENAI_DEPLOYMENT_NAME": os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-            "AZURE_OPENAI_API_VERSION": os.getenv("AZURE_OPENAI_API_VERSION"),
-            "AWS_ACCESS_KEY_ID": os.getenv("AWS_ACCESS_KEY_ID"),
-            "AWS_SECRET_ACCESS_KEY": os.getenv("AWS_SECRET_ACCESS_KEY"),
-            "AWS_SESSION_TOKEN": os.getenv("AWS_SESSION_TOKEN"),
-            "AWS_REGION": os.getenv("AWS_REGION"),
-        }
-    else:
-        st.session_state.env_vars = st.session_state.env_vars
+    if not env_vars:
+        env_vars.update({key: os.getenv(key, default) for key, default in ENV_VAR_DEFAULTS.items()})
 
 def switch_environment(new_env_vars):
     for key, value in new_env_vars.items():
         if value is not None:
             os.environ[key] = value
-            st.session_state.env_vars[key] = value
+            env_vars[key] = value
 
 def restore_environment():
-    for key, value in st.session_state.env_vars.items():
+    for key, value in env_vars.items():
         if value is not None:
             os.environ[key] = value
         elif key in os.environ:
@@ -51,8 +57,8 @@ def restore_environment():
 
 
 def _get_env_var(key, default=None):
-    if "env_vars" in st.session_state and st.session_state.env_vars.get(key) is not None:
-        return st.session_state.env_vars.get(key)
+    if env_vars.get(key) is not None:
+        return env_vars.get(key)
     return os.getenv(key, default)
 
 
@@ -65,8 +71,8 @@ def safe_pop_env_var(key):
 
 def create_openai_llm(model, temperature):
     switch_environment({
-        "OPENAI_API_KEY": st.session_state.env_vars["OPENAI_API_KEY"],
-        "OPENAI_API_BASE": st.session_state.env_vars["OPENAI_API_BASE"],
+        "OPENAI_API_KEY": env_vars["OPENAI_API_KEY"],
+        "OPENAI_API_BASE": env_vars["OPENAI_API_BASE"],
     })
     api_key = os.getenv("OPENAI_API_KEY")
     api_base = os.getenv("OPENAI_API_BASE")
@@ -78,7 +84,7 @@ def create_openai_llm(model, temperature):
 
 def create_anthropic_llm(model, temperature):
     switch_environment({
-        "ANTHROPIC_API_KEY": st.session_state.env_vars["ANTHROPIC_API_KEY"],
+        "ANTHROPIC_API_KEY": env_vars["ANTHROPIC_API_KEY"],
     })
     api_key = os.getenv("ANTHROPIC_API_KEY")
 
@@ -94,7 +100,7 @@ def create_anthropic_llm(model, temperature):
 
 def create_groq_llm(model, temperature):
     switch_environment({
-        "GROQ_API_KEY": st.session_state.env_vars["GROQ_API_KEY"],
+        "GROQ_API_KEY": env_vars["GROQ_API_KEY"],
     })
     api_key = os.getenv("GROQ_API_KEY")
 
@@ -104,7 +110,7 @@ def create_groq_llm(model, temperature):
         raise ValueError("Groq API key not set in .env file")
 
 def create_ollama_llm(model, temperature):
-    host = st.session_state.env_vars["OLLAMA_HOST"]
+    host = env_vars["OLLAMA_HOST"]
     if host:
         switch_environment({
             "OPENAI_API_KEY": "ollama",  # Nastaví OpenAI API klíč na "ollama"
@@ -117,7 +123,7 @@ def create_ollama_llm(model, temperature):
 
 def create_xai_llm(model, temperature):
     host = "https://api.x.ai/v1"
-    api_key = st.session_state.env_vars.get("XAI_API_KEY")
+    api_key = env_vars.get("XAI_API_KEY")
 
     if not api_key:
         raise ValueError("XAI_API_KEY must be set in .env file")
@@ -136,7 +142,7 @@ def create_xai_llm(model, temperature):
 
 
 def create_gemini_llm(model: str, temperature: Optional[float]):
-    api_key = st.session_state.env_vars.get("GEMINI_API_KEY")
+    api_key = env_vars.get("GEMINI_API_KEY")
 
     if not api_key:
         raise ValueError("GEMINI_API_KEY must be set in .env file")
@@ -155,10 +161,10 @@ def create_gemini_llm(model: str, temperature: Optional[float]):
 
 
 def create_azure_openai_llm(model: str, temperature: Optional[float]):
-    api_key = st.session_state.env_vars.get("AZURE_OPENAI_API_KEY")
-    endpoint = st.session_state.env_vars.get("AZURE_OPENAI_ENDPOINT")
-    deployment = st.session_state.env_vars.get("AZURE_OPENAI_DEPLOYMENT_NAME") or model
-    api_version = st.session_state.env_vars.get("AZURE_OPENAI_API_VERSION")
+    api_key = env_vars.get("AZURE_OPENAI_API_KEY")
+    endpoint = env_vars.get("AZURE_OPENAI_ENDPOINT")
+    deployment = env_vars.get("AZURE_OPENAI_DEPLOYMENT_NAME") or model
+    api_version = env_vars.get("AZURE_OPENAI_API_VERSION")
 
     if not api_key or not endpoint:
         raise ValueError("AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT must be set in .env file")
@@ -185,10 +191,10 @@ def create_azure_openai_llm(model: str, temperature: Optional[float]):
 
 
 def create_bedrock_llm(model: str, temperature: Optional[float]):
-    region = st.session_state.env_vars.get("AWS_REGION")
-    aws_access_key_id = st.session_state.env_vars.get("AWS_ACCESS_KEY_ID")
-    aws_secret_access_key = st.session_state.env_vars.get("AWS_SECRET_ACCESS_KEY")
-    aws_session_token = st.session_state.env_vars.get("AWS_SESSION_TOKEN")
+    region = env_vars.get("AWS_REGION")
+    aws_access_key_id = env_vars.get("AWS_ACCESS_KEY_ID")
+    aws_secret_access_key = env_vars.get("AWS_SECRET_ACCESS_KEY")
+    aws_session_token = env_vars.get("AWS_SESSION_TOKEN")
 
     if not region:
         raise ValueError("AWS_REGION must be set in .env file for Bedrock models")
@@ -215,7 +221,7 @@ def create_bedrock_llm(model: str, temperature: Optional[float]):
 def create_lmstudio_llm(model, temperature):
     switch_environment({
         "OPENAI_API_KEY": "lm-studio",
-        "OPENAI_API_BASE": st.session_state.env_vars["LMSTUDIO_API_BASE"],
+        "OPENAI_API_BASE": env_vars["LMSTUDIO_API_BASE"],
     })
     api_base = os.getenv("OPENAI_API_BASE")
 
@@ -229,6 +235,43 @@ def create_lmstudio_llm(model, temperature):
     else:
         raise ValueError("LM Studio API base not set in .env file")
 
+def create_fake_llm(model, temperature):
+    # Offline OpenAI-compatible stub for load tests and benchmarks (see fake_llm_server)
+    base_url = env_vars.get("FAKE_LLM_BASE")
+    if not base_url:
+        import fake_llm_server
+        base_url = fake_llm_server.ensure_running()
+
+    return LLM(
+        model=f"openai/{model}",
+        temperature=temperature,
+        api_key="fake",
+        base_url=base_url,
+    )
+
+# (FAKE_LLM_CONFIG path, its modification time, profile names), loaded again only when the file changes
+_fake_llm_models = (None, None, None)
+
+def get_fake_llm_models():
+    global _fake_llm_models
+    import fake_llm_server
+    config_path = os.getenv('FAKE_LLM_CONFIG')
+    try:
+        mtime = os.path.getmtime(config_path) if config_path else None
+    except OSError:
+        mtime = None
+    cached_path, cached_mtime, names = _fake_llm_models
+    if names is not None and (cached_path, cached_mtime) == (config_path, mtime):
+        return list(names)
+    try:
+        names = list(fake_llm_server.load_profiles(config_path))
+    except (OSError, ValueError, TypeError) as e:
+        # Printed once until the file changes, not on every model list
+        print(f"Could not load FAKE_LLM_CONFIG: {str(e)}")
+        names = list(fake_llm_server.PROFILES)
+    _fake_llm_models = (config_path, mtime, names)
+    return list(names)
+
 def get_llm_config():
     openai_models = _get_env_var("OPENAI_PROXY_MODELS")
     ollama_models = _get_env_var("OLLAMA_MODELS")
@@ -302,6 +345,10 @@ def get_llm_config():
             ],
             "create_llm": create_bedrock_llm,
         },
+        "Local Fake": {
+            "models": get_fake_llm_models(),
+            "create_llm": create_fake_llm,
+        },
     }
 
 
@@ -317,6 +364,7 @@ def get_available_llm_config():
         "Gemini": lambda: _has_env_value("GEMINI_API_KEY"),
         "Azure OpenAI": lambda: _has_env_value("AZURE_OPENAI_API_KEY") and _has_env_value("AZURE_OPENAI_ENDPOINT"),
         "Bedrock": lambda: _has_env_value("AWS_REGION"),
+        "Local Fake": lambda: str(_get_env_var("FAKE_LLM_ENABLED", "")).lower() in ("1", "true", "yes") or _has_env_value("FAKE_LLM_BASE"),
     }
 
     available_config = {}
@@ -347,6 +395,6 @@ def create_llm(provider_and_model, temperature=0.15):
     if create_llm_func:
         llm = create_llm_func(model, temperature)
         restore_environment()  # Obnoví původní prostředí po vytvoření LLM
-        return llm
+        return wrap_llm(llm, provider_and_model)
     else:
         raise ValueError(f"LLM provider {provider} is not recognized or not supported")
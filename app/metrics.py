@@ -0,0 +1,323 @@
+"""Process metrics in the Prometheus text format.
+
+The Studio records what is needed to size and watch a shared instance:
+
+* ``studio_runs_active`` / ``studio_runs_queued``: runs in progress and batch
+  rows waiting for a free crew
+* ``studio_run_duration_seconds``: run durations per crew and final status
+* ``studio_llm_call_seconds`` and ``studio_llm_tokens_total``: LLM latency and
+  tokens per provider and model
+* ``studio_db_query_seconds``: latency of every ``db_utils`` function
+* ``studio_console_buffer_lines``: console lines captured but not yet shown
+* ``studio_tool_cache_*``: persistent tool cache hits, misses and size per tool
+* ``studio_page_render_seconds``, ``studio_page_phase_seconds`` and
+  ``studio_page_db_queries``: time of each Streamlit rerun per page, of its
+  phases (see ``render_timing``) and the database calls it made
+
+The metrics live in the process that records them. ``start_exporters`` makes
+them available (once per process) when configured:
+
+``METRICS_PORT``
+    serves ``GET /metrics`` on ``METRICS_HOST`` (default 127.0.0.1) next to Streamlit
+``METRICS_FILE``
+    rewrites this file every ``METRICS_FILE_INTERVAL_S`` (default 15) seconds, e.g.
+    for node_exporter's textfile collector
+
+``python -m cli serve`` also answers ``GET /metrics`` on its own port.
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+RUN_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+_lock = threading.Lock()
+_metrics = {}
+_collectors = []
+_active_runs = {}
+_exporters_started = False
+# Nesting depth of instrumented calls and outermost calls per histogram, per thread
+_local = threading.local()
+
+
+class Metric:
+    def __init__(self, name, kind, help_text, labelnames=(), buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else None
+        # label values -> value, or [bucket counts, sum, count] for histograms
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[self._key(labels)] = value
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            data = self.values.get(key)
+            if data is None:
+                data = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[0][index] += 1
+            data[1] += value
+            data[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+def _register(name, kind, help_text, labelnames=(), buckets=None):
+    with _lock:
+        if name not in _metrics:
+            _metrics[name] = Metric(name, kind, help_text, labelnames, buckets)
+        return _metrics[name]
+
+
+def counter(name, help_text, labelnames=()):
+    return _register(name, 'counter', help_text, labelnames)
+
+
+def gauge(name, help_text, labelnames=()):
+    return _register(name, 'gauge', help_text, labelnames)
+
+
+def histogram(name, help_text, labelnames=(), buckets=FAST_BUCKETS):
+    return _register(name, 'histogram', help_text, labelnames, buckets)
+
+
+def snapshot(name, kind, help_text, labelnames, values):
+    """An unregistered Metric with ``values`` ({label values tuple: value}), for collectors."""
+    metric = Metric(name, kind, help_text, labelnames)
+    metric.values = dict(values)
+    return metric
+
+
+def register_collector(collector):
+    """Add a function called at every export that returns Metrics computed on demand."""
+    with _lock:
+        if collector not in _collectors:
+            _collectors.append(collector)
+
+
+RUNS_TOTAL = counter('studio_runs_total', "Finished crew runs", ('crew', 'status'))
+RUN_DURATION = histogram('studio_run_duration_seconds', "Wall time of crew runs", ('crew', 'status'), RUN_BUCKETS)
+LLM_CALL_SECONDS = histogram('studio_llm_call_seconds', "Latency of LLM calls, without rate limiter waits", ('provider', 'model'), LLM_BUCKETS)
+LLM_CALLS_TOTAL = counter('studio_llm_calls_total', "LLM calls", ('provider', 'model', 'outcome'))
+LLM_TOKENS_TOTAL = counter('studio_llm_tokens_total', "LLM tokens", ('provider', 'model', 'kind'))
+LLM_WAIT_SECONDS = histogram('studio_llm_rate_limit_wait_seconds', "Time LLM calls waited for the rate limiter", ('provider',), LLM_BUCKETS)
+DB_QUERY_SECONDS = histogram('studio_db_query_seconds', "Latency of db_utils functions", ('function',))
+PAGE_RENDER_SECONDS = histogram('studio_page_render_seconds', "Time of a Streamlit rerun of a page", ('page',), FAST_BUCKETS + (10, 30))
+PAGE_PHASE_SECONDS = histogram('studio_page_phase_seconds', "Time of each phase of a Streamlit rerun", ('page', 'phase'), FAST_BUCKETS + (10, 30))
+PAGE_DB_QUERIES = histogram('studio_page_db_queries', "db_utils calls made by a Streamlit rerun", ('page',), (0, 1, 2, 5, 10, 20, 50, 100, 200))
+RESULTS_ARCHIVED = counter('studio_results_archived_total', "Results moved to the archive files by the retention policies", ('crew',))
+
+
+def _split_provider(provider_and_model):
+    provider, _, model = str(provider_and_model or '').partition(': ')
+    return provider, model
+
+
+def run_started(run_id, crew_name):
+    with _lock:
+        _active_runs[run_id] = (crew_name, time.monotonic())
+
+
+def run_finished(run_id, crew_name, status):
+    with _lock:
+        crew_and_start = _active_runs.pop(run_id, None)
+    if crew_and_start is None:
+        return
+    RUNS_TOTAL.inc(crew=crew_name, status=status)
+    RUN_DURATION.observe(time.monotonic() - crew_and_start[1], crew=crew_name, status=status)
+
+
+def record_llm_call(record):
+    provider, model = _split_provider(record.get('model'))
+    LLM_CALLS_TOTAL.inc(provider=provider, model=model, outcome='error' if record.get('error') else 'ok')
+    if record.get('latency_s') is not None:
+        LLM_CALL_SECONDS.observe(record['latency_s'], provider=provider, model=model)
+    if record.get('wait_s') is not None:
+        LLM_WAIT_SECONDS.observe(record['wait_s'], provider=provider)
+    LLM_TOKENS_TOTAL.inc(record.get('prompt_tokens') or 0, provider=provider, model=model, kind='prompt')
+    LLM_TOKENS_TOTAL.inc(record.get('completion_tokens') or 0, provider=provider, model=model, kind='completion')
+
+
+def instrument_functions(namespace, module_name, histogram_metric, label='function', skip=()):
+    """Replace the public functions of a module (its ``globals()``) by versions timed into ``histogram_metric``."""
+    for name, function in list(namespace.items()):
+        if name.startswith('_') or name in skip or not callable(function) or isinstance(function, type):
+            continue
+        if getattr(function, '__module__', None) != module_name:
+            continue
+        namespace[name] = _timed(function, histogram_metric, {label: name})
+
+
+def _timed(function, histogram_metric, labels):
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram_metric.observe(time.perf_counter() - started, **labels)
+            _local.depth = depth
+            if depth == 0:
+                calls = _local.__dict__.setdefault('calls', {})
+                calls[histogram_metric.name] = calls.get(histogram_metric.name, 0) + 1
+
+    return timed
+
+
+def thread_calls(histogram_metric):
+    """Outermost calls this thread made so far to the functions instrumented into ``histogram_metric``."""
+    return getattr(_local, 'calls', {}).get(histogram_metric.name, 0)
+
+
+def _active_runs_metrics():
+    counts = {}
+    with _lock:
+        for crew_name, _ in _active_runs.values():
+            counts[(crew_name,)] = counts.get((crew_name,), 0) + 1
+    return [snapshot('studio_runs_active', 'gauge', "Crew runs in progress in this process", ('crew',), counts)]
+
+
+register_collector(_active_runs_metrics)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_metric(metric, lines):
+    lines.append(f"# HELP {metric.name} {metric.help_text}")
+    lines.append(f"# TYPE {metric.name} {metric.kind}")
+    for key, value in sorted(metric.values.items()):
+        if metric.kind != 'histogram':
+            lines.append(f"{metric.name}{_labels(metric.labelnames, key)} {_number(value)}")
+            continue
+        bucket_counts, total, count = value
+        for bound, bucket_count in zip(metric.buckets, bucket_counts):
+            lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, key, {'le': _number(bound)})} {bucket_count}")
+        lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, key, {'le': '+Inf'})} {count}")
+        lines.append(f"{metric.name}_sum{_labels(metric.labelnames, key)} {_number(total)}")
+        lines.append(f"{metric.name}_count{_labels(metric.labelnames, key)} {count}")
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        metrics = [Metric(m.name, m.kind, m.help_text, m.labelnames, m.buckets) for m in _metrics.values()]
+        for copy, metric in zip(metrics, _metrics.values()):
+            copy.values = {key: ([list(v[0]), v[1], v[2]] if metric.kind == 'histogram' else v) for key, v in metric.values.items()}
+        collectors = list(_collectors)
+    collected = {}
+    for collector in collectors:
+        try:
+            for metric in collector():
+                collected[metric.name] = metric
+        except Exception as e:
+            print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {str(e)}")
+    lines = []
+    for metric in [m for m in metrics if m.name not in collected] + list(collected.values()):
+        _render_metric(metric, lines)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0].rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+        send_metrics(self)
+
+
+def send_metrics(handler):
+    body = render().encode('utf-8')
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def write_file(path):
+    # Written next to the target and renamed, so readers never see a partial file
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        f.write(render())
+    os.replace(temporary_path, path)
+
+
+def _write_file_periodically(path, interval_s):
+    while True:
+        try:
+            write_file(path)
+        except OSError as e:
+            print(f"Could not write metrics file {path}: {str(e)}")
+        time.sleep(interval_s)
+
+
+def start_exporters():
+    """Start the exporters configured in the environment, once per process."""
+    global _exporters_started
+    with _lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    port = os.getenv('METRICS_PORT')
+    if port:
+        try:
+            server = ThreadingHTTPServer((os.getenv('METRICS_HOST', '127.0.0.1'), int(port)), MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        except (OSError, ValueError) as e:
+            print(f"Could not serve metrics on port {port}: {str(e)}")
+    path = os.getenv('METRICS_FILE')
+    if path:
+        try:
+            interval_s = max(float(os.getenv('METRICS_FILE_INTERVAL_S', '15')), 1.0)
+        except ValueError:
+            interval_s = 15.0
+        threading.Thread(target=_write_file_periodically, args=(path, interval_s), name="metrics-file", daemon=True).start()
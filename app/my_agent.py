@@ -1,58 +1,76 @@
+from dataclasses import dataclass
+from typing import Optional
 from crewai import Agent
-import streamlit as st
 from utils import rnd_id, fix_columns_width, format_llm_display
-from streamlit import session_state as ss
+from ui_state import st, ss
+import ui_state
 from db_utils import save_agent, delete_agent, save_task
 import db_utils
 from llms import llm_providers_and_models, create_llm
+import tool_cache
 from datetime import datetime
 
+@dataclass(slots=True, eq=False)
 class MyAgent:
     NO_LLM_SENTINEL = "none:none"
-    def __init__(self, id=None, role=None, backstory=None, goal=None, temperature=None, allow_delegation=False, verbose=False, cache= None, llm_provider_model=None, max_iter=None, created_at=None, tools=None, knowledge_source_ids=None):
-        self.id = id or "A_" + rnd_id()
-        self.role = role or "Senior Researcher"
-        self.backstory = backstory or "Driven by curiosity, you're at the forefront of innovation, eager to explore and share knowledge that could change the world."
-        self.goal = goal or "Uncover groundbreaking technologies in AI"
-        self.temperature = temperature or 0.1
-        self.allow_delegation = allow_delegation if allow_delegation is not None else False
-        self.verbose = verbose if verbose is not None else True
-        available_llms = llm_providers_and_models()
-        if llm_provider_model is None:
+
+    id: Optional[str] = None
+    role: Optional[str] = None
+    backstory: Optional[str] = None
+    goal: Optional[str] = None
+    temperature: Optional[float] = None
+    allow_delegation: Optional[bool] = False
+    verbose: Optional[bool] = False
+    cache: Optional[bool] = None
+    llm_provider_model: Optional[str] = None
+    max_iter: Optional[int] = None
+    created_at: Optional[str] = None
+    tools: Optional[list] = None
+    knowledge_source_ids: Optional[list] = None
+
+    def __post_init__(self):
+        self.id = self.id or "A_" + rnd_id()
+        self.role = self.role or "Senior Researcher"
+        self.backstory = self.backstory or "Driven by curiosity, you're at the forefront of innovation, eager to explore and share knowledge that could change the world."
+        self.goal = self.goal or "Uncover groundbreaking technologies in AI"
+        self.temperature = self.temperature or 0.1
+        self.allow_delegation = self.allow_delegation if self.allow_delegation is not None else False
+        self.verbose = self.verbose if self.verbose is not None else True
+        if self.llm_provider_model is None:
+            available_llms = llm_providers_and_models()
             self.llm_provider_model = available_llms[0] if available_llms else self.NO_LLM_SENTINEL
-        else:
-            self.llm_provider_model = llm_provider_model
-        self.created_at = created_at or datetime.now().isoformat()
-        self.tools = tools or []
-        self.max_iter = max_iter or 25
-        self.cache = cache if cache is not None else True
-        self.knowledge_source_ids = knowledge_source_ids or []
-        self.edit_key = f'edit_{self.id}'
-        if self.edit_key not in ss:
-            ss[self.edit_key] = False
+        self.created_at = self.created_at or datetime.now().isoformat()
+        self.tools = self.tools or []
+        self.max_iter = self.max_iter or 25
+        self.cache = self.cache if self.cache is not None else True
+        self.knowledge_source_ids = self.knowledge_source_ids or []
 
     @property
     def edit(self):
-        return ss[self.edit_key]
+        return ui_state.get('edit', self.id, False)
 
     @edit.setter
     def edit(self, value):
-        ss[self.edit_key] = value
+        ui_state.set('edit', self.id, value)
 
-    def get_crewai_agent(self) -> Agent:
+    def get_crewai_agent(self, available_knowledge_sources=None) -> Agent:
+        """Build the crewai Agent. ``available_knowledge_sources`` are the MyKnowledgeSources to resolve
+        ``knowledge_source_ids`` against; they are loaded from the database when not given."""
         if not self.llm_provider_model or self.llm_provider_model == self.NO_LLM_SENTINEL:
             raise ValueError("No LLM provider/model configured. Please configure an LLM in your environment before creating agents.")
 
         llm = create_llm(self.llm_provider_model, temperature=self.temperature)
-        tools = [tool.create_tool() for tool in self.tools]
+        tools = [tool_cache.wrap_tool(tool.create_tool(), tool) for tool in self.tools]
         
         # Add knowledge sources if they exist
         knowledge_sources = []
-        if 'knowledge_sources' in ss and self.knowledge_source_ids:
+        if self.knowledge_source_ids:
+            if available_knowledge_sources is None:
+                available_knowledge_sources = db_utils.load_knowledge_sources()
             valid_knowledge_source_ids = []
             
             for ks_id in self.knowledge_source_ids:
-                ks = next((k for k in ss.knowledge_sources if k.id == ks_id), None)
+                ks = next((k for k in available_knowledge_sources if k.id == ks_id), None)
                 if ks:
                     try:
                         knowledge_sources.append(ks.get_crewai_knowledge_source())
@@ -78,6 +96,7 @@ class MyAgent:
     def delete(self):
         ss.agents = [agent for agent in ss.agents if agent.id != self.id]
         delete_agent(self.id)
+        ui_state.pop('edit', self.id)
 
     def request_delete_modal(self):
         """Flag this agent for deletion and trigger modal display."""
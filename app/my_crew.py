@@ -1,45 +1,90 @@
+from dataclasses import dataclass
+from typing import Any, Optional
 from crewai import Crew, Process
-import streamlit as st
 from utils import rnd_id, fix_columns_width
-from streamlit import session_state as ss
+from ui_state import st, ss
+import ui_state
 from datetime import datetime
 from llms import llm_providers_and_models, create_llm
 import db_utils
+import task_scheduler
+import budgets
+import plan_cache
+import result_archive
 
+@dataclass(slots=True, eq=False)
 class MyCrew:
-    def __init__(self, id=None, name=None, agents=None, tasks=None, process=None, cache=None, max_rpm=None, verbose=None, manager_llm=None, manager_agent=None, created_at=None, memory=None, planning=None, planning_llm=None, knowledge_source_ids=None):
-        self.id = id or "C_" + rnd_id()
-        self.name = name or "Crew 1"
-        self.agents = agents or []
-        self.tasks = tasks or []
-        self.process = process or Process.sequential
-        self.verbose = bool(verbose) if verbose is not None else True
-        self.manager_llm = manager_llm
-        self.manager_agent = manager_agent
-        self.memory = memory if memory is not None else False
-        self.cache = cache if cache is not None else True
-        self.max_rpm = max_rpm or 1000
-        self.planning = planning if planning is not None else False
-        self.planning_llm = planning_llm
-        self.created_at = created_at or datetime.now().isoformat()
-        self.knowledge_source_ids = knowledge_source_ids or []
-        self.edit_key = f'edit_{self.id}'
-        if self.edit_key not in ss:
-            ss[self.edit_key] = False
-        self.tasks_order_key = f'tasks_order_{self.id}'
-        if self.tasks_order_key not in ss:
-            ss[self.tasks_order_key] = [task.id for task in self.tasks]
+    id: Optional[str] = None
+    name: Optional[str] = None
+    agents: Optional[list] = None
+    tasks: Optional[list] = None
+    process: Optional[str] = None
+    cache: Optional[bool] = None
+    max_rpm: Optional[int] = None
+    verbose: Optional[bool] = None
+    manager_llm: Optional[str] = None
+    manager_agent: Any = None
+    created_at: Optional[str] = None
+    memory: Optional[bool] = None
+    planning: Optional[bool] = None
+    planning_llm: Optional[str] = None
+    knowledge_source_ids: Optional[list] = None
+    dag_scheduling: Optional[bool] = None
+    max_parallel_tasks: Optional[int] = None
+    budget: Optional[dict] = None
+    plan_cache: Optional[str] = None
+    retention_mode: Optional[str] = None
+    retention_value: Optional[int] = None
+
+    def __post_init__(self):
+        self.id = self.id or "C_" + rnd_id()
+        self.name = self.name or "Crew 1"
+        self.agents = self.agents or []
+        self.tasks = self.tasks or []
+        self.process = self.process or Process.sequential
+        self.verbose = bool(self.verbose) if self.verbose is not None else True
+        self.memory = self.memory if self.memory is not None else False
+        self.cache = self.cache if self.cache is not None else True
+        self.max_rpm = self.max_rpm or 1000
+        self.planning = self.planning if self.planning is not None else False
+        self.created_at = self.created_at or datetime.now().isoformat()
+        self.knowledge_source_ids = self.knowledge_source_ids or []
+        self.dag_scheduling = self.dag_scheduling if self.dag_scheduling is not None else False
+        self.max_parallel_tasks = self.max_parallel_tasks or 4
+        self.budget = budgets.normalize(self.budget)
+        self.plan_cache = self.plan_cache or 'inputs'
+        self.retention_mode = self.retention_mode or 'all'
+        self.retention_value = self.retention_value or 30
 
     @property
     def edit(self):
-        return ss[self.edit_key]
+        return ui_state.get('edit', self.id, False)
 
     @edit.setter
     def edit(self, value):
-        ss[self.edit_key] = value
+        ui_state.set('edit', self.id, value)
 
-    def get_crewai_crew(self, *args, **kwargs) -> Crew:
-        crewai_agents = [agent.get_crewai_agent() for agent in self.agents]
+    def uses_dag_scheduling(self):
+        return self.dag_scheduling and self.process == Process.sequential
+
+    def ordered_tasks(self):
+        """Tasks in the order they are handed to crewai (dependencies first when scheduled as a graph)."""
+        return task_scheduler.topological_order(self.tasks) if self.uses_dag_scheduling() else self.tasks
+
+    def get_crewai_crew(self, *args, resume_outputs=None, available_knowledge_sources=None, **kwargs) -> Crew:
+        """Build the crewai Crew. ``resume_outputs`` maps task indexes (see ``ordered_tasks``) to saved outputs that are not executed again.
+
+        ``available_knowledge_sources`` are the MyKnowledgeSources the crew and its agents refer to;
+        they are loaded from the database when not given.
+        """
+        # The recursive task creation below would not terminate on circular context
+        task_scheduler.check_for_cycles(self.tasks)
+        all_agents = self.agents + [task.agent for task in self.tasks if task.agent] + ([self.manager_agent] if self.manager_agent else [])
+        if available_knowledge_sources is None and (
+            self.knowledge_source_ids or any(agent.knowledge_source_ids for agent in all_agents)
+        ):
+            available_knowledge_sources = db_utils.load_knowledge_sources()
+        crewai_agents = [agent.get_crewai_agent(available_knowledge_sources) for agent in self.agents]
 
         # Create a dictionary to hold the Task objects
         task_objects = {}
@@ -62,10 +107,13 @@ class MyCrew:
 
             # Only pass context if it's an async task or if specific context is defined
             if task.async_execution or context_tasks:
-                crewai_task = task.get_crewai_task(context_from_async_tasks=context_tasks)
+                crewai_task = task.get_crewai_task(context_from_async_tasks=context_tasks, available_knowledge_sources=available_knowledge_sources)
             else:
-                crewai_task = task.get_crewai_task()
+                crewai_task = task.get_crewai_task(available_knowledge_sources=available_knowledge_sources)
 
+            if self.uses_dag_scheduling():
+                # The scheduler decides what runs concurrently
+                crewai_task.async_execution = False
             task_objects[task.id] = crewai_task
             return crewai_task
 
@@ -73,16 +121,16 @@ class MyCrew:
         for task in self.tasks:
             create_task(task)
 
-        # Collect the final list of tasks in the original order
-        crewai_tasks = [task_objects[task.id] for task in self.tasks]
+        # Collect the final list of tasks in the original order (dependencies first when scheduled as a graph)
+        crewai_tasks = [task_objects[task.id] for task in self.ordered_tasks()]
 
         # Add knowledge sources if they exist
         knowledge_sources = []
-        if 'knowledge_sources' in ss and self.knowledge_source_ids:
+        if self.knowledge_source_ids:
             valid_knowledge_source_ids = []
             
             for ks_id in self.knowledge_source_ids:
-                ks = next((k for k in ss.knowledge_sources if k.id == ks_id), None)
+                ks = next((k for k in available_knowledge_sources if k.id == ks_id), None)
                 if ks:
                     try:
                         knowledge_sources.append(ks.get_crewai_knowledge_source())
@@ -95,6 +143,16 @@ class MyCrew:
                 self.knowledge_source_ids = valid_knowledge_source_ids
                 db_utils.save_crew(self)
 
+        crew_class = Crew
+        scheduler_params = {}
+        if self.uses_dag_scheduling():
+            crew_class = task_scheduler.DagCrew
+            scheduler_params['max_parallel_tasks'] = self.max_parallel_tasks
+        elif resume_outputs and self.process == Process.sequential:
+            crew_class = task_scheduler.ResumableCrew
+        if resume_outputs and crew_class is not Crew:
+            scheduler_params['resume_outputs'] = resume_outputs
+
         # Create the crew with knowledge sources
         if self.manager_llm:
             crew_params = {
@@ -111,8 +169,9 @@ class MyCrew:
             }
             if self.planning and self.planning_llm:
                 crew_params['planning_llm'] = create_llm(self.planning_llm)
+            crew_params.update(scheduler_params)
             crew_params.update(kwargs)
-            return Crew(*args, **crew_params)
+            return crew_class(*args, **crew_params)
         elif self.manager_agent:
             crew_params = {
                 'agents': crewai_agents,
@@ -121,15 +180,16 @@ class MyCrew:
                 'process': self.process,
                 'max_rpm': self.max_rpm,
                 'verbose': self.verbose,
-                'manager_agent': self.manager_agent.get_crewai_agent(),
+                'manager_agent': self.manager_agent.get_crewai_agent(available_knowledge_sources),
                 'memory': self.memory,
                 'planning': self.planning,
                 'knowledge_sources': knowledge_sources if knowledge_sources else None,
             }
             if self.planning and self.planning_llm:
                 crew_params['planning_llm'] = create_llm(self.planning_llm)
+            crew_params.update(scheduler_params)
             crew_params.update(kwargs)
-            return Crew(*args, **crew_params)
+            return crew_class(*args, **crew_params)
         
         crew_params = {
             'agents': crewai_agents,
@@ -144,8 +204,9 @@ class MyCrew:
         }
         if self.planning and self.planning_llm:
             crew_params['planning_llm'] = create_llm(self.planning_llm)
+        crew_params.update(scheduler_params)
         crew_params.update(kwargs)
-        return Crew(*args, **crew_params)
+        return crew_class(*args, **crew_params)
     
     def update_knowledge_sources(self):
         self.knowledge_source_ids = ss[f'knowledge_sources_{self.id}']
@@ -154,6 +215,7 @@ class MyCrew:
     def delete(self):
         ss.crews = [crew for crew in ss.crews if crew.id != self.id]
         db_utils.delete_crew(self.id)
+        ui_state.pop('edit', self.id)
 
     def duplicate(self):
         """Create a copy of this crew with a new ID"""
@@ -170,7 +232,13 @@ class MyCrew:
             memory=self.memory,
             planning=self.planning,
             planning_llm=self.planning_llm,
-            knowledge_source_ids=self.knowledge_source_ids.copy()
+            knowledge_source_ids=self.knowledge_source_ids.copy(),
+            dag_scheduling=self.dag_scheduling,
+            max_parallel_tasks=self.max_parallel_tasks,
+            budget=dict(self.budget),
+            plan_cache=self.plan_cache,
+            retention_mode=self.retention_mode,
+            retention_value=self.retention_value
         )
         ss.crews.append(new_crew)
         db_utils.save_crew(new_crew)
@@ -189,7 +257,6 @@ class MyCrew:
         selected_tasks_ids = ss[f'tasks_{self.id}']
         self.tasks = [task for task in ss.tasks if task.id in selected_tasks_ids and task.agent.id in [agent.id for agent in self.agents]]
         self.tasks = sorted(self.tasks, key=lambda task: selected_tasks_ids.index(task.id))
-        ss[self.tasks_order_key] = selected_tasks_ids
         db_utils.save_crew(self)
 
     def update_verbose(self):
@@ -231,6 +298,31 @@ class MyCrew:
         self.planning = ss[f'planning_{self.id}']
         db_utils.save_crew(self)
 
+    def update_dag_scheduling(self):
+        self.dag_scheduling = ss[f'dag_scheduling_{self.id}']
+        db_utils.save_crew(self)
+
+    def update_max_parallel_tasks(self):
+        self.max_parallel_tasks = ss[f'max_parallel_tasks_{self.id}']
+        db_utils.save_crew(self)
+
+    def update_budget(self, limit):
+        self.budget[limit] = ss[f'budget_{limit}_{self.id}']
+        self.budget = budgets.normalize(self.budget)
+        db_utils.save_crew(self)
+
+    def update_plan_cache(self):
+        self.plan_cache = ss[f'plan_cache_{self.id}']
+        db_utils.save_crew(self)
+
+    def update_retention_mode(self):
+        self.retention_mode = ss[f'retention_mode_{self.id}']
+        db_utils.save_crew(self)
+
+    def update_retention_value(self):
+        self.retention_value = ss[f'retention_value_{self.id}']
+        db_utils.save_crew(self)
+
     def update_planning_llm(self):
         selected_llm = ss[f'planning_llm_{self.id}']
         self.planning_llm = selected_llm if selected_llm != "None" else None
@@ -257,6 +349,12 @@ class MyCrew:
             if show_warning:
                 st.warning(f"Crew {self.name} has planning enabled but no planning LLM selected")
             return False
+        try:
+            task_scheduler.check_for_cycles(self.tasks)
+        except ValueError as e:
+            if show_warning:
+                st.warning(f"Crew {self.name}: {str(e)}")
+            return False
         return True
 
     def validate_manager_llm(self):
@@ -284,6 +382,8 @@ class MyCrew:
         planning_llm_key = f"planning_llm_{self.id}"
         cache_key = f"cache_{self.id}"
         max_rpm_key = f"max_rpm_{self.id}"
+        dag_scheduling_key = f"dag_scheduling_{self.id}"
+        max_parallel_tasks_key = f"max_parallel_tasks_{self.id}"
         
         if self.edit:
             with st.container(border=True):
@@ -302,7 +402,20 @@ class MyCrew:
                 st.checkbox("Cache", value=self.cache, key=cache_key, on_change=self.update_cache)
                 st.checkbox("Planning", value=self.planning, key=planning_key, on_change=self.update_planning)
                 st.selectbox("Planning LLM", options=["None"] + llm_providers_and_models(), index=0 if self.planning_llm is None else llm_providers_and_models().index(self.planning_llm) + 1, key=planning_llm_key, on_change=self.update_planning_llm, disabled=not self.planning)
+                plan_cache_options = list(plan_cache.MODES)
+                st.selectbox("Reuse plans", options=plan_cache_options, format_func=lambda x: plan_cache.MODES[x], index=plan_cache_options.index(self.plan_cache), key=f"plan_cache_{self.id}", on_change=self.update_plan_cache, disabled=not self.planning, help="Cache the generated plan and reuse it for later runs of this unchanged crew: only for the same inputs, or as a template filled in with any inputs.")
                 st.number_input("Max req/min", value=self.max_rpm, key=max_rpm_key, on_change=self.update_max_rpm)  
+                st.checkbox("Parallel task scheduling", value=self.dag_scheduling, key=dag_scheduling_key, on_change=self.update_dag_scheduling, disabled=(self.process != Process.sequential), help="Run tasks as a dependency graph built from their context: a task starts as soon as the tasks it takes context from are done. Tasks without context run right away.")
+                st.number_input("Max parallel tasks", min_value=1, value=self.max_parallel_tasks, key=max_parallel_tasks_key, on_change=self.update_max_parallel_tasks, disabled=not self.uses_dag_scheduling())
+                retention_options = list(result_archive.MODES)
+                st.selectbox("Result retention", options=retention_options, format_func=lambda x: result_archive.MODES[x], index=retention_options.index(self.retention_mode), key=f"retention_mode_{self.id}", on_change=self.update_retention_mode, help="Older runs of this crew are moved to compressed archive files in the background. They can still be searched and restored from the Results page. Starred and running runs are always kept.")
+                st.number_input("Runs to keep" if self.retention_mode == 'last' else "Days to keep", min_value=1, value=self.retention_value, key=f"retention_value_{self.id}", on_change=self.update_retention_value, disabled=self.retention_mode not in ('last', 'days'))
+                st.markdown("**Budget per run** (0 = unlimited)")
+                budget_cols = st.columns(len(budgets.LIMITS))
+                for col, (limit, label) in zip(budget_cols, budgets.LIMITS.items()):
+                    with col:
+                        is_cost = limit == 'max_cost_usd'
+                        st.number_input(label, min_value=0.0 if is_cost else 0, value=self.budget.get(limit, 0.0 if is_cost else 0), step=0.01 if is_cost else 1, key=f"budget_{limit}_{self.id}", on_change=self.update_budget, args=(limit,))
                 # for some reason knowledge sources for crews are not working, use the knowledge sources in the agents instead
                 # if 'knowledge_sources' in ss and len(ss.knowledge_sources) > 0:
                 #     knowledge_source_options = [ks.id for ks in ss.knowledge_sources]
@@ -341,7 +454,16 @@ class MyCrew:
                 st.markdown(f"**Planning:** {self.planning}")
                 if self.planning and self.planning_llm:
                     st.markdown(f"**Planning LLM:** {self.planning_llm}")
+                if self.planning:
+                    st.markdown(f"**Reuse plans:** {plan_cache.MODES[self.plan_cache]}")
                 st.markdown(f"**Max req/min:** {self.max_rpm}")
+                if self.uses_dag_scheduling():
+                    st.markdown(f"**Parallel task scheduling:** up to {self.max_parallel_tasks} tasks at a time")
+                    self.draw_critical_path()
+                if self.retention_mode != 'all':
+                    st.markdown(f"**Result retention:** {result_archive.describe(self.retention_mode, self.retention_value)}, older runs are archived")
+                if self.budget:
+                    st.markdown("**Budget per run:** " + ", ".join(f"{budgets.LIMITS[limit]} {value}" for limit, value in self.budget.items()))
                 st.markdown("**Tasks:**")
                 for i, task in enumerate([task for task in self.tasks if task.agent and task.agent.id in [agent.id for agent in self.agents]], 1):
                     with st.container(border=True):
@@ -368,6 +490,20 @@ class MyCrew:
                 if ss.get('delete_crew_target_id') == self.id:
                     self.draw_delete_dialog()
 
+    def draw_critical_path(self):
+        try:
+            durations = task_scheduler.last_task_durations(self.tasks, ss.get('results'), self.name)
+            path, total = task_scheduler.critical_path(self.tasks, durations)
+        except ValueError:
+            return
+        if not path:
+            return
+        steps = " → ".join(task.description[:40] for task in path)
+        if durations:
+            st.markdown(f"**Critical path:** {steps} (~{total:.0f}s, based on the last run)")
+        else:
+            st.markdown(f"**Critical path:** {steps} ({len(path)} tasks)")
+
     def set_editable(self, edit):
         self.edit = edit
         db_utils.save_crew(self)
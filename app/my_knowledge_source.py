@@ -1,35 +1,43 @@
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
 from utils import rnd_id, fix_columns_width
-from streamlit import session_state as ss
-import streamlit as st
+from ui_state import st, ss
+import ui_state
 import os
 import db_utils
 from pathlib import Path  # Using Path for cross-platform path handling
 
+@dataclass(slots=True, eq=False)
 class MyKnowledgeSource:
-    def __init__(self, id=None, name=None, source_type=None, source_path=None, 
-                content=None, metadata=None, chunk_size=None, chunk_overlap=None, 
-                created_at=None):
-        self.id = id or "KS_" + rnd_id()
-        self.name = name or "Knowledge Source 1"
-        self.source_type = source_type or "string"  # string, text_file, pdf, csv, excel, json, docling
-        self.source_path = source_path or ""  # For file-based sources
-        self.content = content or ""  # For string-based sources
-        self.metadata = metadata or {}
-        self.chunk_size = chunk_size or 4000
-        self.chunk_overlap = chunk_overlap or 200
-        self.created_at = created_at or datetime.now().isoformat()
-        self.edit_key = f'edit_{self.id}'
-        if self.edit_key not in ss:
-            ss[self.edit_key] = False
+    id: Optional[str] = None
+    name: Optional[str] = None
+    source_type: Optional[str] = None  # string, text_file, pdf, csv, excel, json, docling
+    source_path: Optional[str] = None  # For file-based sources
+    content: Optional[str] = None  # For string-based sources
+    metadata: Optional[dict] = None
+    chunk_size: Optional[int] = None
+    chunk_overlap: Optional[int] = None
+    created_at: Optional[str] = None
+
+    def __post_init__(self):
+        self.id = self.id or "KS_" + rnd_id()
+        self.name = self.name or "Knowledge Source 1"
+        self.source_type = self.source_type or "string"
+        self.source_path = self.source_path or ""
+        self.content = self.content or ""
+        self.metadata = self.metadata or {}
+        self.chunk_size = self.chunk_size or 4000
+        self.chunk_overlap = self.chunk_overlap or 200
+        self.created_at = self.created_at or datetime.now().isoformat()
 
     @property
     def edit(self):
-        return ss[self.edit_key]
+        return ui_state.get('edit', self.id, False)
 
     @edit.setter
     def edit(self, value):
-        ss[self.edit_key] = value
+        ui_state.set('edit', self.id, value)
 
     def find_file(self, file_path):
         """
@@ -138,6 +146,7 @@ class MyKnowledgeSource:
     def delete(self):
         ss.knowledge_sources = [ks for ks in ss.knowledge_sources if ks.id != self.id]
         db_utils.delete_knowledge_source(self.id)
+        ui_state.pop('edit', self.id)
 
     def draw(self, key=None):
         source_types = {
@@ -1,48 +1,76 @@
+from dataclasses import dataclass
+from typing import Any, Optional
 from crewai import Task
-import streamlit as st
 from utils import rnd_id, fix_columns_width
-from streamlit import session_state as ss
+from ui_state import st, ss
+import ui_state
 from db_utils import save_task, delete_task
 import db_utils
 from datetime import datetime
+from llms import llm_providers_and_models, create_llm
+import context_policy
 
+@dataclass(slots=True, eq=False)
 class MyTask:
-    def __init__(self, id=None, description=None, expected_output=None, agent=None, async_execution=None, created_at=None, context_from_async_tasks_ids=None, context_from_sync_tasks_ids=None, **kwargs):
-        self.id = id or "T_" + rnd_id()
-        self.description = description or "Identify the next big trend in AI. Focus on identifying pros and cons and the overall narrative."
-        self.expected_output = expected_output or "A comprehensive 3 paragraphs long report on the latest AI trends."
-        self.agent = agent or ss.agents[0] if ss.agents else None
-        self.async_execution = async_execution or False
-        self.context_from_async_tasks_ids = context_from_async_tasks_ids or None
-        self.context_from_sync_tasks_ids = context_from_sync_tasks_ids or None
-        self.created_at = created_at or datetime.now().isoformat()
-        self.edit_key = f'edit_{self.id}'
-        if self.edit_key not in ss:
-            ss[self.edit_key] = False
+    id: Optional[str] = None
+    description: Optional[str] = None
+    expected_output: Optional[str] = None
+    agent: Any = None
+    async_execution: Optional[bool] = None
+    created_at: Optional[str] = None
+    context_from_async_tasks_ids: Optional[list] = None
+    context_from_sync_tasks_ids: Optional[list] = None
+    context_policy: Optional[str] = None
+    context_max_tokens: Optional[int] = None
+    context_summary_llm: Optional[str] = None
+
+    def __post_init__(self):
+        self.id = self.id or "T_" + rnd_id()
+        self.description = self.description or "Identify the next big trend in AI. Focus on identifying pros and cons and the overall narrative."
+        self.expected_output = self.expected_output or "A comprehensive 3 paragraphs long report on the latest AI trends."
+        self.async_execution = self.async_execution or False
+        self.context_from_async_tasks_ids = self.context_from_async_tasks_ids or None
+        self.context_from_sync_tasks_ids = self.context_from_sync_tasks_ids or None
+        self.created_at = self.created_at or datetime.now().isoformat()
+        self.context_policy = self.context_policy or 'full'
+        self.context_max_tokens = self.context_max_tokens or context_policy.DEFAULT_MAX_TOKENS
 
     @property
     def edit(self):
-        return ss[self.edit_key]
+        return ui_state.get('edit', self.id, False)
 
     @edit.setter
     def edit(self, value):
-        ss[self.edit_key] = value
+        ui_state.set('edit', self.id, value)
 
-    def get_crewai_task(self, context_from_async_tasks=None, context_from_sync_tasks=None) -> Task:
+    def get_crewai_task(self, context_from_async_tasks=None, context_from_sync_tasks=None, available_knowledge_sources=None) -> Task:
         context = []
         if context_from_async_tasks:
             context.extend(context_from_async_tasks)
         if context_from_sync_tasks:
             context.extend(context_from_sync_tasks)
-        
+
+        crewai_agent = self.agent.get_crewai_agent(available_knowledge_sources)
+        task_params = {
+            'description': self.description,
+            'expected_output': self.expected_output,
+            'async_execution': self.async_execution,
+            'agent': crewai_agent,
+            'context_policy': self.context_policy,
+            'context_max_tokens': self.context_max_tokens,
+            'studio_task_id': self.id,
+        }
         if context:
-            return Task(description=self.description, expected_output=self.expected_output, async_execution=self.async_execution, agent=self.agent.get_crewai_agent(), context=context)
-        else:
-            return Task(description=self.description, expected_output=self.expected_output, async_execution=self.async_execution, agent=self.agent.get_crewai_agent())
+            task_params['context'] = context
+        if self.context_policy == 'summarize':
+            # Also for the implicit context of sequential tasks (the previous task outputs)
+            task_params['context_summary_llm'] = create_llm(self.context_summary_llm, temperature=0) if self.context_summary_llm else crewai_agent.llm
+        return context_policy.ContextPolicyTask(**task_params)
 
     def delete(self):
         ss.tasks = [task for task in ss.tasks if task.id != self.id]
         delete_task(self.id)
+        ui_state.pop('edit', self.id)
 
     def request_delete_modal(self):
         """Flag this task for deletion and trigger modal display."""
@@ -130,7 +158,10 @@ class MyTask:
             agent=self.agent,
             async_execution=self.async_execution,
             context_from_async_tasks_ids=self.context_from_async_tasks_ids.copy() if self.context_from_async_tasks_ids else None,
-            context_from_sync_tasks_ids=self.context_from_sync_tasks_ids.copy() if self.context_from_sync_tasks_ids else None
+            context_from_sync_tasks_ids=self.context_from_sync_tasks_ids.copy() if self.context_from_sync_tasks_ids else None,
+            context_policy=self.context_policy,
+            context_max_tokens=self.context_max_tokens,
+            context_summary_llm=self.context_summary_llm
         )
         ss.tasks.append(new_task)
         save_task(new_task)
@@ -160,6 +191,12 @@ class MyTask:
                     self.async_execution = st.checkbox("Async execution", value=self.async_execution)
                     self.context_from_async_tasks_ids = st.multiselect("Context from async tasks", options=[task.id for task in ss.tasks if task.async_execution], default=self.context_from_async_tasks_ids, format_func=lambda x: [task.description[:120] for task in ss.tasks if task.id == x][0])
                     self.context_from_sync_tasks_ids = st.multiselect("Context from sync tasks", options=[task.id for task in ss.tasks if not task.async_execution], default=self.context_from_sync_tasks_ids, format_func=lambda x: [task.description[:120] for task in ss.tasks if task.id == x][0])
+                    policy_options = list(context_policy.POLICIES)
+                    self.context_policy = st.selectbox("Context policy", options=policy_options, format_func=lambda x: context_policy.POLICIES[x], index=policy_options.index(self.context_policy), help="How the outputs of the context tasks are passed to this task: in full, cut to the first N tokens, as the first and last N/2 tokens, or summarized to about N tokens by the summary LLM.")
+                    self.context_max_tokens = st.number_input("Context max tokens (N)", min_value=1, value=self.context_max_tokens)
+                    summary_llm_options = ["Agent's LLM"] + llm_providers_and_models()
+                    summary_llm = st.selectbox("Summary LLM", options=summary_llm_options, index=summary_llm_options.index(self.context_summary_llm) if self.context_summary_llm in summary_llm_options else 0, help="Used by the Summarize policy; a small, cheap model is usually enough.")
+                    self.context_summary_llm = None if summary_llm == summary_llm_options[0] else summary_llm
                     col_submit, col_cancel = st.columns(2)
                     with col_submit:
                         submitted = st.form_submit_button("Save", type="primary")
@@ -178,6 +215,9 @@ class MyTask:
                 st.markdown(f"**Async execution:** {self.async_execution}")
                 st.markdown(f"**Context from async tasks:** {', '.join([task.description[:120] for task in ss.tasks if task.id in self.context_from_async_tasks_ids]) if self.context_from_async_tasks_ids else 'None'}")
                 st.markdown(f"**Context from sync tasks:** {', '.join([task.description[:120] for task in ss.tasks if task.id in self.context_from_sync_tasks_ids]) if self.context_from_sync_tasks_ids else 'None'}")
+                if self.context_policy != 'full':
+                    summary_llm = f" by {self.context_summary_llm or 'the agent LLM'}" if self.context_policy == 'summarize' else ""
+                    st.markdown(f"**Context policy:** {context_policy.POLICIES[self.context_policy]}, {self.context_max_tokens} tokens{summary_llm}")
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     st.button("Edit", on_click=self.set_editable, args=(True,), key=rnd_id())
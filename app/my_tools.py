@@ -1,5 +1,5 @@
 import logging
-import streamlit as st
+from ui_state import st
 import os
 from utils import rnd_id
 from crewai_tools import CodeInterpreterTool,ScrapeElementFromWebsiteTool,TXTSearchTool,SeleniumScrapingTool,PDFSearchTool,MDXSearchTool,JSONSearchTool,GithubSearchTool,EXASearchTool,DOCXSearchTool,CSVSearchTool,ScrapeWebsiteTool, FileReadTool, DirectorySearchTool, DirectoryReadTool, CodeDocsSearchTool, YoutubeVideoSearchTool,SerperDevTool,YoutubeChannelSearchTool,WebsiteSearchTool
@@ -27,12 +27,16 @@ from tools.DuckDuckGoSearchTool import DuckDuckGoSearchTool
 from langchain_community.tools import YahooFinanceNewsTool
 
 class MyTool:
+    # Seconds results stay in the persistent tool cache unless set per tool (see tool_cache); 0 = not cached
+    default_cache_ttl_s = 0
+
     def __init__(self, tool_id, name, description, parameters, **kwargs):
         self.tool_id = tool_id or rnd_id()
         self.name = name
         self.description = description
         self.parameters = kwargs
         self.parameters_metadata = parameters
+        self.cache_ttl_s = None
 
     def create_tool(self):
         pass
@@ -43,6 +47,9 @@ class MyTool:
     def set_parameters(self, **kwargs):
         self.parameters.update(kwargs)
 
+    def get_cache_ttl_s(self):
+        return self.cache_ttl_s if self.cache_ttl_s is not None else self.default_cache_ttl_s
+
     def get_parameter_names(self):
         return list(self.parameters_metadata.keys())
 
@@ -58,6 +65,8 @@ class MyTool:
         return True
 
 class MyScrapeWebsiteTool(MyTool):
+    default_cache_ttl_s = 86400
+
     def __init__(self, tool_id=None, website_url=None):
         parameters = {
             'website_url': {'mandatory': False}
@@ -118,6 +127,8 @@ class MyYoutubeVideoSearchTool(MyTool):
         return YoutubeVideoSearchTool(self.parameters.get('youtube_video_url') if self.parameters.get('youtube_video_url') else None)
 
 class MySerperDevTool(MyTool):
+    default_cache_ttl_s = 3600
+
     def __init__(self, tool_id=None, SERPER_API_KEY=None):
         parameters = {
             'SERPER_API_KEY': {'mandatory': True}
@@ -170,6 +181,8 @@ class MyDocxSearchTool(MyTool):
         return DOCXSearchTool(docx=self.parameters.get('docx') if self.parameters.get('docx') else None)
 
 class MyEXASearchTool(MyTool):
+    default_cache_ttl_s = 3600
+
     def __init__(self, tool_id=None, EXA_API_KEY=None):
         parameters = {
             'EXA_API_KEY': {'mandatory': True}
@@ -252,6 +265,8 @@ class MyPDFSearchTool(MyTool):
         return PDFSearchTool(self.parameters.get('pdf') if self.parameters.get('pdf') else None)
 
 class MySeleniumScrapingTool(MyTool):
+    default_cache_ttl_s = 86400
+
     def __init__(self, tool_id=None, website_url=None, css_element=None, cookie=None, wait_time=None):
         parameters = {
             'website_url': {'mandatory': False},
@@ -290,6 +305,8 @@ class MyTXTSearchTool(MyTool):
         return TXTSearchTool(self.parameters.get('txt'))
 
 class MyScrapeElementFromWebsiteTool(MyTool):
+    default_cache_ttl_s = 86400
+
     def __init__(self, tool_id=None, website_url=None, css_element=None, cookie=None):
         parameters = {
             'website_url': {'mandatory': False},
@@ -315,6 +332,8 @@ class MyScrapeElementFromWebsiteTool(MyTool):
         )
     
 class MyYahooFinanceNewsTool(MyTool):
+    default_cache_ttl_s = 3600
+
     def __init__(self, tool_id=None):
         parameters = {}
         super().__init__(tool_id, 'YahooFinanceNewsTool', "A tool that can be used to search Yahoo Finance News.", parameters)
@@ -354,6 +373,8 @@ class MyCustomFileWriteTool(MyTool):
 
 
 class MyDuckDuckGoSearchTool(MyTool):
+    default_cache_ttl_s = 3600
+
     def __init__(self, tool_id=None):
         parameters = {}
         super().__init__(tool_id, 'DuckDuckGoSearchTool', "A tool to search the web using DuckDuckGo engine.", parameters)
@@ -392,6 +413,8 @@ class MyCSVSearchToolEnhanced(MyTool):
         return CSVSearchToolEnhanced(csv=self.parameters.get('csv') if self.parameters.get('csv') else None)
     
 class MyScrapeWebsiteToolEnhanced(MyTool):
+    default_cache_ttl_s = 86400
+
     def __init__(self, tool_id=None, website_url=None, cookies=None, show_urls=None, css_selector=None):
         parameters = {
             'website_url': {'mandatory': False},
@@ -410,6 +433,8 @@ class MyScrapeWebsiteToolEnhanced(MyTool):
         )
 
 class MyScrapflyScrapeWebsiteTool(MyTool):
+    default_cache_ttl_s = 86400
+
     def __init__(self, tool_id=None, api_key=None):
         parameters = {
             'api_key': {'mandatory': False}
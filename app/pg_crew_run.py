@@ -1,6 +1,5 @@
 import re
 import streamlit as st
-from crewai import TaskOutput
 from streamlit import session_state as ss
 import threading
 import ctypes
@@ -8,9 +7,18 @@ import queue
 import time
 import traceback
 import os
+from datetime import datetime
 from console_capture import ConsoleCapture
-from db_utils import load_results, save_result
-from utils import format_result, generate_printable_view, rnd_id, get_tasks_outputs_str
+from db_utils import load_results
+from utils import format_result, generate_printable_view, get_tasks_outputs_str
+import rate_limiter
+import instrumentation
+import run_store
+import batch_runner
+import crew_prebuild
+import budgets
+import plan_cache
+import run_profiler
 
 
 class PageCrewRun:
@@ -20,26 +28,6 @@ class PageCrewRun:
         if 'results' not in ss:
             ss.results = load_results()
 
-    def get_tasks_output(self, tasks_output: list[TaskOutput], tasks=None):
-        res = []
-
-        index = 0
-        for task_output in tasks_output:
-            task_desc = None
-            if tasks and index < len(tasks):
-                task_desc = getattr(tasks[index], 'description', None)
-            res.append({
-                'raw': task_output.raw,
-                'type': 'TaskOutput',
-                'index': index,
-                'description': task_desc
-            })
-            index += 1
-
-
-        return res
-
-
     @staticmethod
     def maintain_session_state():
         defaults = {
@@ -52,10 +40,18 @@ class PageCrewRun:
             'console_output': [],
             'last_update': time.time(),
             'console_expanded': True,
+            'batch_run': None,
+            'crew_prebuilder': None,
+            'run_build': None,
+            'stream_answers': str(os.getenv('LLM_STREAMING', 'true')).lower() in ['true', '1'],
+            'live_answer': None,
+            'profile_run': False,
         }
         for key, value in defaults.items():
             if key not in ss:
                 ss[key] = value
+        if ss.crew_prebuilder is None:
+            ss.crew_prebuilder = crew_prebuild.CrewPrebuilder()
 
     @staticmethod
     def extract_placeholders(text):
@@ -75,23 +71,70 @@ class PageCrewRun:
         
         return placeholders
 
-    def run_crew(self, crewai_crew, inputs, message_queue):
+    def run_crew(self, crewai_crew, inputs, message_queue, run_stats=None, profiler=None):
         if (str(os.getenv('AGENTOPS_ENABLED')).lower() in ['true', '1']) and not ss.get('agentops_failed', False):
             import agentops
             agentops.start_session()
+        if run_stats is not None:
+            instrumentation.bind(crewai_crew, run_stats)
         try:
-            result = crewai_crew.kickoff(inputs=inputs)
+            if profiler is not None:
+                result = profiler.run(crewai_crew.kickoff, inputs=inputs)
+            else:
+                result = crewai_crew.kickoff(inputs=inputs)
             message_queue.put({"result": result})
         except Exception as e:
             if (str(os.getenv('AGENTOPS_ENABLED')).lower() in ['true', '1']) and not ss.get('agentops_failed', False):
                 agentops.end_session()
+            budget = getattr(run_stats, 'budget', None)
+            if budget is not None and budget.exceeded:
+                print(f"Run stopped: {budget.exceeded}")
+                message_queue.put({"result": f"Run stopped: {budget.exceeded}", "budget_exceeded": True})
+                return
             stack_trace = traceback.format_exc()
             print(f"Error running crew: {str(e)}\n{stack_trace}")
             message_queue.put({"result": f"Error running crew: {str(e)}", "stack_trace": stack_trace})
         finally:
+            if run_stats is not None:
+                instrumentation.unbind(crewai_crew)
             if hasattr(ss, 'console_capture'):
                 ss.console_capture.stop()
 
+    def get_relevant_inputs(self, crew):
+        """Placeholder values used by ``crew`` only."""
+        inputs = {}
+        for placeholder in self.get_placeholders_from_crew(crew):
+            placeholder_key = f'placeholder_{placeholder}'
+            if placeholder_key in ss.placeholders:
+                inputs[placeholder] = ss.placeholders[placeholder_key]
+        return inputs
+
+    def finish_run(self, status, result_data=None):
+        """Store the final status (and output) of the run started from this session."""
+        run_result = ss.get('run_result')
+        if run_result is None or run_result.status != 'running':
+            return run_result
+        stats = ss.run_stats.as_dict() if ss.get('run_stats') else None
+        return run_store.finish_run(run_result, status, result_data, stats)
+
+    def get_resume_result(self, crew):
+        """The interrupted run of ``crew`` picked for resuming on the Results page, if any."""
+        run_id = ss.get('resume_result_id')
+        if not run_id:
+            return None
+        return next((r for r in ss.get('results', []) if r.id == run_id and r.crew_name == crew.name and r.status != 'completed'), None)
+
+    def draw_resume_info(self, crew):
+        resume_result = self.get_resume_result(crew)
+        if resume_result is None:
+            return
+        task_ids = [task.id for task in crew.ordered_tasks()]
+        done = run_store.checkpoint_outputs(resume_result.id, task_ids)
+        st.info(f"Resuming the {resume_result.status} run from {resume_result.created_at[:19]}: {len(done)} of {len(task_ids)} tasks are already done and will be reused.")
+        if st.button("Start over instead", disabled=ss.running):
+            ss.resume_result_id = None
+            st.rerun()
+
     def get_mycrew_by_name(self, crewname):
         return next((crew for crew in ss.crews if crew.name == crewname), None)
 
@@ -146,41 +189,182 @@ class PageCrewRun:
 
         if selected_crew:
             selected_crew.draw(expanded=False,buttons=False)
+            batch_running = ss.batch_run is not None and ss.batch_run.is_running()
+            mode = st.radio("Mode", ["Single run", "Batch"], horizontal=True, key="kickoff_mode", disabled=ss.running or batch_running)
+            if mode == "Batch":
+                if not selected_crew.is_valid(show_warning=True):
+                    st.error("Selected crew is not valid. Please fix the issues.")
+                self.draw_batch(selected_crew)
+                return
             self.draw_placeholders(selected_crew)
+            self.draw_resume_info(selected_crew)
             
             if not selected_crew.is_valid(show_warning=True):
                 st.error("Selected crew is not valid. Please fix the issues.")
+            elif not ss.running and self.get_resume_result(selected_crew) is None:
+                # Build the crew in the background while the placeholders are being filled in
+                ss.crew_prebuilder.request(selected_crew, ss.get('knowledge_sources'))
             self.control_buttons(selected_crew)
 
+    def draw_batch(self, crew):
+        batch = ss.batch_run
+        batch_running = batch is not None and batch.is_running()
+        placeholders = sorted(self.get_placeholders_from_crew(crew))
+        st.caption(
+            "Upload a CSV file with one column per placeholder, or a JSONL file with one object per line. "
+            + (f"Placeholders: {', '.join(placeholders)}" if placeholders else "This crew has no placeholders.")
+        )
+        uploaded = st.file_uploader("Input rows", type=["csv", "jsonl", "ndjson"], disabled=batch_running)
+        max_concurrency = st.number_input("Rows running at the same time", min_value=1, max_value=32, value=4, disabled=batch_running)
+
+        rows = []
+        if uploaded is not None:
+            try:
+                rows = batch_runner.parse_rows(uploaded.name, uploaded.getvalue())
+            except Exception as e:
+                st.error(f"Could not read {uploaded.name}: {str(e)}")
+                rows = []
+            missing = [p for p in placeholders if rows and any(p not in row for row in rows)]
+            if missing:
+                st.error(f"Missing placeholder column(s): {', '.join(missing)}")
+                rows = []
+            elif rows:
+                st.write(f"{len(rows)} row(s)")
+                st.dataframe(rows[:20], use_container_width=True)
+
+        can_run = bool(rows) and crew.is_valid() and not batch_running and not ss.running
+        if st.button("Run batch!", disabled=not can_run, type="primary"):
+            knowledge_sources = ss.get('knowledge_sources')
+
+            def build_crew():
+                crewai_crew = crew.get_crewai_crew(full_output=True, available_knowledge_sources=knowledge_sources)
+                plan_cache.attach(crewai_crew, crew, placeholders)
+                return crewai_crew
+
+            # Built once here to report a broken crew right away, each row then gets its own crew
+            try:
+                build_crew()
+            except Exception as e:
+                st.exception(e)
+                traceback.print_exc()
+                return
+            ss.batch_run = batch_runner.BatchRun(
+                crew.name,
+                [{p: row.get(p, '') for p in placeholders} for row in rows],
+                build_crew,
+                max_concurrency,
+                task_ids=[task.id for task in crew.ordered_tasks()],
+                serialize_result=lambda output: run_store.serialize_output(output, crew.ordered_tasks()),
+                budget=crew.budget,
+            )
+            ss.batch_run.start()
+            st.rerun()
+
+        if batch is not None and batch.crew_name == crew.name:
+            self.draw_batch_progress(batch)
+
+    def draw_batch_progress(self, batch):
+        batch_running = batch.is_running()
+        counts = batch.progress()
+        finished = sum(counts.get(status, 0) for status in ('completed', 'failed', 'cancelled', 'budget_exceeded'))
+        st.progress(finished / max(len(batch.rows), 1), text=f"{finished} of {len(batch.rows)} rows finished")
+        st.write(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+        st.dataframe(batch.table(), use_container_width=True)
+
+        if 'results' not in ss:
+            ss.results = []
+        for result in list(batch.results):
+            if result not in ss.results:
+                ss.results.append(result)
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            if st.button("Stop batch", disabled=not batch_running):
+                batch.cancel()
+                st.rerun()
+        with col2:
+            if st.button("Retry failed rows", disabled=batch_running or not (counts.get('failed') or counts.get('cancelled') or counts.get('budget_exceeded'))):
+                batch.retry_failed()
+                st.rerun()
+        with col3:
+            st.download_button("📥 CSV", data=batch.to_csv(), file_name=f"{batch.crew_name}_{batch.id}.csv", mime="text/csv", disabled=batch_running)
+        with col4:
+            st.download_button("📥 JSONL", data=batch.to_jsonl(), file_name=f"{batch.crew_name}_{batch.id}.jsonl", mime="application/x-ndjson", disabled=batch_running)
+
+        if batch_running:
+            time.sleep(1)
+            st.rerun()
+
     def control_buttons(self, selected_crew):
         placeholders_filled = self.are_placeholders_filled(selected_crew)
         can_run = selected_crew.is_valid() and placeholders_filled and not ss.running
 
         if not placeholders_filled and selected_crew.is_valid():
             st.warning("⚠️ Please fill in all required placeholders before running the crew.")
+        if not ss.running:
+            self.draw_prebuild_status(selected_crew)
+            self.draw_run_budget(selected_crew)
+            self.draw_plan_cache(selected_crew)
+            st.checkbox("Stream answers live", key="stream_answers", help="Show the answer of the working agent token by token while the crew runs.")
+            st.checkbox("Profile this run", key="profile_run", help="Record a cProfile and stack samples of the run (flamegraph-ready), downloadable from the Results page. Adds some overhead.")
 
         if st.button('Run crew!', disabled=not can_run, type="primary"):
             inputs = {key.split('_')[1]: value for key, value in ss.placeholders.items()}
             ss.result = None
+            task_ids = [task.id for task in selected_crew.ordered_tasks()]
+            resume_result = self.get_resume_result(selected_crew)
+            resume_outputs = run_store.checkpoint_outputs(resume_result.id, task_ids) if resume_result else None
             
-            try:
-                crew = selected_crew.get_crewai_crew(full_output=True)
-            except Exception as e:
-                st.exception(e)
-                traceback.print_exc()
-                return
+            crew, build_s = (None, None) if resume_outputs else ss.crew_prebuilder.take(selected_crew, ss.get('knowledge_sources'))
+            prebuilt = crew is not None
+            if crew is None:
+                build_started = time.monotonic()
+                try:
+                    crew = selected_crew.get_crewai_crew(
+                        full_output=True,
+                        resume_outputs=resume_outputs,
+                        available_knowledge_sources=ss.get('knowledge_sources'),
+                    )
+                except Exception as e:
+                    st.exception(e)
+                    traceback.print_exc()
+                    return
+                build_s = round(time.monotonic() - build_started, 3)
+            ss.run_build = {'build_s': build_s, 'prebuilt': prebuilt}
+            plan_cache.attach(crew, selected_crew, self.get_placeholders_from_crew(selected_crew), refresh=ss.get('plan_refresh', False))
+
+            # Saved before the run starts so each task output can be persisted as soon as it exists
+            if resume_result:
+                ss.run_result = run_store.resume_run(resume_result, resume_outputs)
+                ss.resume_result_id = None
+            else:
+                ss.run_result = run_store.start_run(selected_crew.name, self.get_relevant_inputs(selected_crew))
+                if 'results' not in ss:
+                    ss.results = []
+                ss.results.append(ss.run_result)
+            run_store.attach(crew, ss.run_result.id, task_ids)
 
             ss.console_capture = ConsoleCapture()
             ss.console_capture.start()
             ss.console_output = []  # Reset výstupu
 
             ss.running = True
+            ss.run_stats = instrumentation.RunStats(selected_crew.name)
+            ss.run_stats.build_s = build_s
+            run_budget = budgets.combine(selected_crew.budget, self.get_run_budget())
+            if run_budget:
+                ss.run_stats.budget = budgets.RunBudget(run_budget)
+            if ss.stream_answers:
+                ss.run_stats.stream = queue.Queue()
+            ss.live_answer = None
             ss.crew_thread = threading.Thread(
                 target=self.run_crew,
                 kwargs={
                     "crewai_crew": crew,
                     "inputs": inputs,
-                    "message_queue": ss.message_queue
+                    "message_queue": ss.message_queue,
+                    "run_stats": ss.run_stats,
+                    "profiler": run_profiler.RunProfiler(ss.run_result.id, ss.run_stats) if ss.profile_run else None,
                 }
             )
             ss.crew_thread.start()
@@ -193,45 +377,101 @@ class PageCrewRun:
             if hasattr(ss, 'console_capture'):
                 ss.console_capture.stop()
             ss.message_queue.queue.clear()
+            self.finish_run('stopped')
             ss.running = False
             ss.crew_thread = None
             ss.result = None
             st.success("Crew stopped successfully.")
             st.rerun()
 
-    def serialize_result(self, result, crew=None) -> str | dict :
-        """
-        Serialize the crew result for database storage.
-        """
-        if isinstance(result, dict):
-            serialized = {}
-            for key, value in result.items():
-                if hasattr(value, 'raw'):
-                    serialized[key] = {
-                        'raw': value.raw,
-                        'type': 'CrewOutput'
-                    }
-
-                    tasks_output_key = 'tasks_output'
-                    if hasattr(value, tasks_output_key):
-                        serialized[tasks_output_key] = self.get_tasks_output(
-                            value.tasks_output,
-                            crew.tasks if crew else None
-                        )
-                elif hasattr(value, '__dict__'):
-                    serialized[key] = {
-                        'data': value.__dict__,
-                        'type': value.__class__.__name__
-                    }
-                else:
-                    serialized[key] = value
-            return serialized
-        return str(result)
+    @staticmethod
+    def get_run_budget():
+        """The limits entered for the next run only."""
+        return budgets.normalize({limit: ss.get(f'run_budget_{limit}') for limit in budgets.LIMITS})
+
+    def draw_run_budget(self, crew):
+        with st.expander("Budget for this run", expanded=False):
+            st.caption("0 = no extra limit. The crew's own budget always applies; where both set a limit the stricter one wins.")
+            cols = st.columns(len(budgets.LIMITS))
+            for col, (limit, label) in zip(cols, budgets.LIMITS.items()):
+                with col:
+                    is_cost = limit == 'max_cost_usd'
+                    st.number_input(label, min_value=0.0 if is_cost else 0, step=0.01 if is_cost else 1, key=f'run_budget_{limit}')
+            effective = budgets.combine(crew.budget, self.get_run_budget())
+            if effective:
+                st.caption("Effective: " + ", ".join(f"{budgets.LIMITS[limit]} {value}" for limit, value in effective.items()))
+
+    def draw_plan_cache(self, crew):
+        if not crew.planning or crew.plan_cache == 'off':
+            return
+        entry = plan_cache.lookup(crew, self.get_relevant_inputs(crew), self.get_placeholders_from_crew(crew))
+        if entry is None:
+            st.caption("📋 No cached plan for this crew and these inputs yet; the plan made by this run will be cached.")
+            ss.plan_refresh = False
+            return
+        created_at = datetime.fromisoformat(entry['created_at']).strftime('%Y-%m-%d %H:%M')
+        with st.expander(f"📋 Cached plan from {created_at} will be reused (no planning LLM call)", expanded=False):
+            for task, plan in zip(crew.ordered_tasks(), entry['plans']):
+                st.markdown(f"**{task.description[:120]}**")
+                st.text(plan.strip())
+        # Keyed by the plan, so the box is cleared once a refreshed plan replaces it
+        ss.plan_refresh = st.checkbox("Refresh the plan instead of reusing it", key=f"plan_refresh_{entry['created_at']}")
+
+    def draw_plan_info(self):
+        plan = ss.run_stats.plan if ss.get('run_stats') else None
+        if plan is None:
+            return
+        if plan['source'] == 'cache':
+            st.caption(f"📋 Reused the plan cached on {plan['created_at'][:16].replace('T', ' ')}")
+        elif plan.get('stored') is False:
+            st.caption(f"📋 Plan {plan['source']} by the planning LLM, not cached: an input value also appears in the crew's own texts")
+        else:
+            st.caption(f"📋 Plan {plan['source']} by the planning LLM and cached")
+
+    def draw_live_answer(self):
+        stream = ss.run_stats.stream if ss.get('run_stats') else None
+        if stream is None:
+            return
+        while True:
+            try:
+                item = stream.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, dict):
+                # A new LLM call starts a new answer
+                ss.live_answer = {**item, 'text': ''}
+            elif ss.live_answer is not None:
+                ss.live_answer['text'] += item
+        if ss.live_answer is None:
+            return
+        with st.container(border=True):
+            st.caption(f"✍️ {ss.live_answer['agent'] or 'Agent'} is answering" + (f" · {ss.live_answer['task'][:80]}" if ss.live_answer['task'] else ""))
+            st.text(ss.live_answer['text'][-4000:] or "...")
+
+    def draw_budget_status(self):
+        budget = ss.run_stats.budget if ss.get('run_stats') else None
+        if budget is None:
+            return
+        for usage in budget.status():
+            st.progress(usage['fraction'], text=f"{usage['limit']}: {usage['used']} of {usage['max']}")
+
+    def draw_prebuild_status(self, crew):
+        status, build_s = ss.crew_prebuilder.status(crew, ss.get('knowledge_sources'))
+        if status == 'building':
+            st.caption("⏳ Preparing the crew in the background...")
+        elif status == 'ready':
+            st.caption(f"✅ Crew prepared in {build_s:.1f} s, ready to run")
+        elif status == 'failed':
+            st.caption("⚠️ Preparing the crew failed, it will be built again when you run it")
 
     def display_result(self):
         if ss.running and ss.page != "Kickoff!":
             ss.page = "Kickoff!"
             st.rerun()
+        if ss.run_build is not None and (ss.running or ss.result is not None):
+            where = "in the background before the run" if ss.run_build['prebuilt'] else "when the run was started"
+            st.caption(f"Crew built in {ss.run_build['build_s']:.1f} s {where} (not included in the run time)")
+            self.draw_plan_info()
         console_container = st.empty()
         
         with console_container.container():
@@ -245,11 +485,16 @@ class PageCrewRun:
                 console_text = "\n".join(ss.console_output)
                 st.code(console_text, language=None)
 
-        if ss.result is not None:
+        if isinstance(ss.result, dict) and 'stack_trace' in ss.result:
+            self.finish_run('failed', ss.result['result'])
+            st.error(ss.result['result'])
+        elif isinstance(ss.result, dict) and ss.result.get('budget_exceeded'):
+            self.finish_run('budget_exceeded', ss.result['result'])
+            st.warning(f"💸 {ss.result['result']}. The task outputs finished so far are saved and the run can be resumed from the Results page.")
+            self.draw_budget_status()
+        elif ss.result is not None:
             if isinstance(ss.result, dict):
                 # Save the result only if it's a new result (not already in ss.results)
-                from result import Result
-                
                 # Create a unique identifier for the current result based on its content
                 result_identifier = str(hash(str(ss.result)))
                 
@@ -258,34 +503,24 @@ class PageCrewRun:
                     ss.saved_results = set()
                 
                 if result_identifier not in ss.saved_results:
-                    # FIXED: Only get placeholders related to the current run
-                    # Get only relevant placeholders for this specific crew
-                    relevant_placeholders = {}
-                    
-                    # First, extract all placeholders for the current crew
                     curr_crew = self.get_mycrew_by_name(ss.selected_crew_name)
-                    if curr_crew:
-                        crew_placeholders = self.get_placeholders_from_crew(curr_crew)
-                        # Only include placeholders that were actually used in this crew
-                        for placeholder in crew_placeholders:
-                            placeholder_key = f'placeholder_{placeholder}'
-                            if placeholder_key in ss.placeholders:
-                                relevant_placeholders[placeholder_key] = ss.placeholders[placeholder_key]
-                    
-                    # Create a new Result instance with serialized result
-                    result = Result(
-                        id=f"R_{rnd_id()}",
-                        crew_id=ss.selected_crew_name,
-                        crew_name=ss.selected_crew_name,
-                        inputs={key.split('_')[1]: value for key, value in relevant_placeholders.items()},
-                        result=self.serialize_result(ss.result, curr_crew)  # Serialize the result before saving
-                    )
-                    
-                    # Save to database and update session state
-                    save_result(result)
+                    if ss.get('run_result') is None:
+                        ss.run_result = run_store.start_run(
+                            ss.selected_crew_name,
+                            self.get_relevant_inputs(curr_crew) if curr_crew else {}
+                        )
+
+                    # Complete the Result saved at kickoff with the serialized result
+                    output = ss.result.get('result')
+                    if hasattr(output, 'tasks_output'):
+                        result_data = run_store.serialize_output(output, curr_crew.ordered_tasks() if curr_crew else None)
+                    else:
+                        result_data = {'result': str(output)}
+                    result = self.finish_run('completed', result_data)
                     if 'results' not in ss:
                         ss.results = []
-                    ss.results.append(result)
+                    if result not in ss.results:
+                        ss.results.append(result)
                     
                     # Mark this result as saved
                     ss.saved_results.add(result_identifier)
@@ -297,7 +532,7 @@ class PageCrewRun:
 
                 # Always define curr_crew before use
                 curr_crew = self.get_mycrew_by_name(ss.selected_crew_name)
-                task_list = curr_crew.tasks if curr_crew else None
+                task_list = curr_crew.ordered_tasks() if curr_crew else None
                 tasks_result = get_tasks_outputs_str(
                     ss.result["result"].tasks_output,
                     task_list
@@ -350,6 +585,8 @@ class PageCrewRun:
             else:
                 st.error(ss.result)
         elif ss.running and ss.crew_thread is not None:
+            self.draw_budget_status()
+            self.draw_live_answer()
             with st.spinner("Running crew..."):
                 if hasattr(ss, 'console_capture'):
                     new_output = ss.console_capture.get_output()
@@ -364,7 +601,7 @@ class PageCrewRun:
                         ss.console_capture.stop()
                     st.rerun()
                 except queue.Empty:
-                    time.sleep(1)
+                    time.sleep(0.5 if ss.run_stats.stream is not None else 1)
                     st.rerun()
 
     @staticmethod
@@ -378,7 +615,16 @@ class PageCrewRun:
                 else:
                     st.success("Thread stopped successfully.")
 
+    def draw_rate_limits(self):
+        stats = rate_limiter.get_stats()
+        if not stats:
+            return
+        with st.expander("LLM queue (shared rate limits)", expanded=False):
+            st.caption("Wait time is time spent queued by the rate limiter, latency is time spent in the model call.")
+            st.table([{'LLM': key, **values} for key, values in stats.items()])
+
     def draw(self):
         st.subheader(self.name)
         self.draw_crews()
+        self.draw_rate_limits()
         self.display_result()
\ No newline at end of file
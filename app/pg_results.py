@@ -1,27 +1,177 @@
 import streamlit as st
 from streamlit import session_state as ss
-from db_utils import delete_result, load_results
+from db_utils import count_search_results, delete_result, load_archived_results, load_results, load_results_by_ids, load_task_outputs, search_results, set_result_starred
 from datetime import datetime
-from utils import rnd_id, format_result, generate_printable_view, get_tasks_outputs_str
+from utils import format_result, generate_printable_view, get_tasks_outputs_str
 import json
+from crewai import Process
+import run_profiler
+import result_archive
 
 class PageResults:
     def __init__(self):
         self.name = "Results"
 
+    PROFILE_CATEGORIES = {
+        'llm': "LLM calls",
+        'tool': "Tools",
+        'html': "HTML / Markdown parsing",
+        'db': "Database",
+        'waiting': "Waiting on threads / locks",
+        'other': "crewai and Studio",
+    }
+
+    def draw_profile(self, profile, result_id):
+        st.markdown("##### Profile")
+        st.caption(f"{profile['samples']} stack samples every {profile['interval_ms']} ms from {profile['threads']} thread(s) over {profile.get('duration_s') or 0:.1f} s")
+        if profile.get('categories'):
+            st.dataframe(
+                [{'where': self.PROFILE_CATEGORIES.get(category, category), 'share of samples': f"{share:.0%}"} for category, share in profile['categories'].items()],
+                use_container_width=True,
+            )
+        if profile.get('top_functions'):
+            st.markdown("Functions with the most own time (cProfile of the kickoff thread)")
+            st.dataframe(profile['top_functions'], use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="📥 Collapsed stacks",
+                data=lambda: run_profiler.load_files(result_id)[0] or "",
+                file_name=f"profile_{result_id}.folded",
+                mime="text/plain",
+                key=f"download_folded_{result_id}",
+                help="Input for flamegraph.pl, speedscope or inferno",
+            )
+        with col2:
+            st.download_button(
+                label="📥 cProfile (pstats)",
+                data=lambda: run_profiler.load_files(result_id)[1] or b"",
+                file_name=f"profile_{result_id}.prof",
+                mime="application/octet-stream",
+                key=f"download_prof_{result_id}",
+                help="Open with python -m pstats or snakeviz",
+            )
+
+    def draw_stats(self, stats, result_id=None):
+        if not stats:
+            st.caption("No performance data was recorded for this run.")
+            return
+        summary = stats.get('summary', {})
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Wall time", f"{summary.get('duration_s') or 0:.1f} s")
+        col2.metric("LLM calls", summary.get('llm_calls', 0))
+        col3.metric("Tokens (prompt / completion)", f"{summary.get('prompt_tokens', 0)} / {summary.get('completion_tokens', 0)}")
+        col4.metric("Tool calls", summary.get('tool_calls', 0))
+        if stats.get('build_s') is not None:
+            st.caption(f"Crew build time before the run: {stats['build_s']:.1f} s")
+        if stats.get('plan'):
+            plan_source = "reused from the plan cache" if stats['plan']['source'] == 'cache' else f"{stats['plan']['source']} by the planning LLM"
+            st.caption(f"Plan: {plan_source}")
+        if stats.get('trace_id'):
+            st.caption(f"Trace id: `{stats['trace_id']}`")
+        if summary.get('cost_usd'):
+            st.caption(f"Estimated LLM cost: ${summary['cost_usd']:.4f}")
+        budget = stats.get('budget')
+        if budget and budget.get('exceeded'):
+            st.warning(f"Stopped by the run budget: {budget['exceeded']}")
+        elif budget and budget.get('limits'):
+            st.caption("Run budget: " + ", ".join(f"{key} {value}" for key, value in budget['limits'].items()))
+
+        if stats.get('profile') and result_id:
+            self.draw_profile(stats['profile'], result_id)
+
+        st.markdown("##### Per agent")
+        per_agent = summary.get('per_agent', {})
+        rows = [{'agent': agent, **totals} for agent, totals in per_agent.items()]
+        st.dataframe(sorted(rows, key=lambda r: r.get('task_time_s') or 0, reverse=True), use_container_width=True)
+
+        st.markdown("##### Per task")
+        st.dataframe(summary.get('per_task', []), use_container_width=True)
+
+        if stats.get('llm_calls'):
+            st.markdown("##### LLM calls")
+            st.dataframe(stats['llm_calls'], use_container_width=True)
+        if stats.get('tool_calls'):
+            st.markdown("##### Tool calls")
+            st.dataframe(stats['tool_calls'], use_container_width=True)
+
+    STATUS_LABELS = {
+        'running': '⏳ running',
+        'failed': '❌ failed',
+        'budget_exceeded': '💸 over budget',
+        'stopped': '⏹️ stopped',
+    }
+
+    def can_resume(self, result):
+        if result.status == 'completed' or (ss.get('running') and ss.get('run_result') is result):
+            return False
+        crew = next((c for c in ss.get('crews', []) if c.name == result.crew_name), None)
+        return crew is not None and crew.process == Process.sequential
+
+    PAGE_SIZES = [10, 20, 50, 100]
+
+    def input_summary(self, result):
+        input_items = list(result.inputs.items())
+        if len(input_items) == 0:
+            return ""
+        if len(input_items) == 1:
+            # For just one input, show more of its value
+            key, value = input_items[0]
+            return f" | {key}: {value[:30]}" + ("..." if len(value) > 30 else "")
+        # For multiple inputs, show brief summaries
+        max_chars = max(40 // len(input_items), 10)  # Adjust based on number of inputs
+        input_parts = []
+        for key, value in input_items:
+            if len(value) <= max_chars:
+                input_parts.append(f"{key}: {value}")
+            else:
+                input_parts.append(f"{key}: {value[:max_chars]}...")
+        return " | " + " | ".join(input_parts)
+
+    def result_title(self, result):
+        timestamp = datetime.fromisoformat(result.created_at).strftime('%Y-%m-%d %H:%M:%S')
+        title = f"{result.crew_name} - {timestamp}{self.input_summary(result)}"
+        if result.status in self.STATUS_LABELS:
+            title = f"[{self.STATUS_LABELS[result.status]}] {title}"
+        return title
+
+    def draw_pagination(self, total):
+        col1, col2, col3 = st.columns([1, 1, 2])
+        with col1:
+            page_size = st.selectbox("Results per page", self.PAGE_SIZES, index=1, key="results_page_size")
+        page_count = max((total + page_size - 1) // page_size, 1)
+        if ss.get('results_page_number', 1) > page_count:
+            ss.results_page_number = page_count
+        with col2:
+            page_number = st.number_input("Page", min_value=1, max_value=page_count, step=1, key="results_page_number")
+        offset = (page_number - 1) * page_size
+        with col3:
+            if total:
+                st.caption(f"Showing {offset + 1}–{min(offset + page_size, total)} of {total} results")
+            else:
+                st.caption("No results match")
+        return offset, page_size
+
     def draw(self):
         st.subheader(self.name)
 
-        # Load results if not present in session state
-        if 'results' not in ss:
+        # Load results if not present in session state, or again after the compactor archived some
+        if 'results' not in ss or ss.get('results_archive_generation') != result_archive.generation:
             ss.results = load_results()
+            ss.results_archive_generation = result_archive.generation
+
+        query = st.text_input(
+            "Search results",
+            key="results_search",
+            placeholder='Words or "a phrase" from the inputs and outputs of past runs',
+        ).strip()
 
         # Filters
         col1, col2 = st.columns(2)
         with col1:
             crew_filter = st.multiselect(
                 "Filter by Crew",
-                options=list(set(r.crew_name for r in ss.results)),
+                options=sorted(set(r.crew_name for r in ss.results)),
                 default=[],
                 key="crew_filter"
             )
@@ -32,173 +182,223 @@ class PageResults:
                 key="date_filter"
             )
 
-        # Apply filters
-        filtered_results = ss.results
-        if crew_filter:
-            filtered_results = [r for r in filtered_results if r.crew_name in crew_filter]
-        if date_filter:
-            filter_date = datetime.combine(date_filter, datetime.min.time())
-            filtered_results = [r for r in filtered_results if datetime.fromisoformat(r.created_at).date() == date_filter]
-
-        # Sort results by creation time (newest first)
-        filtered_results = sorted(
-            filtered_results,
-            key=lambda x: datetime.fromisoformat(x.created_at),
-            reverse=True
-        )
-
-        # Display results
-        for result in filtered_results:
-            # Format inputs for display in expander title
-            input_summary = ""
-            input_items = list(result.inputs.items())
-            
-            # Handle different numbers of input fields
-            if len(input_items) == 0:
-                input_summary = ""
-            elif len(input_items) == 1:
-                # For just one input, show more of its value
-                key, value = input_items[0]
-                input_summary = f" | {key}: {value[:30]}" + ("..." if len(value) > 30 else "")
-            else:
-                # For multiple inputs, show brief summaries
-                max_chars = max(40 // len(input_items), 10)  # Adjust based on number of inputs
-                input_parts = []
-                
-                for key, value in input_items:
-                    if len(value) <= max_chars:
-                        input_parts.append(f"{key}: {value}")
-                    else:
-                        input_parts.append(f"{key}: {value[:max_chars]}...")
-                
-                input_summary = " | " + " | ".join(input_parts)
-            
-            # Create the expander with enhanced title
-            timestamp = datetime.fromisoformat(result.created_at).strftime('%Y-%m-%d %H:%M:%S')
-            expander_title = f"{result.crew_name} - {timestamp}{input_summary}"
-            
-            with st.expander(expander_title, expanded=False):
-                st.markdown("#### Inputs")
-                for key, value in result.inputs.items():
-                    st.text_area(key, value, disabled=True, key=rnd_id())
-
-                st.markdown("#### Result")
-                formatted_result = format_result(result.result)
-
-                try:
-                    tasks_output = result.result.get('tasks_output', None)
-                    if tasks_output:
-                        tasks_output_str: list[str] = list(map(lambda t: t.get("raw", ""), tasks_output))
-                        tasks_descriptions = [t.get("description") for t in tasks_output]
-                        tasks_result = get_tasks_outputs_str(tasks_output_str, tasks_descriptions)
-                        formatted_tasks_result = format_result(tasks_result)
-                    else:
-                        formatted_tasks_result = ""
-                except Exception:
-                    formatted_tasks_result = ""
-
-                # Show both rendered and raw versions using tabs
-                tab1, tab2, tab3 = st.tabs(["Rendered", "Raw", "Rendered Complete"])
-                with tab1:
-                    st.markdown(formatted_result)
-                with tab2:
-                    st.code(formatted_result)
-                with tab3:
-                    st.markdown(formatted_tasks_result)
-
-                # Download buttons
-                st.markdown("#### Download Options")
-                col_json, col_md, col_txt = st.columns(3)
-
-                # Prepare download data
-                download_data = {
-                    "crew_name": result.crew_name,
-                    "created_at": result.created_at,
-                    "inputs": result.inputs,
-                    "result": result.result
-                }
-
-                with col_json:
-                    st.download_button(
-                        label="📥 JSON",
-                        data=json.dumps(download_data, indent=2),
-                        file_name=f"{result.crew_name}_{result.id}.json",
-                        mime="application/json",
-                        key=f"download_json_{result.id}"
-                    )
+        filters = (query, tuple(crew_filter), date_filter)
+        if ss.get('results_filters') != filters:
+            # New filters start again on the first page
+            ss.results_filters = filters
+            ss.results_page_number = 1
 
-                with col_md:
-                    st.download_button(
-                        label="📥 Markdown",
-                        data=formatted_result,
-                        file_name=f"{result.crew_name}_{result.id}.md",
-                        mime="text/markdown",
-                        key=f"download_md_{result.id}"
-                    )
+        snippets = {}
+        if query:
+            # Ranked by the full-text index, only the hits of the current page are loaded
+            offset, page_size = self.draw_pagination(count_search_results(query, crew_filter, date_filter))
+            hits = search_results(query, crew_filter, date_filter, limit=page_size, offset=offset)
+            snippets = {hit['result_id']: hit['snippet'] for hit in hits}
+            live_results = {result.id: result for result in load_results_by_ids([hit['result_id'] for hit in hits])}
+            # Hits that are not in the live table anymore were archived by a retention policy
+            archived = load_archived_results([hit['result_id'] for hit in hits if hit['result_id'] not in live_results])
+            page_results = [live_results.get(hit['result_id']) or archived.get(hit['result_id']) for hit in hits]
+            page_results = [result for result in page_results if result is not None]
+        else:
+            filtered_results = filter_results(ss.results, crew_filter, date_filter)
+            offset, page_size = self.draw_pagination(len(filtered_results))
+            page_results = filtered_results[offset:offset + page_size]
 
-                with col_txt:
-                    st.download_button(
-                        label="📥 Text",
-                        data=formatted_result,
-                        file_name=f"{result.crew_name}_{result.id}.txt",
-                        mime="text/plain",
-                        key=f"download_txt_{result.id}"
+        # Only the results of the current page are drawn, and only opened ones are rendered
+        for result in page_results:
+            if isinstance(result, dict):
+                self.draw_archived_result(result, snippets.get(result['result_id']))
+                continue
+            with st.container(border=True):
+                col_star, col_title, col_open = st.columns([1, 15, 2])
+                with col_star:
+                    st.button(
+                        "★" if result.starred else "☆",
+                        key=f"star_{result.id}",
+                        on_click=self.toggle_star,
+                        args=(result,),
+                        help="Starred runs are never archived by the crew's retention policy",
                     )
+                with col_title:
+                    st.markdown(f"**{self.result_title(result)}**")
+                    if snippets.get(result.id):
+                        st.caption(snippets[result.id].replace("\n", " "))
+                with col_open:
+                    opened = st.toggle("Open", key=f"open_{result.id}")
+                if opened:
+                    self.draw_result(result)
 
-                st.markdown("#### Actions")
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    if st.button("🔄 Re-run with inputs", key=f"rerun_{result.id}"):
-                        # Set the selected crew and populate placeholders
-                        ss.selected_crew_name = result.crew_name
-                        # Populate placeholders with the saved inputs
-                        for key, value in result.inputs.items():
-                            placeholder_key = f'placeholder_{key}'
-                            ss.placeholders[placeholder_key] = value
-                        # Navigate to the Kickoff! page
-                        ss.page = "Kickoff!"
-                        st.rerun()
-                with col2:
-                    if st.button("Delete", key=f"delete_{result.id}"):
-                        delete_result(result.id)
-                        ss.results.remove(result)
+    def toggle_star(self, result):
+        result.starred = not result.starred
+        set_result_starred(result.id, result.starred)
+        for r in ss.get('results', []):
+            if r.id == result.id:
+                r.starred = result.starred
+
+    def draw_archived_result(self, archived, snippet):
+        result_id = archived['result_id']
+        with st.container(border=True):
+            col_title, col_restore, col_delete = st.columns([12, 2, 2])
+            with col_title:
+                timestamp = datetime.fromisoformat(archived['created_at']).strftime('%Y-%m-%d %H:%M:%S') if archived['created_at'] else ""
+                st.markdown(f"**[🗄️ archived] {archived['crew_name']} - {timestamp}**")
+                if snippet:
+                    st.caption(snippet.replace("\n", " "))
+            with col_restore:
+                if st.button("Restore", key=f"restore_{result_id}", help=f"Load the run back from {archived['archive_file']}"):
+                    restored = result_archive.restore(result_id)
+                    if restored is None:
+                        st.error(f"Run {result_id} was not found in {archived['archive_file']}")
+                    else:
+                        ss.results = [r for r in ss.results if r.id != result_id] + [restored]
+                        ss[f"open_{result_id}"] = True
                         st.rerun()
-                with col3:
-                    # Create a button to open the printable view in a new tab
-                    html_content = generate_printable_view(
-                        result.crew_name,
-                        result.result,
-                        result.inputs,
-                        formatted_result,
-                        result.created_at
-                    )
-                    if st.button("Open Printable View", key=f"print_{result.id}"):
-                        js = f"""
-                        <script>
-                            var printWindow = window.open('', '_blank');
-                            printWindow.document.write({html_content!r});
-                            printWindow.document.close();
-                        </script>
-                        """
-                        st.components.v1.html(js, height=0)
-
-                    if formatted_tasks_result != "":
-                        # Create a button to open the printable view in a new tab
-                        html_tasks_content = generate_printable_view(
-                            result.crew_name,
-                            result.result,
-                            result.inputs,
-                            formatted_tasks_result,
-                            result.created_at
-                        )
-
-                        if st.button("Open Complete Printable View", key=f"print_full_{result.id}"):
-                            js = f"""
-                            <script>
-                                var printWindow = window.open('', '_blank');
-                                printWindow.document.write({html_tasks_content!r});
-                                printWindow.document.close();
-                            </script>
-                            """
-                            st.components.v1.html(js, height=0)
+            with col_delete:
+                if st.button("Delete", key=f"delete_archived_{result_id}", help="Remove the run from the search index; its copy stays in the archive file"):
+                    delete_result(result_id)
+                    st.rerun()
+
+    def draw_printable_view_button(self, label, key, result, formatted_result):
+        if st.button(label, key=key):
+            html_content = generate_printable_view(
+                result.crew_name,
+                result.result,
+                result.inputs,
+                formatted_result,
+                result.created_at
+            )
+            js = f"""
+            <script>
+                var printWindow = window.open('', '_blank');
+                printWindow.document.write({html_content!r});
+                printWindow.document.close();
+            </script>
+            """
+            st.components.v1.html(js, height=0)
+
+    def draw_result(self, result):
+        st.markdown("#### Inputs")
+        for key, value in result.inputs.items():
+            st.text_area(key, value, disabled=True, key=f"input_{result.id}_{key}")
+
+        st.markdown("#### Result")
+        formatted_result = format_result(result.result) if result.result is not None else ""
+
+        try:
+            tasks_output = result.result.get('tasks_output', None)
+        except Exception:
+            tasks_output = None
+        if not tasks_output and result.status != 'completed':
+            # Partial run: use the task outputs saved while it was running
+            tasks_output = load_task_outputs(result.id)
+            st.info(f"Run {result.status}: {len(tasks_output)} task output(s) saved so far.")
+            if tasks_output and not formatted_result:
+                formatted_result = tasks_output[-1].get("raw", "")
+        try:
+            if tasks_output:
+                tasks_output_str: list[str] = list(map(lambda t: t.get("raw", ""), tasks_output))
+                tasks_descriptions = [t.get("description") for t in tasks_output]
+                tasks_result = get_tasks_outputs_str(tasks_output_str, tasks_descriptions)
+                formatted_tasks_result = format_result(tasks_result)
+            else:
+                formatted_tasks_result = ""
+        except Exception:
+            formatted_tasks_result = ""
+
+        # Show both rendered and raw versions using tabs
+        tab1, tab2, tab3, tab4 = st.tabs(["Rendered", "Raw", "Rendered Complete", "Performance"])
+        with tab1:
+            st.markdown(formatted_result)
+        with tab2:
+            st.code(formatted_result)
+        with tab3:
+            st.markdown(formatted_tasks_result)
+        with tab4:
+            self.draw_stats(result.stats, result.id)
+
+        # Download buttons, their data is only built when a download is requested
+        st.markdown("#### Download Options")
+        col_json, col_md, col_txt = st.columns(3)
+
+        def download_json():
+            download_data = {
+                "crew_name": result.crew_name,
+                "created_at": result.created_at,
+                "inputs": result.inputs,
+                "result": result.result,
+                "stats": result.stats,
+                "status": result.status
+            }
+            if result.status != 'completed':
+                download_data["tasks_output"] = tasks_output
+            return json.dumps(download_data, indent=2)
+
+        with col_json:
+            st.download_button(
+                label="📥 JSON",
+                data=download_json,
+                file_name=f"{result.crew_name}_{result.id}.json",
+                mime="application/json",
+                key=f"download_json_{result.id}"
+            )
+
+        with col_md:
+            st.download_button(
+                label="📥 Markdown",
+                data=formatted_result,
+                file_name=f"{result.crew_name}_{result.id}.md",
+                mime="text/markdown",
+                key=f"download_md_{result.id}"
+            )
+
+        with col_txt:
+            st.download_button(
+                label="📥 Text",
+                data=formatted_result,
+                file_name=f"{result.crew_name}_{result.id}.txt",
+                mime="text/plain",
+                key=f"download_txt_{result.id}"
+            )
+
+        st.markdown("#### Actions")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("🔄 Re-run with inputs", key=f"rerun_{result.id}"):
+                # Set the selected crew and populate placeholders
+                ss.selected_crew_name = result.crew_name
+                # Populate placeholders with the saved inputs
+                for key, value in result.inputs.items():
+                    placeholder_key = f'placeholder_{key}'
+                    ss.placeholders[placeholder_key] = value
+                ss.resume_result_id = None
+                # Navigate to the Kickoff! page
+                ss.page = "Kickoff!"
+                st.rerun()
+            if self.can_resume(result) and st.button("▶️ Resume run", key=f"resume_{result.id}", help="Run only the tasks that did not finish, reusing the saved outputs of the others"):
+                ss.selected_crew_name = result.crew_name
+                for key, value in result.inputs.items():
+                    ss.placeholders[f'placeholder_{key}'] = value
+                ss.resume_result_id = result.id
+                ss.page = "Kickoff!"
+                st.rerun()
+        with col2:
+            if st.button("Delete", key=f"delete_{result.id}"):
+                delete_result(result.id)
+                ss.results = [r for r in ss.results if r.id != result.id]
+                st.rerun()
+        with col3:
+            # The HTML of the printable views is only generated when one is opened
+            self.draw_printable_view_button("Open Printable View", f"print_{result.id}", result, formatted_result)
+            if formatted_tasks_result != "":
+                self.draw_printable_view_button("Open Complete Printable View", f"print_full_{result.id}", result, formatted_tasks_result)
+
 
+def filter_results(results, crew_names=None, day=None):
+    """``results`` of the given crews and day, newest first."""
+    if crew_names:
+        results = [r for r in results if r.crew_name in crew_names]
+    if day:
+        # ISO timestamps start with the date and sort chronologically as strings
+        day_prefix = day.isoformat()
+        results = [r for r in results if r.created_at.startswith(day_prefix)]
+    return sorted(results, key=lambda r: r.created_at, reverse=True)
@@ -8,7 +8,8 @@ class PageTasks:
         self.name = "Tasks"
 
     def create_task(self, crew=None):
-        task = MyTask()   
+        # New tasks start out with the first agent
+        task = MyTask(agent=ss.agents[0] if ss.get('agents') else None)
         if 'tasks' not in ss:
             ss.tasks = [MyTask]
         ss.tasks.append(task)
@@ -3,6 +3,7 @@ from utils import rnd_id
 from my_tools import TOOL_CLASSES
 from streamlit import session_state as ss
 import db_utils
+import tool_cache
 
 class PageTools:
     def __init__(self):
@@ -31,6 +32,42 @@ class PageTools:
                 db_utils.save_tool(tool)
                 break
 
+    def set_tool_cache_ttl(self, tool):
+        tool.cache_ttl_s = int(ss[f"{tool.tool_id}_cache_ttl_s"])
+        db_utils.save_tool(tool)
+
+    def draw_tool_cache(self, tool, stats):
+        st.number_input(
+            "Cache results for (seconds)",
+            min_value=0,
+            step=3600,
+            value=tool.get_cache_ttl_s(),
+            key=f"{tool.tool_id}_cache_ttl_s",
+            on_change=self.set_tool_cache_ttl,
+            args=(tool,),
+            help="Results of identical calls are reused across runs for this long; 0 disables the cache for this tool.",
+        )
+        tool_stats = stats.get(tool.tool_id)
+        if tool_stats:
+            hit_rate = f"{tool_stats['hit_rate']:.0%}" if tool_stats['hit_rate'] is not None else "n/a"
+            st.caption(f"Cache: {tool_stats['entries']} entries, {tool_stats['bytes'] / 1024:.0f} KiB, hit rate {hit_rate} ({tool_stats['hits']} hits / {tool_stats['misses']} misses)")
+            if st.button("Clear cache", key=f"clear_cache_{tool.tool_id}"):
+                tool_cache.clear(tool.tool_id)
+                st.rerun()
+
+    def draw_cache_summary(self, stats):
+        totals = stats[None]
+        if not totals['hits'] + totals['misses'] + totals['entries']:
+            return
+        hit_rate = f"{totals['hit_rate']:.0%}" if totals['hit_rate'] is not None else "n/a"
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.caption(f"Tool cache: {totals['entries']} entries, {totals['bytes'] / 1024 / 1024:.1f} of {tool_cache.max_bytes() / 1024 / 1024:.0f} MiB, hit rate {hit_rate}")
+        with col2:
+            if st.button("Clear tool cache"):
+                tool_cache.clear()
+                st.rerun()
+
     def get_tool_display_name(self, tool):
         first_param_name = tool.get_parameter_names()[0] if tool.get_parameter_names() else None
         first_param_value = tool.parameters.get(first_param_name, '') if first_param_name else ''
@@ -49,6 +86,8 @@ class PageTools:
         with c2:
             if 'tools' in ss:
                 st.write("##### Enabled Tools")
+                cache_stats = tool_cache.get_stats()
+                self.draw_cache_summary(cache_stats)
                 for tool in ss.tools:
                     display_name = self.get_tool_display_name(tool)
                     is_complete = tool.is_valid()
@@ -61,6 +100,7 @@ class PageTools:
                             new_value = st.text_input(f"{param_name}", value=param_value, key=f"{tool.tool_id}_{param_name}", placeholder=placeholder)
                             if new_value != param_value:
                                 self.set_tool_parameter(tool.tool_id, param_name, new_value)
+                        self.draw_tool_cache(tool, cache_stats)
                         if st.button(f"Remove", key=f"remove_{tool.tool_id}"):
                             self.remove_tool(tool.tool_id)
 
@@ -0,0 +1,154 @@
+"""Reuse of the plans crewai generates for crews with planning enabled.
+
+With ``planning=True`` every kickoff first asks the planning LLM for a step by
+step plan per task and appends it to the task descriptions. For an unchanged
+crew that plan is almost always the same, so the plans are stored (as
+``plan`` entities) and reused by later runs instead of calling the LLM again.
+
+The cache key is the crew version (``crew_prebuild.crew_version``) plus,
+depending on ``MyCrew.plan_cache``:
+
+``inputs``
+    the placeholder values of the run, so only runs with the same inputs share a plan
+``template``
+    nothing else: the plan is stored with the input values replaced by their
+    ``{placeholder}`` and filled in with the inputs of the run that reuses it.
+    Only whole words are replaced, and a plan is not stored when an input
+    value also appears in the crew's own task and agent texts (e.g. "the"),
+    where it cannot be told apart from the input
+``off``
+    plans are not cached
+
+A run can refresh the cached plan, which generates and stores a new one.
+"""
+
+import hashlib
+import json
+import re
+from datetime import datetime
+
+import crew_prebuild
+import db_utils
+import instrumentation
+
+MODES = {
+    'inputs': "Per inputs",
+    'template': "Input-agnostic template",
+    'off': "Off",
+}
+
+
+def plan_key(crew, inputs, placeholders):
+    data = {
+        'version': crew_prebuild.crew_version(crew),
+        'mode': crew.plan_cache,
+    }
+    if crew.plan_cache == 'inputs':
+        data['inputs'] = {key: str(value) for key, value in sorted((inputs or {}).items()) if key in placeholders}
+    encoded = json.dumps(data, sort_keys=True)
+    return 'P_' + hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:24]
+
+
+def _word_pattern(value):
+    return r'(?<!\w)' + re.escape(value) + r'(?!\w)'
+
+
+def _instructions(crewai_crew):
+    """The task and agent texts of ``crewai_crew`` as written, without their placeholders."""
+    texts = []
+    for task in crewai_crew.tasks:
+        texts += [task._original_description or task.description, task._original_expected_output or task.expected_output]
+    for agent in crewai_crew.agents:
+        texts += [agent._original_role or agent.role, agent._original_goal or agent.goal, agent._original_backstory or agent.backstory]
+    return re.sub(r'\{\w+\}', ' ', "\n".join(text or '' for text in texts))
+
+
+def _to_template(text, inputs, placeholders, instructions=''):
+    """``text`` with the input values replaced by their placeholders, or None when a value is ambiguous."""
+    keys_by_value = {}
+    for key, value in inputs.items():
+        value = str(value).strip()
+        if key in placeholders and value and re.search(_word_pattern(value), text):
+            keys_by_value.setdefault(value, []).append(key)
+    if not keys_by_value:
+        return text
+    for value, keys in keys_by_value.items():
+        # The value may stand for the crew's own words, or for more than one input
+        if len(keys) > 1 or re.search(_word_pattern(value), instructions):
+            return None
+    # One pass, longest values first, so a value that contains another one is replaced as a whole
+    values = sorted(keys_by_value, key=len, reverse=True)
+    pattern = re.compile('|'.join(_word_pattern(value) for value in values))
+    return pattern.sub(lambda match: '{' + keys_by_value[match.group(0)][0] + '}', text)
+
+
+def _from_template(text, inputs, placeholders):
+    for key, value in inputs.items():
+        if key in placeholders:
+            text = text.replace('{' + key + '}', str(value))
+    return text
+
+
+def lookup(crew, inputs, placeholders):
+    """The cached plan entry for a run of ``crew`` with ``inputs``, or None."""
+    if not crew.planning or crew.plan_cache == 'off':
+        return None
+    entry = db_utils.load_plan(plan_key(crew, inputs, placeholders))
+    if entry is None or len(entry['plans']) != len(crew.tasks):
+        return None
+    if crew.plan_cache == 'template':
+        entry['plans'] = [_from_template(plan, inputs or {}, placeholders) for plan in entry['plans']]
+    return entry
+
+
+def attach(crewai_crew, crew, placeholders, refresh=False):
+    """Make ``crewai_crew`` reuse the cached plan of ``crew`` when it plans, and cache new plans.
+
+    The inputs are read at planning time, so a crew reused for several runs (batch rows) gets the
+    plan of each run's inputs.
+    """
+    if not crew.planning or crew.plan_cache == 'off':
+        return
+    original_planning = crewai_crew._handle_crew_planning
+
+    def handle_crew_planning():
+        inputs = crewai_crew._inputs or {}
+        key = plan_key(crew, inputs, placeholders)
+        entry = None if refresh else lookup(crew, inputs, placeholders)
+        if entry is not None and len(entry['plans']) == len(crewai_crew.tasks):
+            for task, plan in zip(crewai_crew.tasks, entry['plans']):
+                task.description += plan
+            _report({'source': 'cache', 'key': key, 'mode': crew.plan_cache, 'created_at': entry['created_at']})
+            return
+
+        descriptions = [task.description for task in crewai_crew.tasks]
+        original_planning()
+        # crewai appends the plan of each task to its description
+        plans = [task.description[len(before):] for task, before in zip(crewai_crew.tasks, descriptions)]
+        source = 'refreshed' if refresh else 'generated'
+        created_at = datetime.now().isoformat()
+        if crew.plan_cache == 'template':
+            instructions = _instructions(crewai_crew)
+            stored_plans = [_to_template(plan, inputs, placeholders, instructions) for plan in plans]
+            if None in stored_plans:
+                _report({'source': source, 'key': key, 'mode': crew.plan_cache, 'created_at': created_at, 'stored': False})
+                return
+        else:
+            stored_plans = plans
+        db_utils.save_plan(key, {
+            'crew_id': crew.id,
+            'crew_name': crew.name,
+            'mode': crew.plan_cache,
+            'plans': stored_plans,
+            'created_at': created_at,
+        })
+        _report({'source': source, 'key': key, 'mode': crew.plan_cache, 'created_at': created_at})
+
+    # Crews are pydantic models; bypass their attribute validation like for a private attribute
+    object.__setattr__(crewai_crew, '_handle_crew_planning', handle_crew_planning)
+
+
+def _report(plan_info):
+    run_stats = instrumentation.find_run_stats()
+    if run_stats is not None:
+        run_stats.plan = plan_info
@@ -0,0 +1,191 @@
+"""Process-wide token-bucket rate limiting for LLM providers.
+
+Limits are configured with the ``LLM_RATE_LIMITS`` environment variable, a JSON
+object keyed by ``"Provider"`` or ``"Provider: model"`` (the same strings used by
+``llms.create_llm``)::
+
+    LLM_RATE_LIMITS='{"OpenAI": {"rpm": 500, "tpm": 200000}, "Anthropic: claude-sonnet-4-20250514": {"rpm": 50}}'
+
+A ``"Provider: model"`` entry wins over a plain ``"Provider"`` entry. Buckets live
+in this process and are therefore shared by every agent, crew and Streamlit
+session served by it. Set ``LLM_RATE_LIMIT_BACKEND=db`` to coordinate the
+buckets through the database instead, so several Studio processes pointing at
+the same ``DB_URL`` share one budget.
+"""
+
+import json
+import os
+import threading
+import time
+
+import db_utils
+
+_buckets = {}
+_stats = {}
+# (raw LLM_RATE_LIMITS value, parsed config), parsed again only when the value changes
+_parsed_config = (None, {})
+_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Reservation based token bucket.
+
+    ``reserve`` always succeeds and returns how long the caller has to wait
+    before its reservation is covered, so concurrent callers are served in the
+    order they arrived instead of racing on retries.
+    """
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount):
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+    def adjust(self, amount):
+        """Give back (negative amount) or take (positive amount) tokens after the fact."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class LimiterStats:
+    def __init__(self):
+        self.requests = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.latency_total = 0.0
+        self.tokens = 0
+
+    def as_dict(self):
+        completed = max(self.requests - self.waiting - self.in_flight, 1)
+        return {
+            'requests': self.requests,
+            'waiting': self.waiting,
+            'in_flight': self.in_flight,
+            'avg_wait_s': round(self.wait_total / max(self.requests, 1), 3),
+            'max_wait_s': round(self.wait_max, 3),
+            'avg_latency_s': round(self.latency_total / completed, 3),
+            'tokens': self.tokens,
+        }
+
+
+def get_limits_config():
+    global _parsed_config
+    raw = os.getenv('LLM_RATE_LIMITS')
+    if not raw:
+        return {}
+    with _lock:
+        parsed_raw, config = _parsed_config
+        if raw == parsed_raw:
+            return config
+        try:
+            config = json.loads(raw)
+        except json.JSONDecodeError as e:
+            # Printed once per value, not on every LLM call
+            print(f"Invalid LLM_RATE_LIMITS value, rate limiting disabled: {str(e)}")
+            config = {}
+        if not isinstance(config, dict):
+            config = {}
+        _parsed_config = (raw, config)
+        return config
+
+
+def get_limits(provider_and_model):
+    """Return (rpm, tpm) for a ``Provider: model`` string; None means unlimited."""
+    config = get_limits_config()
+    provider = provider_and_model.split(": ", 1)[0]
+    limits = config.get(provider_and_model) or config.get(provider) or {}
+    return limits.get('rpm'), limits.get('tpm')
+
+
+def use_db_backend():
+    return str(os.getenv('LLM_RATE_LIMIT_BACKEND', '')).lower() == 'db'
+
+
+def _get_bucket(key, capacity):
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None or bucket.capacity != float(capacity):
+            bucket = TokenBucket(capacity, float(capacity) / 60.0)
+            _buckets[key] = bucket
+        return bucket
+
+
+def _get_stats(provider_and_model):
+    with _lock:
+        if provider_and_model not in _stats:
+            _stats[provider_and_model] = LimiterStats()
+        return _stats[provider_and_model]
+
+
+def _reserve(key, capacity, amount):
+    if use_db_backend():
+        return db_utils.reserve_rate_limit_tokens(key, capacity, float(capacity) / 60.0, min(amount, capacity))
+    return _get_bucket(key, capacity).reserve(amount)
+
+
+def acquire(provider_and_model, estimated_tokens=0):
+    """Block until a request for ``provider_and_model`` may be sent.
+
+    Returns the number of seconds spent waiting in the queue.
+    """
+    stats = _get_stats(provider_and_model)
+    rpm, tpm = get_limits(provider_and_model)
+    wait = 0.0
+    if rpm:
+        wait = max(wait, _reserve(f"rpm:{provider_and_model}", rpm, 1))
+    if tpm and estimated_tokens:
+        wait = max(wait, _reserve(f"tpm:{provider_and_model}", tpm, estimated_tokens))
+
+    with _lock:
+        stats.requests += 1
+        stats.waiting += 1
+        stats.wait_total += wait
+        stats.wait_max = max(stats.wait_max, wait)
+    try:
+        if wait > 0:
+            time.sleep(wait)
+    finally:
+        with _lock:
+            stats.waiting -= 1
+            stats.in_flight += 1
+    return wait
+
+
+def release(provider_and_model, estimated_tokens=0, actual_tokens=None, latency=0.0):
+    """Account for a finished request and correct the token estimate."""
+    stats = _get_stats(provider_and_model)
+    _, tpm = get_limits(provider_and_model)
+    tokens = actual_tokens if actual_tokens is not None else estimated_tokens
+    if tpm and actual_tokens is not None and actual_tokens != estimated_tokens:
+        delta = actual_tokens - estimated_tokens
+        if use_db_backend():
+            db_utils.adjust_rate_limit_tokens(f"tpm:{provider_and_model}", tpm, float(tpm) / 60.0, delta)
+        else:
+            _get_bucket(f"tpm:{provider_and_model}", tpm).adjust(delta)
+    with _lock:
+        stats.in_flight = max(stats.in_flight - 1, 0)
+        stats.latency_total += latency
+        stats.tokens += tokens or 0
+
+
+def get_stats():
+    with _lock:
+        return {key: stats.as_dict() for key, stats in _stats.items()}
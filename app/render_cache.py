@@ -0,0 +1,148 @@
+"""Cache of rendered result Markdown.
+
+``utils.generate_printable_view`` normalizes the list indentation of a result's
+Markdown and converts it to HTML with the ``extra`` extension. Reports can be
+several hundred KB and the Kickoff page renders its printable views on every
+rerun, so both steps are cached, keyed by a hash of the Markdown:
+
+* in process, the least recently used entries are dropped beyond
+  ``RENDER_CACHE_MAX_MB`` (default 64)
+* with ``RENDER_CACHE_PERSIST=true`` entries are also stored in the
+  ``render_cache`` table, so restarts and other Studio processes reuse them;
+  that table is kept under ``RENDER_CACHE_PERSIST_MAX_MB`` (default 256) the
+  same way
+
+``RENDER_VERSION`` is part of the key; change it when the rendering changes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+RENDER_VERSION = 1
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'bytes': 0}
+_evict_lock = threading.Lock()
+
+
+def _megabytes(name, default):
+    try:
+        return int(float(os.getenv(name, str(default))) * 1024 * 1024)
+    except ValueError:
+        return default * 1024 * 1024
+
+
+def max_bytes():
+    return _megabytes('RENDER_CACHE_MAX_MB', 64)
+
+
+def persist_max_bytes():
+    return _megabytes('RENDER_CACHE_PERSIST_MAX_MB', 256)
+
+
+def persist_enabled():
+    return str(os.getenv('RENDER_CACHE_PERSIST')).lower() in ['true', '1']
+
+
+def content_key(text):
+    return hashlib.sha256(f"{RENDER_VERSION}\0{text}".encode('utf-8')).hexdigest()
+
+
+def _size(value):
+    return sum(len(part) for part in value.values())
+
+
+def _remember(key, value):
+    size = _size(value)
+    limit = max_bytes()
+    if size > limit // 4:
+        return
+    with _lock:
+        if key in _entries:
+            return
+        _entries[key] = value
+        _stats['bytes'] += size
+        while _stats['bytes'] > limit and _entries:
+            _, evicted = _entries.popitem(last=False)
+            _stats['bytes'] -= _size(evicted)
+
+
+def _load_persisted(key):
+    import db_utils
+    data = db_utils.get_render_cache_entry(key, time.time())
+    return json.loads(data) if data is not None else None
+
+
+def _persist(key, value):
+    import db_utils
+    data = json.dumps(value)
+    size = len(data.encode('utf-8'))
+    limit = persist_max_bytes()
+    if size > limit // 10:
+        return
+    now = time.time()
+    db_utils.save_render_cache_entry(key, data, size, now)
+    with _evict_lock:
+        db_utils.evict_render_cache(limit)
+
+
+def get_or_render(text, render):
+    """``render(text)`` (a dict of strings), cached by the content of ``text``."""
+    key = content_key(text)
+    with _lock:
+        value = _entries.get(key)
+        if value is not None:
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return value
+    value = None
+    if persist_enabled():
+        try:
+            value = _load_persisted(key)
+        except Exception as e:
+            print(f"Render cache lookup failed: {str(e)}")
+    if value is not None:
+        with _lock:
+            _stats['hits'] += 1
+    else:
+        with _lock:
+            _stats['misses'] += 1
+        value = render(text)
+        if persist_enabled():
+            try:
+                _persist(key, value)
+            except Exception as e:
+                print(f"Render cache write failed: {str(e)}")
+    _remember(key, value)
+    return value
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _stats['bytes'] = 0
+
+
+def get_stats():
+    with _lock:
+        return {**_stats, 'entries': len(_entries)}
+
+
+def _cache_metrics():
+    stats = get_stats()
+    return [
+        metrics.snapshot('studio_render_cache_hits_total', 'counter', "Rendered Markdown reused from the render cache", (), {(): stats['hits']}),
+        metrics.snapshot('studio_render_cache_misses_total', 'counter', "Markdown rendered because it was not cached", (), {(): stats['misses']}),
+        metrics.snapshot('studio_render_cache_entries', 'gauge', "Entries in the in-process render cache", (), {(): stats['entries']}),
+        metrics.snapshot('studio_render_cache_bytes', 'gauge', "Characters held by the in-process render cache", (), {(): stats['bytes']}),
+    ]
+
+
+metrics.register_collector(_cache_metrics)
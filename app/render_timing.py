@@ -0,0 +1,112 @@
+"""Timing of the phases of a Streamlit rerun.
+
+Every rerun runs ``app.main`` from the top: database setup, ``load_data``, the
+sidebar, ``PageCrewRun.maintain_session_state`` and the page's ``draw``. A
+``RenderTimer`` measures each phase and counts the ``db_utils`` calls it makes,
+so a new per-rerun query shows up as soon as it is added:
+
+* the timings go to the ``studio_page_phase_seconds`` and
+  ``studio_page_db_queries`` metrics (see ``metrics``)
+* ``RENDER_TIMING_LOG_MS`` prints every rerun slower than that many
+  milliseconds (0 for all of them) to the console
+* the "Render timings" panel at the bottom of the sidebar shows the last
+  reruns of the session; it is hidden unless ``RENDER_DEBUG`` is true or the
+  page is opened with ``?debug=render``
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+from streamlit import session_state as ss
+
+import metrics
+
+HISTORY_SIZE = 20
+
+
+def log_threshold_ms():
+    value = os.getenv('RENDER_TIMING_LOG_MS')
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def debug_enabled():
+    if str(os.getenv('RENDER_DEBUG')).lower() in ['true', '1']:
+        return True
+    return st.query_params.get('debug') == 'render'
+
+
+class RenderTimer:
+    def __init__(self, page=None):
+        self.page = page
+        self.phases = []
+        self.started = time.perf_counter()
+        self.total_s = None
+        self.db_calls = 0
+        self._db_calls_at_start = metrics.thread_calls(metrics.DB_QUERY_SECONDS)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        db_calls = metrics.thread_calls(metrics.DB_QUERY_SECONDS)
+        try:
+            yield
+        finally:
+            self.phases.append({
+                'phase': name,
+                'ms': round((time.perf_counter() - started) * 1000, 1),
+                'db_calls': metrics.thread_calls(metrics.DB_QUERY_SECONDS) - db_calls,
+            })
+
+    def finish(self, page=None):
+        """Record the rerun, which also ends when it is cut short by st.rerun() or st.stop()."""
+        if self.page is None:
+            # First rerun of the session, the page is chosen by the sidebar
+            self.page = page
+        self.total_s = time.perf_counter() - self.started
+        self.db_calls = metrics.thread_calls(metrics.DB_QUERY_SECONDS) - self._db_calls_at_start
+        metrics.PAGE_RENDER_SECONDS.observe(self.total_s, page=self.page)
+        metrics.PAGE_DB_QUERIES.observe(self.db_calls, page=self.page)
+        for phase in self.phases:
+            metrics.PAGE_PHASE_SECONDS.observe(phase['ms'] / 1000, page=self.page, phase=phase['phase'])
+        threshold = log_threshold_ms()
+        if threshold is not None and self.total_s * 1000 >= threshold:
+            print(f"Rerun of {self.page}: {self.summary()}")
+
+    def summary(self):
+        phases = ", ".join(f"{p['phase']} {p['ms']:.0f} ms/{p['db_calls']} db" for p in self.phases)
+        return f"{(self.total_s or 0) * 1000:.0f} ms, {self.db_calls} db calls ({phases})"
+
+    def as_dict(self):
+        return {
+            'page': self.page,
+            'total_ms': round((self.total_s or 0) * 1000, 1),
+            'db_calls': self.db_calls,
+            **{f"{p['phase']}_ms": p['ms'] for p in self.phases},
+        }
+
+
+def remember(timer):
+    """Keep ``timer`` in the session's rerun history shown by the debug panel."""
+    history = ss.setdefault('render_timings', [])
+    history.append(timer.as_dict())
+    del history[:-HISTORY_SIZE]
+
+
+def draw_debug_panel():
+    if not debug_enabled():
+        return
+    history = ss.get('render_timings', [])
+    with st.sidebar.expander("Render timings", expanded=False):
+        if not history:
+            st.caption("Timings appear after the first complete rerun.")
+            return
+        last = history[-1]
+        st.caption(f"Last rerun of {last['page']}: {last['total_ms']:.0f} ms, {last['db_calls']} db calls")
+        st.dataframe(list(reversed(history)), use_container_width=True, hide_index=True)
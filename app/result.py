@@ -8,10 +8,16 @@ class Result:
                  crew_name: str,
                  inputs: Dict[str, str],
                  result: Any,
-                 created_at: Optional[str] = None):
+                 created_at: Optional[str] = None,
+                 stats: Optional[Dict[str, Any]] = None,
+                 status: str = 'completed',
+                 starred: bool = False):
         self.id = id
         self.crew_id = crew_id
         self.crew_name = crew_name
         self.inputs = inputs
         self.result = result
-        self.created_at = created_at or datetime.now().isoformat()
\ No newline at end of file
+        self.created_at = created_at or datetime.now().isoformat()
+        self.stats = stats
+        self.status = status
+        self.starred = starred
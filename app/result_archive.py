@@ -0,0 +1,310 @@
+"""Retention of results and their compressed archive.
+
+Every crew has a retention policy (``MyCrew.retention_mode`` and
+``MyCrew.retention_value``):
+
+``all``
+    every run stays in the live table
+``last``
+    only the newest ``retention_value`` runs of the crew stay
+``days``
+    runs stay for ``retention_value`` days
+``starred``
+    only starred runs stay
+
+Starred runs and running runs are always kept, and so is every run for the
+first ``RESULTS_ARCHIVE_GRACE_H`` hours (default 24) after it was created or
+restored, so a new run can still be starred. Results are matched to crews by
+crew name.
+
+A background compactor (``start_compactor``, every ``RESULTS_COMPACT_INTERVAL_S``
+seconds, default 3600, 0 turns it off) moves the runs a policy no longer keeps
+into monthly archive files in ``RESULTS_ARCHIVE_DIR`` (default
+``results_archive``): ``results-YYYY-MM.ndjson.zst`` when ``zstandard`` is
+installed, ``results-YYYY-MM.ndjson.gz`` otherwise. Each line holds a result
+with its task outputs and profile, and every compaction appends one compressed
+frame (gzip member) to the file of the month the results were created in.
+
+The live table only keeps an ``archived_results`` row per archived run. The
+full-text index (see ``db_utils.search_results``) keeps its entry, so archived
+runs are still found by the Results page search, which can restore them.
+``restore`` reads the last copy of the run from its archive file and saves it
+back. From the ``app`` directory::
+
+    python -m result_archive compact [--dry-run]
+    python -m result_archive restore R_abc123
+    python -m result_archive list
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import db_utils
+import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MODES = {
+    'all': "Keep all runs",
+    'last': "Keep the last N runs",
+    'days': "Keep runs for N days",
+    'starred': "Keep only starred runs",
+}
+
+_compact_lock = threading.Lock()
+_compactor_lock = threading.Lock()
+_compactor_started = False
+# Incremented whenever results leave the live table, so sessions know to reload their results
+generation = 0
+
+
+def archive_dir():
+    return os.getenv('RESULTS_ARCHIVE_DIR', 'results_archive')
+
+
+def grace_hours():
+    try:
+        return max(float(os.getenv('RESULTS_ARCHIVE_GRACE_H', '24')), 0.0)
+    except ValueError:
+        return 24.0
+
+
+def compact_interval_s():
+    try:
+        return float(os.getenv('RESULTS_COMPACT_INTERVAL_S', '3600'))
+    except ValueError:
+        return 3600.0
+
+
+def describe(mode, value):
+    if mode == 'last':
+        return f"keep the last {value} runs"
+    if mode == 'days':
+        return f"keep runs for {value} days"
+    if mode == 'starred':
+        return "keep only starred runs"
+    return "keep all runs"
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _kept_anyway(data, now):
+    if data.get('starred') or data.get('status') == 'running':
+        return True
+    grace = timedelta(hours=grace_hours())
+    for value in (data.get('created_at'), data.get('restored_at')):
+        moment = _parse_time(value)
+        if moment is not None and now - moment < grace:
+            return True
+    # Results without a readable timestamp are never archived
+    return _parse_time(data.get('created_at')) is None
+
+
+def select_expired(crew, rows, now=None):
+    """The ids of the stored results ``rows`` ((id, data) of one crew) that the crew's policy no longer keeps."""
+    now = now or datetime.now()
+    mode, value = crew.retention_mode, crew.retention_value
+    if mode not in ('last', 'days', 'starred'):
+        return []
+    rows = sorted(rows, key=lambda row: row[1].get('created_at') or '', reverse=True)
+    expired = []
+    for position, (result_id, data) in enumerate(rows):
+        if _kept_anyway(data, now):
+            continue
+        if mode == 'last' and position < value:
+            continue
+        if mode == 'days' and now - _parse_time(data['created_at']) < timedelta(days=value):
+            continue
+        expired.append(result_id)
+    return expired
+
+
+def archive_file_name(created_at):
+    month = (_parse_time(created_at) or datetime.now()).strftime('%Y-%m')
+    extension = 'zst' if zstandard is not None else 'gz'
+    return f"results-{month}.ndjson.{extension}"
+
+
+def _compress(payload, file_name):
+    if file_name.endswith('.zst'):
+        return zstandard.ZstdCompressor(level=10).compress(payload)
+    return gzip.compress(payload, compresslevel=6)
+
+
+def _open_lines(path):
+    """The text lines of an archive file, across all of its frames (gzip members)."""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"Reading {path} needs the zstandard package")
+        raw = open(path, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return gzip.open(path, 'rt', encoding='utf-8')
+
+
+def _append(file_name, records):
+    os.makedirs(archive_dir(), exist_ok=True)
+    payload = "".join(json.dumps(record) + "\n" for record in records).encode('utf-8')
+    # One write per compaction: a frame is appended whole even when another process appends to the same file
+    with open(os.path.join(archive_dir(), file_name), 'ab') as f:
+        f.write(_compress(payload, file_name))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def archive_results(result_ids):
+    """Move the results ``result_ids`` to the archive files; the number of results archived."""
+    global generation
+    by_file = {}
+    for result_id in result_ids:
+        data = db_utils.load_result_data(result_id)
+        if data is None or data.get('status') == 'running':
+            continue
+        record = {
+            'id': result_id,
+            'data': data,
+            'task_outputs': db_utils.load_task_outputs(result_id),
+            'profile': db_utils.load_profile(result_id),
+            'archived_at': datetime.now().isoformat(),
+        }
+        by_file.setdefault(archive_file_name(data.get('created_at')), []).append(record)
+    archived = 0
+    for file_name, records in by_file.items():
+        # The results are only deleted once the file holding them is on disk
+        _append(file_name, records)
+        for record in records:
+            data = record['data']
+            db_utils.save_archived_result(record['id'], data.get('crew_name'), data.get('created_at'), file_name, time.time())
+            db_utils.delete_result(record['id'], archived=True)
+            metrics.RESULTS_ARCHIVED.inc(crew=data.get('crew_name') or '')
+            archived += 1
+    if archived:
+        generation += 1
+    return archived
+
+
+def compact(dry_run=False):
+    """Apply the retention policies of all crews; {crew name: ids of the results archived (or to archive)}."""
+    with _compact_lock:
+        crews = {crew.name: crew for crew in db_utils.load_crews() if crew.retention_mode != 'all'}
+        if not crews:
+            return {}
+        rows_by_crew = {}
+        for result_id, data in db_utils.load_entities('result'):
+            if data.get('crew_name') in crews:
+                rows_by_crew.setdefault(data['crew_name'], []).append((result_id, data))
+        expired = {}
+        for crew_name, rows in rows_by_crew.items():
+            result_ids = select_expired(crews[crew_name], rows)
+            if result_ids:
+                expired[crew_name] = result_ids
+        if not dry_run:
+            for result_ids in expired.values():
+                archive_results(result_ids)
+        return expired
+
+
+def read_archived(result_id):
+    """The last archived copy of a result: a dict with its data, task outputs and profile, or None."""
+    row = db_utils.load_archived_results([result_id]).get(result_id)
+    if row is None:
+        return None
+    path = os.path.join(archive_dir(), row['archive_file'])
+    if not os.path.exists(path):
+        return None
+    found = None
+    needle = json.dumps(result_id)
+    with _open_lines(path) as lines:
+        for line in lines:
+            # Only parse the lines that can be the result
+            if needle in line[:len(needle) + 16]:
+                record = json.loads(line)
+                if record.get('id') == result_id:
+                    found = record
+    return found
+
+
+def restore(result_id):
+    """Save an archived result back to the live table; the restored ``Result``, or None."""
+    record = read_archived(result_id)
+    if record is None:
+        return None
+    data = dict(record['data'])
+    # Counts as new for the grace period, otherwise the next compaction archives it again
+    data['restored_at'] = datetime.now().isoformat()
+    db_utils.save_entity('result', result_id, data)
+    db_utils.index_result(result_id, data)
+    for task_output in record.get('task_outputs') or []:
+        task_output = dict(task_output)
+        db_utils.save_task_output(result_id, task_output.pop('index'), task_output)
+    if record.get('profile') is not None:
+        db_utils.save_profile(result_id, record['profile'])
+    db_utils.delete_archived_result(result_id)
+    return db_utils.load_result(result_id)
+
+
+def _compact_periodically(interval_s):
+    while True:
+        try:
+            archived = compact()
+            if archived:
+                print(f"Archived {sum(len(ids) for ids in archived.values())} result(s) of {', '.join(archived)}")
+        except Exception as e:
+            print(f"Result compaction failed: {str(e)}")
+        time.sleep(interval_s)
+
+
+def start_compactor():
+    """Start the background compactor, once per process."""
+    global _compactor_started
+    interval_s = compact_interval_s()
+    with _compactor_lock:
+        if _compactor_started or interval_s <= 0:
+            return
+        _compactor_started = True
+    threading.Thread(target=_compact_periodically, args=(max(interval_s, 60.0),), name="result-compactor", daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m result_archive', description="Archive and restore stored results.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    compact_parser = subparsers.add_parser('compact', help="Archive the results the crews' retention policies no longer keep")
+    compact_parser.add_argument('--dry-run', action='store_true', help="Only list the results that would be archived")
+    restore_parser = subparsers.add_parser('restore', help="Restore an archived result")
+    restore_parser.add_argument('result_id')
+    subparsers.add_parser('list', help="List the archived results")
+    args = parser.parse_args(argv)
+
+    db_utils.initialize_db()
+    if args.command == 'compact':
+        expired = compact(dry_run=args.dry_run)
+        print(json.dumps(expired, indent=2))
+    elif args.command == 'restore':
+        result = restore(args.result_id)
+        if result is None:
+            print(f"No archived result with id '{args.result_id}'", file=sys.stderr)
+            return 2
+        print(f"Restored {result.id} ({result.crew_name}, {result.created_at})")
+    else:
+        rows = sorted(db_utils.load_archived_results().values(), key=lambda row: row['created_at'] or '', reverse=True)
+        print(json.dumps(rows, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Optional profiling of a crew run.
+
+A profiled run records two things while the crew is kicked off:
+
+* a cProfile of the thread that runs the kickoff, saved in pstats format
+  (open it with ``python -m pstats`` or snakeviz)
+* stack samples of that thread and of every thread started during the run
+  (crewai runs async tasks and the DAG scheduler in threads of their own),
+  taken every ``PROFILE_INTERVAL_MS`` (default 5) and saved as collapsed
+  stacks, the input format of flamegraph.pl, speedscope and inferno
+
+Each sample is also put in a category by the innermost frame that identifies
+it: ``llm`` (waiting for or parsing LLM calls), ``tool``, ``html`` (HTML and
+Markdown parsing), ``db``, ``waiting`` (threads blocked on locks, queues or
+other threads) or ``other`` (crewai and Studio overhead). The category shares and the slowest functions are added to the run's
+stats; the files are stored with the Result (``db_utils.save_profile``) and
+downloadable from the Results page.
+
+Threads other runs start at the same time are sampled as well, so profile
+runs while the Studio is otherwise idle.
+"""
+
+import base64
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+import db_utils
+
+# (category, substrings of a frame's file path), checked from the innermost frame outwards
+CATEGORIES = [
+    ('html', ('/bs4/', '/html/parser.py', '/markdown/', '/lxml/')),
+    ('db', ('/sqlalchemy/', '/sqlite3/', '/psycopg', 'db_utils.py')),
+    ('llm', ('/litellm/', '/openai/', '/anthropic/', '/langchain_', 'llm_wrapper.py', 'rate_limiter.py')),
+    ('tool', ('/crewai_tools/', '/crewai/tools/', '/app/tools/', 'my_tools.py', 'tool_cache.py')),
+]
+
+# Innermost files of a thread that is blocked waiting for work or for other threads
+WAIT_FILES = ('threading.py', 'queue.py', 'selectors.py', 'socketserver.py', 'concurrent/futures/_base.py')
+
+TOP_FUNCTIONS = 15
+
+
+def interval_s():
+    try:
+        return max(float(os.getenv('PROFILE_INTERVAL_MS', '5')), 1.0) / 1000
+    except ValueError:
+        return 0.005
+
+
+def _frame_label(filename, name, line):
+    path = filename.replace('\\', '/')
+    if 'site-packages/' in path:
+        path = path.split('site-packages/', 1)[1]
+    else:
+        path = os.path.basename(path)
+    return f"{name} ({path}:{line})"
+
+
+def categorize(codes):
+    """Category of a stack given as code objects, innermost first."""
+    for code in codes:
+        path = code.co_filename.replace('\\', '/')
+        for category, patterns in CATEGORIES:
+            if any(pattern in path for pattern in patterns):
+                return category
+    if codes and codes[0].co_filename.replace('\\', '/').endswith(WAIT_FILES):
+        return 'waiting'
+    return 'other'
+
+
+class RunProfiler:
+    def __init__(self, result_id=None, run_stats=None):
+        self.result_id = result_id
+        self.run_stats = run_stats
+        self.interval_s = interval_s()
+        self.stacks = Counter()
+        self.categories = Counter()
+        self.samples = 0
+        self.duration_s = None
+        self._profile = cProfile.Profile()
+        self._profiling = False
+        self._stop = threading.Event()
+        self._threads = {}
+        self._known_idents = set()
+
+    def _sample(self, target_ident):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own_ident or (ident != target_ident and ident in self._known_idents):
+                    continue
+                if ident not in self._threads:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    self._threads[ident] = names.get(ident, f"thread-{ident}")
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                self.stacks[(self._threads[ident],) + tuple(_frame_label(code.co_filename, code.co_name, code.co_firstlineno) for code in reversed(codes))] += 1
+                self.categories[categorize(codes)] += 1
+                self.samples += 1
+
+    def run(self, function, *args, **kwargs):
+        """Call ``function`` profiled and save the profile when it returns or raises."""
+        self._known_idents = set(sys._current_frames())
+        sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),), name="run-profiler", daemon=True)
+        started = time.monotonic()
+        sampler.start()
+        try:
+            self._profile.enable()
+            self._profiling = True
+        except ValueError as e:
+            # Another profiler is active (Python 3.12+ allows only one at a time); keep the samples
+            print(f"cProfile not available for this run: {str(e)}")
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if self._profiling:
+                self._profile.disable()
+            self._stop.set()
+            sampler.join()
+            self.duration_s = round(time.monotonic() - started, 3)
+            self.save()
+
+    def collapsed(self):
+        """The samples as collapsed stacks: ``thread;outer frame;...;inner frame count`` per line."""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def pstats_data(self):
+        if not self._profiling:
+            return None
+        self._profile.create_stats()
+        return marshal.dumps(self._profile.stats)
+
+    def top_functions(self, limit=TOP_FUNCTIONS):
+        if not self._profiling:
+            return []
+        stats = pstats.Stats(self._profile)
+        rows = []
+        for (filename, line, name), (calls, _, tottime, cumtime, _) in stats.stats.items():
+            rows.append({
+                'function': _frame_label(filename, name, line),
+                'calls': calls,
+                'tottime_s': round(tottime, 4),
+                'cumtime_s': round(cumtime, 4),
+            })
+        return sorted(rows, key=lambda row: row['tottime_s'], reverse=True)[:limit]
+
+    def summary(self):
+        return {
+            'duration_s': self.duration_s,
+            'interval_ms': round(self.interval_s * 1000, 1),
+            'samples': self.samples,
+            'threads': len(self._threads),
+            'categories': {
+                category: round(count / self.samples, 3) for category, count in self.categories.most_common()
+            } if self.samples else {},
+            'top_functions': self.top_functions(),
+        }
+
+    def save(self):
+        try:
+            summary = self.summary()
+            if self.run_stats is not None:
+                self.run_stats.profile = summary
+            if self.result_id is not None:
+                pstats_data = self.pstats_data()
+                db_utils.save_profile(self.result_id, {
+                    'summary': summary,
+                    'collapsed': self.collapsed(),
+                    'pstats': base64.b64encode(pstats_data).decode('ascii') if pstats_data else None,
+                })
+        except Exception as e:
+            print(f"Could not save the run profile: {str(e)}")
+
+
+def load_files(result_id):
+    """(collapsed stacks text, pstats bytes) saved for a run, or (None, None)."""
+    data = db_utils.load_profile(result_id)
+    if data is None:
+        return None, None
+    return data['collapsed'], base64.b64decode(data['pstats']) if data.get('pstats') else None
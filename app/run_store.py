@@ -0,0 +1,138 @@
+"""Incremental persistence of crew runs.
+
+A run is saved as a ``Result`` with status ``running`` before the crew is kicked
+off, and the Result id doubles as the run id. Every task output is written to
+the ``task_outputs`` table from the crew's task callback as soon as the task
+completes, so a crash, a stop or a closed browser tab keeps the work done so
+far. The Result gets the final output (or the error) and its final status when
+the run ends.
+"""
+
+from datetime import datetime
+
+import db_utils
+import metrics
+from result import Result
+from utils import rnd_id
+
+
+def start_run(crew_name, inputs):
+    result = Result(
+        id=f"R_{rnd_id()}",
+        crew_id=crew_name,
+        crew_name=crew_name,
+        inputs=inputs,
+        result=None,
+        status='running'
+    )
+    db_utils.save_result(result)
+    metrics.run_started(result.id, crew_name)
+    return result
+
+
+def finish_run(result, status, result_data=None, stats=None):
+    result.status = status
+    if result_data is not None:
+        result.result = result_data
+    if stats is not None:
+        result.stats = stats
+    db_utils.save_result(result)
+    metrics.run_finished(result.id, result.crew_name, status)
+    return result
+
+
+def serialize_output(crew_output, tasks=None):
+    """Serialize a CrewOutput the way results are stored, with the descriptions of ``tasks``."""
+    return {
+        'result': {'raw': crew_output.raw, 'type': 'CrewOutput'},
+        'tasks_output': [
+            {
+                'raw': task_output.raw,
+                'type': 'TaskOutput',
+                'index': index,
+                'description': getattr(tasks[index], 'description', None) if tasks and index < len(tasks) else None,
+            }
+            for index, task_output in enumerate(crew_output.tasks_output)
+        ],
+    }
+
+
+def _find_task(crewai_crew, output):
+    for index, task in enumerate(crewai_crew.tasks):
+        if task.output is output:
+            return index, task
+    for index, task in enumerate(crewai_crew.tasks):
+        if task.description == output.description:
+            return index, task
+    return None, None
+
+
+def save_task_output(crewai_crew, run_id, output, task_ids=None):
+    index, task = _find_task(crewai_crew, output)
+    if task is None:
+        print(f"Could not match task output to a task of run {run_id}")
+        return
+    started_at = getattr(task, 'start_time', None)
+    completed_at = getattr(task, 'end_time', None) or datetime.now()
+    db_utils.save_task_output(run_id, index, {
+        'task_id': task_ids[index] if task_ids and index < len(task_ids) else None,
+        'description': task.description,
+        'agent': output.agent,
+        'raw': output.raw,
+        'started_at': started_at.isoformat() if started_at else None,
+        'completed_at': completed_at.isoformat(),
+        'duration_s': round((completed_at - started_at).total_seconds(), 3) if started_at else None,
+    })
+
+
+def attach(crewai_crew, run_id, task_ids=None):
+    """Persist each task output of ``crewai_crew`` under ``run_id`` as soon as it exists.
+
+    ``task_ids`` are the ids of the MyTasks in the order of ``crewai_crew.tasks``.
+    A crew reused for another run can be attached again; the new run replaces the old one.
+    """
+    old_callback = crewai_crew.task_callback
+    previous_callback = getattr(old_callback, 'previous_callback', old_callback)
+    for task in crewai_crew.tasks:
+        # kickoff only hands the crew callback to tasks that have none yet
+        if old_callback is not None and task.callback is old_callback:
+            task.callback = None
+
+    def task_callback(output):
+        try:
+            save_task_output(crewai_crew, run_id, output, task_ids)
+        except Exception as e:
+            print(f"Error saving task output of run {run_id}: {str(e)}")
+        if previous_callback:
+            previous_callback(output)
+
+    task_callback.previous_callback = previous_callback
+    crewai_crew.task_callback = task_callback
+
+
+def load_partial_outputs(run_id):
+    return db_utils.load_task_outputs(run_id)
+
+
+def checkpoint_outputs(run_id, task_ids):
+    """Saved task outputs of ``run_id`` keyed by their index in ``task_ids`` (the crew's current task order)."""
+    outputs = {}
+    for saved in db_utils.load_task_outputs(run_id):
+        if saved.get('task_id') in task_ids:
+            outputs[task_ids.index(saved['task_id'])] = saved
+        elif saved.get('task_id') is None and saved['index'] < len(task_ids):
+            outputs[saved['index']] = saved
+    return outputs
+
+
+def resume_run(result, resume_outputs):
+    """Reopen ``result`` for a resumed run whose checkpointed outputs are ``resume_outputs``."""
+    # Re-save the checkpoints under their current index so the new outputs cannot collide with them
+    db_utils.delete_task_outputs(result.id)
+    for index, saved in resume_outputs.items():
+        db_utils.save_task_output(result.id, index, {key: value for key, value in saved.items() if key != 'index'})
+    result.status = 'running'
+    result.result = None
+    db_utils.save_result(result)
+    metrics.run_started(result.id, result.crew_name)
+    return result
@@ -0,0 +1,225 @@
+"""Dependency graph scheduling of crew tasks.
+
+Tasks declare what they depend on through ``context_from_async_tasks_ids`` and
+``context_from_sync_tasks_ids``. With DAG scheduling enabled a sequential crew
+is built as a ``DagCrew``, which runs its tasks as a graph instead of a list: a
+task starts as soon as every task it takes context from has finished, and up to
+``max_parallel_tasks`` independent tasks run at the same time. Tasks without
+declared context do not wait for anything.
+
+Both crew classes can resume an interrupted run: tasks listed in
+``resume_outputs`` get their saved output back instead of being executed again,
+and those outputs are used as context by the tasks that still have to run.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict
+
+from crewai import Crew, TaskOutput
+from crewai.crews.crew_output import CrewOutput
+from crewai.utilities.formatter import aggregate_raw_outputs_from_tasks
+from pydantic import Field
+
+import instrumentation
+
+
+def task_dependencies(tasks):
+    """Map each task id to the ids of the given tasks it takes context from."""
+    ids = {task.id for task in tasks}
+    dependencies = {}
+    for task in tasks:
+        context_ids = (task.context_from_async_tasks_ids or []) + (task.context_from_sync_tasks_ids or [])
+        dependencies[task.id] = [task_id for task_id in dict.fromkeys(context_ids) if task_id in ids]
+    return dependencies
+
+
+def find_cycle(dependencies):
+    """Return the task ids of a dependency cycle (first id repeated at the end), or None."""
+    visited = set()
+    for start in dependencies:
+        if start in visited:
+            continue
+        path = [start]
+        on_path = {start}
+        stack = [iter(dependencies.get(start, []))]
+        while stack:
+            next_id = next(stack[-1], None)
+            if next_id is None:
+                finished = path.pop()
+                visited.add(finished)
+                on_path.discard(finished)
+                stack.pop()
+                continue
+            if next_id in on_path:
+                return path[path.index(next_id):] + [next_id]
+            if next_id in visited:
+                continue
+            path.append(next_id)
+            on_path.add(next_id)
+            stack.append(iter(dependencies.get(next_id, [])))
+    return None
+
+
+def check_for_cycles(tasks):
+    """Raise ValueError if the context dependencies of ``tasks`` form a cycle."""
+    cycle = find_cycle(task_dependencies(tasks))
+    if cycle:
+        names = {task.id: task.description[:40] for task in tasks}
+        raise ValueError("Circular context dependency between tasks: " + " -> ".join(names[task_id] for task_id in cycle))
+
+
+def topological_order(tasks):
+    """Order ``tasks`` so that every task comes after its dependencies, keeping the original order otherwise."""
+    check_for_cycles(tasks)
+    dependencies = task_dependencies(tasks)
+    ordered = []
+    done = set()
+    remaining = list(tasks)
+    while remaining:
+        task = next(t for t in remaining if all(d in done for d in dependencies[t.id]))
+        remaining.remove(task)
+        ordered.append(task)
+        done.add(task.id)
+    return ordered
+
+
+def critical_path(tasks, durations=None):
+    """Return (tasks, total duration) of the longest chain of dependent tasks.
+
+    ``durations`` maps task ids to seconds; tasks without a known duration count as 1.
+    """
+    if not tasks:
+        return [], 0
+    durations = durations or {}
+    dependencies = task_dependencies(tasks)
+    finish = {}
+    previous = {}
+    for task in topological_order(tasks):
+        start = 0
+        for dependency_id in dependencies[task.id]:
+            if finish[dependency_id] > start:
+                start = finish[dependency_id]
+                previous[task.id] = dependency_id
+        finish[task.id] = start + (durations.get(task.id) or 1)
+
+    tasks_by_id = {task.id: task for task in tasks}
+    task_id = max(finish, key=finish.get)
+    path = [tasks_by_id[task_id]]
+    while task_id in previous:
+        task_id = previous[task_id]
+        path.insert(0, tasks_by_id[task_id])
+    return path, finish[path[-1].id]
+
+
+def last_task_durations(tasks, results, crew_name):
+    """Task durations (task id -> seconds) measured in the latest result of ``crew_name`` that has stats."""
+    runs = [r for r in results or [] if r.crew_name == crew_name and getattr(r, 'stats', None)]
+    if not runs:
+        return {}
+    latest = max(runs, key=lambda r: r.created_at)
+    durations = {}
+    for record in latest.stats.get('tasks', []):
+        if record.get('duration_s') is None:
+            continue
+        task = next((task for task in tasks if task.id == record.get('task_id')), None)
+        if task is None and 'task_id' not in record:
+            # Stats saved before tasks were recorded by id
+            task = next((task for task in tasks if task.description[:80] == record.get('description')), None)
+        if task is not None:
+            durations[task.id] = record['duration_s']
+    return durations
+
+
+class ResumableCrew(Crew):
+    resume_outputs: Dict[int, Any] = Field(
+        default_factory=dict,
+        description="Saved outputs ({'raw', 'agent', 'description'}) by task index that are not executed again.",
+    )
+
+    def _restore_outputs(self):
+        """Give the checkpointed tasks their saved output back and return their indexes."""
+        restored = set()
+        for index, saved in self.resume_outputs.items():
+            index = int(index)
+            if index >= len(self.tasks):
+                continue
+            task = self.tasks[index]
+            task.output = TaskOutput(
+                description=saved.get('description') or task.description,
+                agent=saved.get('agent') or (task.agent.role if task.agent else ''),
+                raw=saved.get('raw') or '',
+            )
+            restored.add(index)
+        return restored
+
+    def _run_sequential_process(self) -> CrewOutput:
+        restored = self._restore_outputs()
+        start_index = next((i for i in range(len(self.tasks)) if i not in restored), len(self.tasks))
+        if start_index == len(self.tasks):
+            return self._create_crew_output([task.output for task in self.tasks])
+        # crewai only keeps the last output of a skipped synchronous task as context; flagging
+        # the finished tasks async makes it collect all of them, like an uninterrupted run does
+        for task in self.tasks[:start_index]:
+            task.async_execution = True
+        result = self._execute_tasks(self.tasks, start_index=start_index)
+        result.tasks_output = [task.output for task in self.tasks if task.output]
+        return result
+
+
+class DagCrew(ResumableCrew):
+    max_parallel_tasks: int = Field(default=4, description="Maximum number of tasks running at the same time.")
+
+    def _run_sequential_process(self) -> CrewOutput:
+        return self._execute_task_graph(self.tasks)
+
+    def _execute_graph_task(self, task, run_stats):
+        instrumentation.bind_thread(run_stats)
+        try:
+            agent = self._get_agent_to_use(task)
+            if agent is None:
+                raise ValueError(f"No agent available for task: {task.description}")
+            tools = self._prepare_tools(agent, task, task.tools or agent.tools or [])
+            self._log_task_start(task, agent.role)
+            context = aggregate_raw_outputs_from_tasks(task.context) if isinstance(task.context, list) and task.context else ""
+            return task.execute_sync(agent=agent, context=context, tools=tools)
+        finally:
+            instrumentation.bind_thread(None)
+
+    def _execute_task_graph(self, tasks):
+        index = {id(task): i for i, task in enumerate(tasks)}
+        dependencies = [
+            [index[id(c)] for c in (task.context if isinstance(task.context, list) else []) if id(c) in index]
+            for task in tasks
+        ]
+        max_parallel = max(1, int(self.max_parallel_tasks or 1))
+        run_stats = instrumentation.find_run_stats()
+
+        outputs = {i: tasks[i].output for i in self._restore_outputs()}
+        remaining = [i for i in range(len(tasks)) if i not in outputs]
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="crew-task") as pool:
+            while running or (remaining and error is None):
+                if error is None:
+                    for i in [i for i in remaining if all(d in outputs for d in dependencies[i])]:
+                        if len(running) >= max_parallel:
+                            break
+                        remaining.remove(i)
+                        running[pool.submit(self._execute_graph_task, tasks[i], run_stats)] = i
+                if not running:
+                    raise ValueError("Task dependencies cannot be resolved")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    try:
+                        outputs[i] = future.result()
+                    except Exception as e:
+                        # Let the tasks already running finish, but do not start new ones
+                        error = error or e
+                        continue
+                    self._process_task_result(tasks[i], outputs[i])
+                    self._store_execution_log(tasks[i], outputs[i], i)
+        if error is not None:
+            raise error
+
+        return self._create_crew_output([outputs[i] for i in range(len(tasks))])
@@ -0,0 +1,44 @@
+"""Fast local token counting.
+
+Uses the cl100k tokenizer bundled with litellm (no download, no API call). It
+is not exact for every provider, but close enough to size prompts; without it
+four characters count as one token.
+"""
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            from litellm import encoding
+            _encoding = encoding
+        except Exception:
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def head(text, tokens):
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:tokens])
+
+
+def tail(text, tokens):
+    if tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[-tokens * 4:]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[-tokens:])
@@ -0,0 +1,155 @@
+"""Persistent cache of tool results, shared by all runs.
+
+crewai's own tool cache (``cache=True``) lives in memory for one run only. This
+cache keeps the results of tool calls in the database so later runs get them
+back without calling the search engine, website or API again.
+
+An entry is keyed by the id of the configured tool (``MyTool.tool_id``), its
+parameters and the arguments of the call. How long entries stay valid is set
+per tool on the Tools page (``MyTool.cache_ttl_s``, 0 disables caching); each
+tool class has its own default, e.g. an hour for searches and a day for
+scraped pages. When the cache grows past ``TOOL_CACHE_MAX_MB`` (default 100)
+the least recently used entries are evicted. Results that report an error
+are not cached. Hits and misses are counted per tool.
+
+``my_agent`` passes every tool it builds through ``wrap_tool``, which replaces
+the instance's ``_run`` like ``llm_wrapper.wrap_llm`` does for LLM calls.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+
+import db_utils
+import metrics
+
+# Keyword arguments frameworks add to a call that do not change its result
+_IGNORED_KWARGS = {'run_manager', 'callbacks', 'config'}
+
+_evict_lock = threading.Lock()
+
+
+def max_bytes():
+    try:
+        return int(float(os.getenv('TOOL_CACHE_MAX_MB', '100')) * 1024 * 1024)
+    except ValueError:
+        return 100 * 1024 * 1024
+
+
+def cache_key(tool_id, parameters, args, kwargs):
+    data = {
+        'tool_id': tool_id,
+        'parameters': parameters,
+        'args': list(args),
+        'kwargs': {key: value for key, value in kwargs.items() if key not in _IGNORED_KWARGS},
+    }
+    encoded = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def get(key):
+    """Return (True, value) for a valid cached entry, else (False, None)."""
+    data = db_utils.get_tool_cache_entry(key, time.time())
+    if data is None:
+        return False, None
+    return True, json.loads(data)['value']
+
+
+def put(key, tool_id, value, ttl_s):
+    try:
+        data = json.dumps({'value': value})
+    except (TypeError, ValueError):
+        # Results that do not survive a JSON round trip are not cached
+        return
+    size = len(data.encode('utf-8'))
+    limit = max_bytes()
+    if size > limit // 10:
+        return
+    now = time.time()
+    db_utils.save_tool_cache_entry(key, tool_id, data, size, now, now + ttl_s)
+    with _evict_lock:
+        db_utils.evict_tool_cache(limit, now)
+
+
+def is_error(value):
+    """Whether a tool result reports a failure, which is not worth caching."""
+    if isinstance(value, str):
+        # e.g. "Error: Website request timed out", "Error performing search: ..."
+        return value.startswith("Error")
+    if isinstance(value, dict):
+        # CustomApiTool returns the status code of the API response
+        status_code = value.get('status_code')
+        return isinstance(status_code, int) and status_code >= 400
+    return False
+
+
+def wrap_tool(crewai_tool, my_tool):
+    """Route the calls of ``crewai_tool`` (built from ``my_tool``) through the cache."""
+    ttl_s = my_tool.get_cache_ttl_s()
+    if not ttl_s or getattr(crewai_tool, '_studio_tool_cache', False):
+        return crewai_tool
+    original_run = crewai_tool._run
+    tool_id = my_tool.tool_id
+    parameters = dict(my_tool.get_parameters())
+
+    @functools.wraps(original_run)
+    def _run(*args, **kwargs):
+        key = cache_key(tool_id, parameters, args, kwargs)
+        try:
+            hit, value = get(key)
+            db_utils.record_tool_cache_stats(tool_id, hits=1 if hit else 0, misses=0 if hit else 1)
+        except Exception as e:
+            print(f"Tool cache lookup failed: {str(e)}")
+            return original_run(*args, **kwargs)
+        if hit:
+            return value
+        value = original_run(*args, **kwargs)
+        if value is not None and value != "" and not is_error(value):
+            try:
+                put(key, tool_id, value, ttl_s)
+            except Exception as e:
+                print(f"Tool cache write failed: {str(e)}")
+        return value
+
+    # Tools are pydantic models; bypass their attribute validation like for a private attribute
+    object.__setattr__(crewai_tool, '_run', _run)
+    object.__setattr__(crewai_tool, '_studio_tool_cache', True)
+    return crewai_tool
+
+
+def get_stats():
+    """{tool_id: {'hits', 'misses', 'hit_rate', 'entries', 'bytes'}} plus the totals under None."""
+    stats = db_utils.load_tool_cache_stats()
+    totals = {'hits': 0, 'misses': 0, 'entries': 0, 'bytes': 0}
+    for values in stats.values():
+        for key in totals:
+            totals[key] += values[key]
+    stats[None] = totals
+    for values in stats.values():
+        lookups = values['hits'] + values['misses']
+        values['hit_rate'] = values['hits'] / lookups if lookups else None
+    return stats
+
+
+def clear(tool_id=None):
+    db_utils.clear_tool_cache(tool_id)
+
+
+def _cache_metrics():
+    stats = get_stats()
+    stats.pop(None, None)
+    labels = ('tool',)
+    return [
+        metrics.snapshot('studio_tool_cache_hits_total', 'counter', "Tool cache hits", labels, {(tool_id,): s['hits'] for tool_id, s in stats.items()}),
+        metrics.snapshot('studio_tool_cache_misses_total', 'counter', "Tool cache misses", labels, {(tool_id,): s['misses'] for tool_id, s in stats.items()}),
+        metrics.snapshot('studio_tool_cache_hit_ratio', 'gauge', "Share of tool calls answered from the cache", labels,
+                         {(tool_id,): s['hit_rate'] for tool_id, s in stats.items() if s['hit_rate'] is not None}),
+        metrics.snapshot('studio_tool_cache_entries', 'gauge', "Entries in the tool cache", labels, {(tool_id,): s['entries'] for tool_id, s in stats.items()}),
+        metrics.snapshot('studio_tool_cache_bytes', 'gauge', "Size of the tool cache entries", labels, {(tool_id,): s['bytes'] for tool_id, s in stats.items()}),
+    ]
+
+
+metrics.register_collector(_cache_metrics)
@@ -1,9 +1,12 @@
 from typing import Optional, Dict, Any, Type
 
+import httpx
 import requests
 from crewai.tools import BaseTool
 from pydantic.v1 import BaseModel, Field
 
+import async_runner
+
 
 class CustomApiToolInputSchema(BaseModel):
     endpoint: str = Field(..., description="The specific endpoint for the API call")
@@ -29,6 +32,8 @@ class CustomApiTool(BaseTool):
         
 
     def _run(self, endpoint: str, method: str, headers: Optional[Dict[str, str]] = None, query_params: Optional[Dict[str, Any]] = None, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if async_runner.in_async_run():
+            return async_runner.run_sync(self._arun(endpoint, method, headers, query_params, body))
         url = f"{self.base_url}/{endpoint}".rstrip("/")
         headers = {**self.default_headers, **(headers or {})}
         query_params = {**self.default_query_params, **(query_params or {})}
@@ -52,6 +57,31 @@ class CustomApiTool(BaseTool):
                 "response": str(e)
             }
 
+    async def _arun(self, endpoint: str, method: str, headers: Optional[Dict[str, str]] = None, query_params: Optional[Dict[str, Any]] = None, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        url = f"{self.base_url}/{endpoint}".rstrip("/")
+        headers = {**self.default_headers, **(headers or {})}
+        query_params = {**self.default_query_params, **(query_params or {})}
+
+        try:
+            # Same as the requests call in _run
+            client = await async_runner.http_client(verify=False)
+            response = await client.request(
+                method=method.upper(),
+                url=url,
+                headers=headers,
+                params=query_params,
+                json=body,
+            )
+            return {
+                "status_code": response.status_code,
+                "response": response.json() if response.headers.get("Content-Type") == "application/json" else response.text
+            }
+        except (httpx.HTTPError, ValueError) as e:
+            return {
+                "status_code": 500,
+                "response": str(e)
+            }
+
     def run(self, input_data: CustomApiToolInputSchema) -> Any:
         response_data = self._run(
             endpoint=input_data.endpoint,
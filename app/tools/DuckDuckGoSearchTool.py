@@ -3,6 +3,8 @@ from typing import Optional, List
 from duckduckgo_search import DDGS
 from pydantic import BaseModel, Field, model_validator
 
+import async_runner
+
 class DuckDuckGoSearchToolInputSchema(BaseModel):
     query: str = Field(..., description="The specific query")
     max_results: int = Field(5, description="Maximum results")
@@ -40,6 +42,15 @@ class DuckDuckGoSearchTool(BaseTool):
         Returns:
             A string containing the search results with titles, snippets, and URLs
         """
+        return self._search(query, max_results, region, safesearch, time, domains)
+
+    async def _arun(self, query: str, max_results: int = 5, region: str = "fr-fr",
+                    safesearch: str = "moderate", time: Optional[str] = None,
+                    domains: Optional[List[str]] = None) -> str:
+        # duckduckgo_search only has a blocking client; run it off the loop so other runs keep going
+        return await async_runner.run_blocking(self._search, query, max_results, region, safesearch, time, domains)
+
+    def _search(self, query, max_results, region, safesearch, time, domains):
         try:
             # Initialize the DuckDuckGo Search client
             ddgs = DDGS()
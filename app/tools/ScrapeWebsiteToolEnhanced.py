@@ -2,11 +2,14 @@ from urllib.parse import urljoin
 import re
 from typing import Any, Optional, Type
 from datetime import datetime
+import httpx
 import requests
 from bs4 import BeautifulSoup, Tag
 from pydantic import BaseModel, Field
 from crewai.tools import BaseTool
 
+import async_runner
+
 
 class FixedScrapeWebsiteToolEnhancedSchema(BaseModel):
     """Fixed input schema - when website_url is provided in constructor."""
@@ -255,7 +258,7 @@ class ScrapeWebsiteToolEnhanced(BaseTool):
             str: Text převedený z PDF.
         """
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
+            response = requests.get(url, headers=self.headers, timeout=15, verify=True)
             response.raise_for_status()
             pdf_file = BytesIO(response.content)
 
@@ -272,83 +275,111 @@ class ScrapeWebsiteToolEnhanced(BaseTool):
         if not website_url:
             return "Error: No website URL provided"
             
+        if async_runner.in_async_run():
+            return async_runner.run_sync(self._arun(**kwargs))
         self.website_url = website_url
-        css_selector = self.css_selector
-        
+
         try:
             response = requests.get(
                 website_url,
                 timeout=15,
                 headers=self.headers,
                 cookies=self.cookies if self.cookies else {},
-                allow_redirects=True
+                allow_redirects=True,
+                # Like the async client; ssl_override turns verification off for sessions by default
+                verify=True
             )
-            
-            # Store original URL if redirected
-            final_url = response.url
-            was_redirected = len(response.history) > 0
-            original_url = response.history[0].url if was_redirected else website_url
-            
-            # Create initial metadata
-            metadata = [
-                "### Page Metadata ###",
-                f"URL: {original_url}",
-                f"Status: {response.status_code}",
-                f"Scraping Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            ]
-            if was_redirected:
-                metadata.append(f"Redirect: {original_url} -> {final_url}")
-            
-            # Handle binary content
-            content_type = response.headers.get("Content-Type", "").lower()
-            if "pdf" in content_type:
-                metadata = self.extract_pdf_metadata(final_url, response)
-                text = self.pdf_url_to_text(final_url)
-                return metadata + "\n\n### PDF Content ###\n" + text
-
-            if any(binary_type in content_type for binary_type in ["image", "octet-stream"]):
-                filename = website_url.split("/")[-1] or "unknown"
-                metadata.append("---\n")
-                return "\n".join(metadata) + f"Binary file detected: {filename}"
-
-            try:
-                response.encoding = response.apparent_encoding or 'utf-8'
-                parsed = BeautifulSoup(response.text, "html.parser")
-            except Exception as e:
-                metadata.append("---\n")
-                return "\n".join(metadata) + f"\nError: Failed to parse HTML content: {str(e)}"
-
-            metadata = self.extract_metadata(parsed, final_url)
-
-            # Remove script and style elements
-            for tag in parsed(['script', 'style']):
-                tag.extract()
-
-            # Process content based on CSS selector or whole document
-            elements_to_process = []
-            if css_selector:
-                elements_to_process = parsed.select(css_selector)
-            else:
-                # Process everything in the body, or fall back to whole document
-                body = parsed.find('body')
-                if body:
-                    elements_to_process = [body]
-                else:
-                    elements_to_process = [parsed]
-
-            # Extract text from selected elements
-            results = []
-            for element in elements_to_process:
-                results.extend(self.extract_text_with_structure(element))
-
-            # Join results and clean up
-            text = '\n'.join(line for line in results if line is not None)
-            text = re.sub(r'\n{3,}', '\n\n', text)  # Normalize multiple newlines
-            text = text.strip()
-
-            return metadata + "\n" + text if text else metadata + "No meaningful content found on the page."
-            
+            return self._format_response(website_url, response)
         except requests.Timeout:
             return "Error: Website request timed out"
         except requests.RequestException as e:
-            return f"Error: Failed to fetch website content: {str(e)}"
\ No newline at end of file
+            return f"Error: Failed to fetch website content: {str(e)}"
+
+    async def _arun(
+        self,
+        **kwargs: Any,
+    ) -> Any:
+        website_url = kwargs.get("website_url", self.website_url)
+        if not website_url:
+            return "Error: No website URL provided"
+        self.website_url = website_url
+
+        headers = dict(self.headers)
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        client = await async_runner.http_client()
+        try:
+            response = await client.get(website_url, headers=headers)
+        except httpx.TimeoutException:
+            return "Error: Website request timed out"
+        except httpx.HTTPError as e:
+            return f"Error: Failed to fetch website content: {str(e)}"
+        # Parsing is CPU bound, keep it off the event loop
+        return await async_runner.run_blocking(self._format_response, website_url, response)
+
+    def _format_response(self, website_url: str, response) -> str:
+        """Turn a requests or httpx response into the tool output."""
+        css_selector = self.css_selector
+        # Store original URL if redirected
+        final_url = str(response.url)
+        was_redirected = len(response.history) > 0
+        original_url = str(response.history[0].url) if was_redirected else website_url
+        
+        # Create initial metadata
+        metadata = [
+            "### Page Metadata ###",
+            f"URL: {original_url}",
+            f"Status: {response.status_code}",
+            f"Scraping Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        ]
+        if was_redirected:
+            metadata.append(f"Redirect: {original_url} -> {final_url}")
+        
+        # Handle binary content
+        content_type = response.headers.get("Content-Type", "").lower()
+        if "pdf" in content_type:
+            metadata = self.extract_pdf_metadata(final_url, response)
+            text = self.pdf_url_to_text(final_url)
+            return metadata + "\n\n### PDF Content ###\n" + text
+
+        if any(binary_type in content_type for binary_type in ["image", "octet-stream"]):
+            filename = website_url.split("/")[-1] or "unknown"
+            metadata.append("---\n")
+            return "\n".join(metadata) + f"Binary file detected: {filename}"
+
+        try:
+            response.encoding = getattr(response, 'apparent_encoding', None) or response.encoding or 'utf-8'
+            parsed = BeautifulSoup(response.text, "html.parser")
+        except Exception as e:
+            metadata.append("---\n")
+            return "\n".join(metadata) + f"\nError: Failed to parse HTML content: {str(e)}"
+
+        metadata = self.extract_metadata(parsed, final_url)
+
+        # Remove script and style elements
+        for tag in parsed(['script', 'style']):
+            tag.extract()
+
+        # Process content based on CSS selector or whole document
+        elements_to_process = []
+        if css_selector:
+            elements_to_process = parsed.select(css_selector)
+        else:
+            # Process everything in the body, or fall back to whole document
+            body = parsed.find('body')
+            if body:
+                elements_to_process = [body]
+            else:
+                elements_to_process = [parsed]
+
+        # Extract text from selected elements
+        results = []
+        for element in elements_to_process:
+            results.extend(self.extract_text_with_structure(element))
+
+        # Join results and clean up
+        text = '\n'.join(line for line in results if line is not None)
+        text = re.sub(r'\n{3,}', '\n\n', text)  # Normalize multiple newlines
+        text = text.strip()
+
+        return metadata + "\n" + text if text else metadata + "No meaningful content found on the page."
\ No newline at end of file
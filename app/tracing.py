@@ -0,0 +1,542 @@
+"""OpenTelemetry traces of crew runs.
+
+Each run becomes one trace with a span tree::
+
+    crew.kickoff
+      task                  (async and DAG tasks run side by side)
+        agent.execute       (delegated work nests inside the delegating agent)
+          llm.call          model, tokens, rate limiter wait, time to first token
+          tool.run          tool, arguments, URL, cache hit
+
+Kickoff, task, agent and tool spans come from crewai's event bus; LLM call
+spans are opened by ``llm_wrapper``. Spans are parented explicitly (by crew,
+task and agent) rather than through the current context, because crewai runs
+async tasks in threads that do not inherit it.
+
+Tracing is off unless an exporter is configured:
+
+``TRACES_FILE``
+    appends the finished spans to this file, one JSON object per line
+``TRACES_OTLP_ENDPOINT``
+    sends them with OTLP/HTTP, e.g. ``http://localhost:4318/v1/traces``
+    (``OTEL_EXPORTER_OTLP_HEADERS`` and the other standard variables apply)
+
+The Studio uses a tracer provider of its own, so crewai's telemetry settings
+do not change where these spans go; ``OTEL_SDK_DISABLED=true`` turns both off.
+The trace id of a run is kept in its stats.
+
+Without a collector at hand, ``python -m tracing collect --port 4318 --out
+traces.jsonl`` receives OTLP/HTTP and writes the same lines as ``TRACES_FILE``,
+and ``python -m tracing show traces.jsonl`` prints the span tree of a trace
+with the start offset and duration of every span.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import instrumentation
+
+SERVICE_NAME = 'crewai-studio'
+MAX_ATTRIBUTE_LENGTH = 500
+
+_lock = threading.Lock()
+_local = threading.local()
+_tracer = None
+_configured = False
+_handlers_installed = False
+# ('crew', id) / ('task', id) / ('agent', task id, agent id) / ('tool', thread id, tool name) -> open span
+_open_spans = {}
+
+
+def _exporters():
+    exporters = []
+    path = os.getenv('TRACES_FILE')
+    if path:
+        exporters.append(JsonLinesSpanExporter(path))
+    endpoint = os.getenv('TRACES_OTLP_ENDPOINT')
+    if endpoint:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporters.append(OTLPSpanExporter(endpoint=endpoint))
+    return exporters
+
+
+def get_tracer():
+    """The Studio's tracer, or None when no exporter is configured."""
+    global _tracer, _configured
+    with _lock:
+        if _configured:
+            return _tracer
+        _configured = True
+        try:
+            exporters = _exporters()
+        except Exception as e:
+            print(f"Could not set up the trace exporters: {str(e)}")
+            exporters = []
+        if not exporters:
+            return None
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        provider = TracerProvider(resource=Resource.create({'service.name': SERVICE_NAME}))
+        if os.getenv('OTEL_SDK_DISABLED', '').strip().lower() == 'true':
+            print("TRACES_FILE / TRACES_OTLP_ENDPOINT are set but OTEL_SDK_DISABLED=true turns tracing off")
+        for exporter in exporters:
+            provider.add_span_processor(BatchSpanProcessor(exporter))
+        _tracer = provider.get_tracer('crewai_studio')
+        return _tracer
+
+
+def _attribute(value):
+    if isinstance(value, (bool, int, float)):
+        return value
+    return str(value)[:MAX_ATTRIBUTE_LENGTH]
+
+
+def _stack():
+    stack = getattr(_local, 'spans', None)
+    if stack is None:
+        stack = _local.spans = []
+    return stack
+
+
+def _start(name, key, parent, attributes):
+    """Open a span; spans with a ``key`` can be found and ended by it."""
+    from opentelemetry import context, trace
+    parent_context = trace.set_span_in_context(parent) if parent is not None else context.Context()
+    span = _tracer.start_span(name, context=parent_context, attributes={
+        attribute: _attribute(value) for attribute, value in attributes.items() if value is not None
+    })
+    if key is not None:
+        with _lock:
+            _open_spans[key] = span
+    _stack().append((key, span))
+    return span
+
+
+def _end(key, error=None, attributes=None):
+    with _lock:
+        span = _open_spans.pop(key, None)
+    if span is not None:
+        _finish(span, error, attributes)
+
+
+def _finish(span, error=None, attributes=None):
+    from opentelemetry.trace import Status, StatusCode
+    stack = _stack()
+    for index in range(len(stack) - 1, -1, -1):
+        if stack[index][1] is span:
+            del stack[index]
+            break
+    for attribute, value in (attributes or {}).items():
+        if value is not None:
+            span.set_attribute(attribute, _attribute(value))
+    if error is not None:
+        span.set_status(Status(StatusCode.ERROR, str(error)[:200]))
+    else:
+        span.set_status(Status(StatusCode.OK))
+    span.end()
+
+
+def _open_span(key):
+    with _lock:
+        return _open_spans.get(key)
+
+
+def _innermost_span():
+    stack = _stack()
+    # Spans left open on a pooled thread by an earlier run were ended with their trace
+    while stack and not stack[-1][1].is_recording():
+        stack.pop()
+    return stack[-1][1] if stack else None
+
+
+def _end_kickoff(crew, error=None, attributes=None):
+    key = ('crew', str(crew.id))
+    with _lock:
+        span = _open_spans.pop(key, None)
+        if span is None:
+            return
+        # Spans crewai never reported the end of (e.g. a tool input that failed validation)
+        trace_id = span.get_span_context().trace_id
+        left_open = [_open_spans.pop(k) for k, s in list(_open_spans.items()) if s.get_span_context().trace_id == trace_id]
+    for child in left_open:
+        _finish(child, "Not finished when the crew run ended")
+    _finish(span, error, attributes)
+
+
+def _find_span(kind, index, value):
+    """Open span of ``kind`` whose key has ``value`` at ``index``, preferring this thread's spans."""
+    for key, span in reversed(_stack()):
+        if key is not None and key[0] == kind and key[index] == value:
+            return span
+    with _lock:
+        for key, span in _open_spans.items():
+            if key[0] == kind and key[index] == value:
+                return span
+    return None
+
+
+def _agent_span(agent):
+    return _find_span('agent', 2, str(getattr(agent, 'id', '')))
+
+
+def _crew_span(agent):
+    crew = getattr(agent, 'crew', None)
+    return _open_span(('crew', str(crew.id))) if crew is not None else None
+
+
+def _tool_url(tool_args):
+    if isinstance(tool_args, str) and tool_args.startswith('{'):
+        try:
+            tool_args = json.loads(tool_args)
+        except ValueError:
+            pass
+    if isinstance(tool_args, dict):
+        for key, value in tool_args.items():
+            if 'url' in str(key).lower() and value:
+                return value
+        for value in tool_args.values():
+            if isinstance(value, str) and value.startswith(('http://', 'https://')):
+                return value
+    elif isinstance(tool_args, str) and tool_args.startswith(('http://', 'https://')):
+        return tool_args
+    return None
+
+
+def on_kickoff_started(source, event):
+    span = _start('crew.kickoff', ('crew', str(source.id)), None, {
+        'crewai.crew.name': event.crew_name,
+        'crewai.crew.id': str(source.id),
+        'crewai.crew.process': str(getattr(source, 'process', '')),
+        'crewai.crew.tasks': len(source.tasks),
+        'crewai.crew.inputs': json.dumps(event.inputs, default=str) if event.inputs else None,
+    })
+    run_stats = instrumentation.find_run_stats(source)
+    if run_stats is not None:
+        run_stats.trace_id = format(span.get_span_context().trace_id, '032x')
+        if run_stats.crew_name:
+            span.set_attribute('studio.crew.name', _attribute(run_stats.crew_name))
+
+
+def on_kickoff_completed(source, event):
+    _end_kickoff(source, attributes={'crewai.crew.output_length': len(str(getattr(event.output, 'raw', '') or ''))})
+
+
+def on_kickoff_failed(source, event):
+    _end_kickoff(source, error=event.error)
+
+
+def on_task_started(source, event):
+    agent = getattr(source, 'agent', None)
+    parent = _crew_span(agent) or _innermost_span()
+    _start('task', ('task', str(source.id)), parent, {
+        'crewai.task.name': getattr(source, 'name', None),
+        'crewai.task.description': getattr(source, 'description', None),
+        'crewai.task.async': bool(getattr(source, 'async_execution', False)),
+        'crewai.agent.role': getattr(agent, 'role', None),
+        'thread.name': threading.current_thread().name,
+    })
+
+
+def on_task_completed(source, event):
+    _end(('task', str(source.id)), attributes={'crewai.task.output_length': len(str(getattr(event.output, 'raw', '') or ''))})
+
+
+def on_task_failed(source, event):
+    _end(('task', str(source.id)), error=event.error)
+
+
+def on_agent_started(source, event):
+    task = event.task
+    parent = _open_span(('task', str(getattr(task, 'id', '')))) or _innermost_span() or _crew_span(source)
+    _start('agent.execute', ('agent', str(getattr(task, 'id', '')), str(source.id)), parent, {
+        'crewai.agent.role': source.role,
+        'crewai.agent.tools': ", ".join(tool.name for tool in (event.tools or [])) or None,
+        'crewai.task.description': getattr(task, 'description', None),
+    })
+
+
+def on_agent_completed(source, event):
+    _end(('agent', str(getattr(event.task, 'id', '')), str(source.id)), attributes={'crewai.agent.output_length': len(str(event.output or ''))})
+
+
+def on_agent_error(source, event):
+    _end(('agent', str(getattr(event.task, 'id', '')), str(source.id)), error=event.error)
+
+
+def on_tool_started(source, event):
+    agent = event.agent
+    parent = _agent_span(agent) if agent is not None else None
+    tool_args = event.tool_args
+    _start('tool.run', ('tool', threading.get_ident(), event.tool_name), parent or _innermost_span(), {
+        'tool.name': event.tool_name,
+        'tool.class': event.tool_class,
+        'tool.arguments': json.dumps(tool_args, default=str) if isinstance(tool_args, dict) else tool_args,
+        'url.full': _tool_url(tool_args),
+        'crewai.agent.role': event.agent_role,
+        'tool.attempt': event.run_attempts,
+    })
+
+
+def on_tool_finished(source, event):
+    _end(('tool', threading.get_ident(), event.tool_name), attributes={
+        'tool.from_cache': event.from_cache,
+        'tool.output_length': len(str(event.output or '')),
+    })
+
+
+def on_tool_error(source, event):
+    _end(('tool', threading.get_ident(), event.tool_name), error=event.error)
+
+
+def start_llm_call(provider_and_model, from_agent=None, from_task=None):
+    """Open the span of an LLM call made by ``llm_wrapper``; None when tracing is off."""
+    if get_tracer() is None:
+        return None
+    if from_agent is None and from_task is not None:
+        from_agent = getattr(from_task, 'agent', None)
+    parent = None
+    if from_task is not None:
+        parent = _find_span('agent', 1, str(getattr(from_task, 'id', ''))) or _open_span(('task', str(getattr(from_task, 'id', ''))))
+    if parent is None and from_agent is not None:
+        parent = _agent_span(from_agent) or _crew_span(from_agent)
+    provider, _, model = str(provider_and_model or '').partition(': ')
+    return _start('llm.call', None, parent or _innermost_span(), {
+        'gen_ai.system': provider,
+        'gen_ai.request.model': model,
+        'crewai.agent.role': getattr(from_agent, 'role', None),
+    })
+
+
+def end_llm_call(span, record):
+    """Close ``span`` with the outcome of the call as recorded by ``llm_wrapper``."""
+    if span is None:
+        return
+    _finish(span, record.get('error'), {
+        'gen_ai.usage.input_tokens': record.get('prompt_tokens'),
+        'gen_ai.usage.output_tokens': record.get('completion_tokens'),
+        'studio.llm.usage_estimated': record.get('usage_estimated'),
+        'studio.llm.rate_limit_wait_s': record.get('wait_s'),
+        'studio.llm.latency_s': record.get('latency_s'),
+        'studio.llm.ttft_s': record.get('ttft_s'),
+        'studio.llm.cost_usd': record.get('cost_usd'),
+    })
+
+
+def install_event_handlers():
+    """Subscribe the span handlers to crewai's event bus, when tracing is configured."""
+    global _handlers_installed
+    if get_tracer() is None:
+        return
+    with _lock:
+        if _handlers_installed:
+            return
+        _handlers_installed = True
+    from crewai.utilities.events import (
+        crewai_event_bus,
+        AgentExecutionCompletedEvent,
+        AgentExecutionErrorEvent,
+        AgentExecutionStartedEvent,
+        CrewKickoffCompletedEvent,
+        CrewKickoffFailedEvent,
+        CrewKickoffStartedEvent,
+        TaskCompletedEvent,
+        TaskFailedEvent,
+        TaskStartedEvent,
+        ToolUsageErrorEvent,
+        ToolUsageFinishedEvent,
+        ToolUsageStartedEvent,
+    )
+    crewai_event_bus.register_handler(CrewKickoffStartedEvent, on_kickoff_started)
+    crewai_event_bus.register_handler(CrewKickoffCompletedEvent, on_kickoff_completed)
+    crewai_event_bus.register_handler(CrewKickoffFailedEvent, on_kickoff_failed)
+    crewai_event_bus.register_handler(TaskStartedEvent, on_task_started)
+    crewai_event_bus.register_handler(TaskCompletedEvent, on_task_completed)
+    crewai_event_bus.register_handler(TaskFailedEvent, on_task_failed)
+    crewai_event_bus.register_handler(AgentExecutionStartedEvent, on_agent_started)
+    crewai_event_bus.register_handler(AgentExecutionCompletedEvent, on_agent_completed)
+    crewai_event_bus.register_handler(AgentExecutionErrorEvent, on_agent_error)
+    crewai_event_bus.register_handler(ToolUsageStartedEvent, on_tool_started)
+    crewai_event_bus.register_handler(ToolUsageFinishedEvent, on_tool_finished)
+    crewai_event_bus.register_handler(ToolUsageErrorEvent, on_tool_error)
+
+
+def span_record(trace_id, span_id, parent_id, name, start_ns, end_ns, status, attributes):
+    """The line written for a span by the file exporter and the collector."""
+    return {
+        'trace_id': trace_id,
+        'span_id': span_id,
+        'parent_id': parent_id,
+        'name': name,
+        'start_ns': start_ns,
+        'end_ns': end_ns,
+        'status': status,
+        'attributes': attributes,
+    }
+
+
+class JsonLinesSpanExporter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        lines = []
+        for span in spans:
+            context = span.get_span_context()
+            lines.append(json.dumps(span_record(
+                format(context.trace_id, '032x'),
+                format(context.span_id, '016x'),
+                format(span.parent.span_id, '016x') if span.parent else None,
+                span.name,
+                span.start_time,
+                span.end_time,
+                span.status.status_code.name,
+                dict(span.attributes or {}),
+            )))
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            print(f"Could not write traces to {self.path}: {str(e)}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis=30000):
+        return True
+
+
+def _any_value(value):
+    kind = value.WhichOneof('value')
+    return getattr(value, kind) if kind in ('string_value', 'bool_value', 'int_value', 'double_value') else str(value)
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """Stand-in for an OpenTelemetry collector: accepts OTLP/HTTP protobuf traces and appends them as JSON lines."""
+    out_path = 'traces.jsonl'
+    write_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest, ExportTraceServiceResponse
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        request = ExportTraceServiceRequest()
+        try:
+            request.ParseFromString(body)
+        except Exception as e:
+            self.send_error(400, str(e))
+            return
+        lines = []
+        for resource_spans in request.resource_spans:
+            for scope_spans in resource_spans.scope_spans:
+                for span in scope_spans.spans:
+                    lines.append(json.dumps(span_record(
+                        span.trace_id.hex(),
+                        span.span_id.hex(),
+                        span.parent_span_id.hex() or None,
+                        span.name,
+                        span.start_time_unix_nano,
+                        span.end_time_unix_nano,
+                        {0: 'UNSET', 1: 'OK', 2: 'ERROR'}.get(span.status.code, 'UNSET'),
+                        {attribute.key: _any_value(attribute.value) for attribute in span.attributes},
+                    )))
+        if lines:
+            with self.write_lock, open(self.out_path, 'a', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+        response = ExportTraceServiceResponse().SerializeToString()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-protobuf')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+def load_spans(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def format_trace(spans, trace_id=None):
+    """The span tree of ``trace_id`` (default: the last trace in ``spans``) as text lines."""
+    if not spans:
+        return []
+    trace_id = trace_id or spans[-1]['trace_id']
+    spans = [span for span in spans if span['trace_id'].startswith(trace_id)]
+    if not spans:
+        return []
+    ids = {span['span_id'] for span in spans}
+    children = {}
+    for span in spans:
+        parent = span['parent_id'] if span['parent_id'] in ids else None
+        children.setdefault(parent, []).append(span)
+    trace_start = min(span['start_ns'] for span in spans)
+    lines = [f"trace {spans[0]['trace_id']}"]
+
+    def add(span, depth):
+        offset = (span['start_ns'] - trace_start) / 1e9
+        duration = (span['end_ns'] - span['start_ns']) / 1e9
+        attributes = span['attributes']
+        detail = attributes.get('crewai.task.description') or attributes.get('gen_ai.request.model') or attributes.get('tool.name') or attributes.get('studio.crew.name') or attributes.get('crewai.crew.name') or ''
+        if span['name'] == 'agent.execute':
+            detail = attributes.get('crewai.agent.role') or ''
+        if attributes.get('url.full'):
+            detail += f" {attributes['url.full']}"
+        if 'gen_ai.usage.input_tokens' in attributes:
+            detail += f" ({attributes['gen_ai.usage.input_tokens']} + {attributes.get('gen_ai.usage.output_tokens', 0)} tokens)"
+        status = " ERROR" if span['status'] == 'ERROR' else ""
+        lines.append(f"{offset:9.3f}s {duration:9.3f}s  {'  ' * depth}{span['name']} {str(detail)[:80]}{status}")
+        for child in sorted(children.get(span['span_id'], []), key=lambda s: s['start_ns']):
+            add(child, depth + 1)
+
+    for root in sorted(children.get(None, []), key=lambda s: s['start_ns']):
+        add(root, 0)
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tracing', description="Collect and show CrewAI Studio traces.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    collect_parser = subparsers.add_parser('collect', help="Receive OTLP/HTTP traces and append them to a JSON lines file")
+    collect_parser.add_argument('--host', default='127.0.0.1')
+    collect_parser.add_argument('--port', type=int, default=4318)
+    collect_parser.add_argument('--out', default='traces.jsonl')
+    show_parser = subparsers.add_parser('show', help="Print the span tree of a trace")
+    show_parser.add_argument('file')
+    show_parser.add_argument('--trace', help="Trace id or its prefix (default: the last trace in the file)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'collect':
+        CollectorHandler.out_path = args.out
+        server = ThreadingHTTPServer((args.host, args.port), CollectorHandler)
+        print(f"Collecting traces on http://{args.host}:{args.port}/v1/traces into {args.out}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    lines = format_trace(load_spans(args.file), args.trace)
+    if not lines:
+        print("No such trace", file=sys.stderr)
+        return 1
+    print("\n".join(lines))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
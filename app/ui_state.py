@@ -0,0 +1,96 @@
+"""UI state of the model objects, kept outside of the models themselves.
+
+``MyAgent``, ``MyTask``, ``MyCrew`` and ``MyKnowledgeSource`` are plain data
+classes that can be built and run without Streamlit (see ``headless``). What
+the pages remember about them between reruns, such as whether an object is
+being edited, lives in this side map keyed by ``<name>_<object id>``. Inside a
+Streamlit session the map is stored in the session state, so each browser
+session has its own; anywhere else a process-local dict is used.
+
+``st`` and ``ss`` are lazy stand-ins for ``streamlit`` and its session state
+that only import Streamlit when they are first used, which keeps it out of
+processes that never draw anything.
+"""
+
+import importlib
+import sys
+
+_CONTEXT_MODULE = 'streamlit.runtime.scriptrunner_utils.script_run_context'
+_process_state = {}
+
+
+class _LazyModule:
+    """Imports module ``name`` on first attribute access.
+
+    Not registered in ``sys.modules`` on purpose: libraries that scan every loaded
+    module (``inspect.getmodule``) would otherwise trigger the import anyway.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+
+st = _LazyModule('streamlit')
+
+
+class _LazySessionState:
+    """Forwards to ``st.session_state`` without importing Streamlit up front."""
+
+    def __getattr__(self, name):
+        return getattr(st.session_state, name)
+
+    def __setattr__(self, name, value):
+        setattr(st.session_state, name, value)
+
+    def __delattr__(self, name):
+        delattr(st.session_state, name)
+
+    def __getitem__(self, key):
+        return st.session_state[key]
+
+    def __setitem__(self, key, value):
+        st.session_state[key] = value
+
+    def __delitem__(self, key):
+        del st.session_state[key]
+
+    def __contains__(self, key):
+        return key in st.session_state
+
+    def __iter__(self):
+        return iter(st.session_state)
+
+    def __len__(self):
+        return len(st.session_state)
+
+
+ss = _LazySessionState()
+
+
+def _in_session():
+    # Only a running app has loaded the script run context module
+    context = sys.modules.get(_CONTEXT_MODULE)
+    return context is not None and context.get_script_run_ctx(suppress_warning=True) is not None
+
+
+def _state():
+    if _in_session():
+        if 'ui_state' not in st.session_state:
+            st.session_state['ui_state'] = {}
+        return st.session_state['ui_state']
+    return _process_state
+
+
+def get(name, obj_id, default=None):
+    return _state().get(f'{name}_{obj_id}', default)
+
+
+def set(name, obj_id, value):
+    _state()[f'{name}_{obj_id}'] = value
+
+
+def pop(name, obj_id):
+    _state().pop(f'{name}_{obj_id}', None)
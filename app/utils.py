@@ -1,10 +1,11 @@
 import random
 import string
-from streamlit import markdown
+from ui_state import st
 import markdown as md
 from datetime import datetime
 import re
 from crewai import TaskOutput
+import render_cache
 
 
 def rnd_id(length=8):
@@ -16,7 +17,7 @@ def escape_quotes(s):
     return s.replace('"', '\\"').replace("'", "\\'")
 
 def fix_columns_width():
-    markdown("""
+    st.markdown("""
             <style>
                 div[data-testid="column"] {
                     width: fit-content !important;
@@ -29,6 +30,22 @@ def fix_columns_width():
             """, unsafe_allow_html=True)
 
 
+def _render_markdown(text):
+    fixed_md = normalize_list_indentation(text)
+
+    # Convert Markdown -> HTML
+    markdown_html = md.markdown(
+        fixed_md,
+        extensions=['markdown.extensions.extra']  # optional: extra for tables, code, sane_lists
+    )
+    return {'markdown': fixed_md, 'html': markdown_html}
+
+
+def render_markdown(text):
+    """The normalized Markdown and HTML of ``text`` ({'markdown', 'html'}), cached by content (see render_cache)."""
+    return render_cache.get_or_render(text or "", _render_markdown)
+
+
 def generate_printable_view(crew_name, result, inputs, formatted_result, created_at=None):
     """
     Generates a simple HTML view for printing.
@@ -36,14 +53,8 @@ def generate_printable_view(crew_name, result, inputs, formatted_result, created
     if created_at is None:
         created_at = datetime.now().isoformat()
     created_at_str = datetime.fromisoformat(created_at).strftime('%Y-%m-%d %H:%M:%S')
-    
-    fixed_md = normalize_list_indentation(formatted_result)
 
-    # Convert Markdown -> HTML
-    markdown_html = md.markdown(
-        fixed_md,
-        extensions=['markdown.extensions.extra']  # optional: extra for tables, code, sane_lists
-    )
+    markdown_html = render_markdown(formatted_result)['html']
 
     html_content = f"""
     <html>
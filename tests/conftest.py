@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The app modules import each other as top-level modules (they are run from the app directory)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+os.environ.setdefault('DB_URL', 'sqlite://')
+os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+os.environ.setdefault('CREWAI_DISABLE_TELEMETRY', 'true')
@@ -0,0 +1,62 @@
+import argparse
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import cli
+
+
+def run_args(**kwargs):
+    defaults = {'crew': 'Any crew', 'inputs': None, 'inputs_file': None, 'output_file': None, 'budget': None, 'profile': False, 'profile_out': None}
+    return argparse.Namespace(**{**defaults, **kwargs})
+
+
+@pytest.mark.parametrize('arguments', [
+    {'inputs': '[1]'},
+    {'inputs': '"text"'},
+    {'inputs': '{bad'},
+    {'inputs': '{}', 'budget': '5'},
+    {'inputs': '{}', 'budget': '["max_tokens"]'},
+])
+def test_run_rejects_inputs_and_budgets_of_the_wrong_shape(arguments, capsys):
+    assert cli.cmd_run(run_args(**arguments)) == 2
+    assert "Traceback" not in capsys.readouterr().err
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), cli.ApiHandler)
+    cli.ApiHandler.run_slots = threading.BoundedSemaphore(1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    connection.request('POST', '/crews/any/kickoff', body=body, headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.mark.parametrize('body', [
+    '[]',
+    '"x"',
+    '{"inputs": [1]}',
+    '{"inputs": "topic"}',
+    '{"inputs": {}, "budget": 5}',
+    '{"inputs": {}, "budget": "abc"}',
+    b'\xff\xfe',
+])
+def test_kickoff_rejects_bodies_of_the_wrong_shape(server, body):
+    status, data = post(server, body)
+    assert status == 400
+    assert 'error' in data
+    # The run slot was not taken
+    assert cli.ApiHandler.run_slots.acquire(blocking=False)
+    cli.ApiHandler.run_slots.release()
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import plan_cache
+
+
+def crew_texts(description, expected_output="A report", role="Researcher", goal="Research", backstory="An analyst"):
+    task = SimpleNamespace(_original_description=description, description=description,
+                           _original_expected_output=expected_output, expected_output=expected_output)
+    agent = SimpleNamespace(_original_role=role, role=role, _original_goal=goal, goal=goal,
+                            _original_backstory=backstory, backstory=backstory)
+    return plan_cache._instructions(SimpleNamespace(tasks=[task], agents=[agent]))
+
+
+def test_template_replaces_whole_words_only():
+    plan = "1. Search for AI news.\n2. Read the AI articles, not the SAID or AIM ones."
+    template = plan_cache._to_template(plan, {'topic': 'AI'}, {'topic'}, crew_texts("Write about {topic}"))
+    assert template == "1. Search for {topic} news.\n2. Read the {topic} articles, not the SAID or AIM ones."
+    assert plan_cache._from_template(template, {'topic': 'Rust'}, {'topic'}) == (
+        "1. Search for Rust news.\n2. Read the Rust articles, not the SAID or AIM ones.")
+
+
+def test_template_is_refused_for_a_short_common_value():
+    instructions = crew_texts("Summarize the news and the opinions about {topic}")
+    plan = "1. Collect the news and the blogs about the topic.\n2. Summarize the opinions."
+    assert plan_cache._to_template(plan, {'topic': 'the'}, {'topic'}, instructions) is None
+    assert plan_cache._to_template(plan, {'topic': 'and'}, {'topic'}, instructions) is None
+
+
+def test_template_keeps_a_value_that_only_appears_inside_words():
+    instructions = crew_texts("Summarize the news about {topic}")
+    plan = "1. Gather other sources.\n2. Write them up."
+    assert plan_cache._to_template(plan, {'topic': 'the'}, {'topic'}, instructions) == plan
+
+
+def test_template_prefers_the_longest_value_and_refuses_shared_values():
+    instructions = crew_texts("Compare {city} with {place}")
+    plan = "Visit New York City, then New York state."
+    assert plan_cache._to_template(plan, {'city': 'New York City', 'place': 'New York'}, {'city', 'place'}, instructions) == (
+        "Visit {city}, then {place} state.")
+    assert plan_cache._to_template(plan, {'city': 'New York', 'place': 'New York'}, {'city', 'place'}, instructions) is None
+
+
+def test_placeholder_names_do_not_count_as_instructions():
+    instructions = crew_texts("Write about {topic}")
+    assert plan_cache._to_template("Research topic in depth", {'topic': 'topic'}, {'topic'}, instructions) == "Research {topic} in depth"